@@ -0,0 +1,99 @@
+"""
+Bank directory - email trader → mã bank (VIB, MB, ...) từ bank_directory.json
+
+bank_directory.json dùng chung cho pipelines và server (04_Extract_ChatRoom/server,
+routing theo bank):
+- email_tokens: [[token, bank], ...] theo thứ tự ưu tiên
+- banks: {bank: {"names": [tên hiển thị, tên đầy đủ]}}
+
+BankResolver:
+1. Tách email thành token theo . @ - _ rồi tra dict token → bank (exact,
+   vd "thai.nth.vib@com.vn" → "vib", "hoaivtt@baca-bank.vn" → "baca")
+2. Không có token nào khớp → 1 regex compile sẵn (mỗi token 1 lookahead, như
+   routing.py) báo mọi token xuất hiện dạng substring, lấy token ưu tiên nhất
+3. Memo theo email → map cả cột chỉ tốn O(số email khác nhau)
+
+Usage:
+    python bank_directory.py input_data.csv
+"""
+
+import argparse
+import json
+import os
+import re
+
+import pandas as pd
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bank_directory.json')
+
+EMAIL_SPLIT = re.compile(r'[.@\-_]+')
+
+
+def load_bank_directory(path=DEFAULT_PATH):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class BankResolver:
+    """email → bank, build 1 lần từ email_tokens (token đứng trước ưu tiên hơn)"""
+
+    def __init__(self, email_tokens, valid_banks=None):
+        # valid_banks lọc trước khi build → token của bank không hợp lệ bị bỏ qua
+        self.tokens = [(token.lower(), bank) for token, bank in email_tokens
+                       if valid_banks is None or bank in valid_banks]
+        self.exact = {}
+        for priority, (token, bank) in enumerate(self.tokens):
+            self.exact.setdefault(token, (priority, bank))
+
+        parts = [f"(?=(?:.*?(?P<t{priority}>{re.escape(token)}))?)"
+                 for priority, (token, _) in enumerate(self.tokens)]
+        self.pattern = re.compile(''.join(parts), re.DOTALL) if parts else None
+        self._memo = {}
+
+    @classmethod
+    def from_directory(cls, directory=None, valid_banks=None):
+        directory = load_bank_directory() if directory is None else directory
+        return cls(directory['email_tokens'], valid_banks)
+
+    def _resolve(self, email):
+        email = email.lower()
+        hits = [self.exact[token] for token in EMAIL_SPLIT.split(email) if token in self.exact]
+        if hits:
+            return min(hits)[1]
+        if self.pattern is None:
+            return None
+        found = [int(name[1:]) for name, value in self.pattern.match(email).groupdict().items()
+                 if value is not None]
+        return self.tokens[min(found)][1] if found else None
+
+    def resolve(self, email):
+        if pd.isna(email) or not isinstance(email, str):
+            return None
+        if email not in self._memo:
+            self._memo[email] = self._resolve(email)
+        return self._memo[email]
+
+    def map(self, emails):
+        """Series email → Series bank (resolve mỗi email khác nhau 1 lần)"""
+        codes, uniques = pd.factorize(emails)
+        banks = [self.resolve(email) for email in uniques]
+        return pd.Series([banks[code] if code >= 0 else None for code in codes],
+                         index=emails.index, dtype=object)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Map trader emails to banks')
+    parser.add_argument('input', nargs='?', default='input_data.csv')
+    parser.add_argument('--directory', default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input, encoding='utf-8-sig')
+    resolver = BankResolver.from_directory(load_bank_directory(args.directory))
+    banks = resolver.map(df['trader'])
+    emails = df[['trader']].assign(bank=banks).drop_duplicates('trader')
+    print(f"{len(df)} messages, {len(emails)} emails, {emails['bank'].notna().sum()} mapped")
+    print(emails['bank'].value_counts(dropna=False).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Benchmark suite - chạy mọi version trên synthetic corpus 10k / 100k / 1M messages
+
+Với mỗi size: sinh corpus + ground truth 1 lần (synthetic_corpus.py, lưu trong
+--workdir), rồi chạy từng engine trong 1 process riêng (spawn) để đo peak RSS
+không lẫn với process khác. Report: thời gian, messages/sec, peak RSS,
+số deals, precision / recall / F1 so với ground truth. Peak RSS của parallel
+gồm cả các worker process (tổng RSS process chính + process con).
+
+Engines: các version của extraction (v2, step, debug, names, v3, v4, v5),
+streaming (streaming_engine) và parallel (parallel_pipeline).
+Version chậm: ước lượng thời gian từ size trước (tuyến tính); nếu vượt
+--budget thì bỏ qua size lớn hơn, run quá 2x budget bị dừng.
+
+Usage:
+    python benchmark_suite.py
+    python benchmark_suite.py --sizes 10000,100000 --engines v5,streaming,parallel
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import time
+from queue import Empty
+
+import pandas as pd
+
+from extraction import PIPELINES
+from simple_evaluate import evaluate_frames
+from synthetic_corpus import generate_corpus, ground_truth_path
+
+ENGINES = list(PIPELINES) + ['streaming', 'parallel']
+
+RESULT_COLUMNS = ['engine', 'messages', 'status', 'seconds', 'msgs_per_sec', 'peak_rss_mb',
+                  'deals', 'gt_deals', 'precision', 'recall', 'f1']
+
+
+def corpus_files(workdir, size, seed):
+    """Sinh corpus nếu chưa có, trả về (corpus path, ground truth path)"""
+    path = os.path.join(workdir, f"synthetic_{size}_seed{seed}.csv")
+    gt_path = ground_truth_path(path)
+    if not (os.path.exists(path) and os.path.exists(gt_path)):
+        os.makedirs(workdir, exist_ok=True)
+        chat_df, gt_df = generate_corpus(size, seed=seed)
+        chat_df.to_csv(path, index=False, encoding='utf-8-sig')
+        gt_df.to_csv(gt_path, index=False, encoding='utf-8-sig')
+        print(f"Generated {path}: {len(chat_df)} messages, {len(gt_df)} deals")
+    return path, gt_path
+
+
+def score_deals(pred_df, gt_df):
+    """Precision / recall / F1 - match 1-1 như simple_evaluate"""
+    metrics = evaluate_frames(pred_df, gt_df)
+    return metrics['precision'], metrics['recall'], metrics['f1']
+
+
+def run_engine(engine, df):
+    """Final DataFrame (format GT) của engine trên df (output của load_chat_log)"""
+    if engine == 'streaming':
+        from streaming_engine import run_streaming
+        from vectorized_intent import vectorized_intent_detection
+        return run_streaming(vectorized_intent_detection(df, 'v5'))
+    if engine == 'parallel':
+        from parallel_pipeline import run_parallel
+        return run_parallel(df)
+
+    from extraction import run_pipeline, final_output
+    step5_df, _ = run_pipeline(df, engine, report=False)
+    return final_output(step5_df, engine)
+
+
+def _bench_worker(engine, corpus_path, gt_path, queue):
+    """Chạy trong process riêng: load, chạy engine, đo, chấm điểm"""
+    from chat_log import load_chat_log
+    from stage_runner import PeakRSS
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = load_chat_log(corpus_path)
+            started = time.perf_counter()
+            # parallel: worker của ProcessPoolExecutor mới là nơi tốn memory
+            with PeakRSS(children=engine == 'parallel') as rss:
+                final_df = run_engine(engine, df)
+            seconds = time.perf_counter() - started
+
+        gt_df = pd.read_csv(gt_path, encoding='utf-8-sig')
+        precision, recall, f1 = score_deals(final_df, gt_df)
+        queue.put({
+            'status': 'ok',
+            'seconds': seconds,
+            'msgs_per_sec': len(df) / seconds if seconds > 0 else None,
+            'peak_rss_mb': rss.peak / 1024 / 1024 if rss.peak else None,
+            'deals': len(final_df),
+            'gt_deals': len(gt_df),
+            'precision': precision,
+            'recall': recall,
+            'f1': f1,
+        })
+    except Exception as exc:  # report lỗi của engine thay vì dừng cả suite
+        queue.put({'status': f'error: {type(exc).__name__}: {exc}'})
+
+
+def bench_one(engine, corpus_path, gt_path, timeout):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_bench_worker, args=(engine, corpus_path, gt_path, queue))
+    process.start()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return {'status': 'timeout'}
+    try:
+        return queue.get(timeout=10)
+    except Empty:
+        return {'status': f'error: exit code {process.exitcode}'}
+
+
+def print_results(results):
+    print()
+    print("BENCHMARK RESULTS")
+    print("-" * 17)
+    print(f"{'engine':<10} {'messages':>9} {'status':<9} {'time(s)':>9} {'msgs/s':>9} "
+          f"{'peak MB':>8} {'deals':>7} {'P':>6} {'R':>6} {'F1':>6}")
+    for row in results:
+        if row['status'] != 'ok':
+            print(f"{row['engine']:<10} {row['messages']:>9} {row['status']}")
+            continue
+        print(f"{row['engine']:<10} {row['messages']:>9} {'ok':<9} {row['seconds']:9.2f} "
+              f"{row['msgs_per_sec']:9.0f} {row['peak_rss_mb'] or 0:8.1f} {row['deals']:>7} "
+              f"{row['precision']:6.3f} {row['recall']:6.3f} {row['f1']:6.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark all extraction versions on synthetic corpora')
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--engines', default=','.join(ENGINES))
+    parser.add_argument('--budget', type=float, default=600, help='Giây / run (ước lượng trước khi chạy)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', default='benchmark_data')
+    parser.add_argument('--output', default='benchmark_suite_results.json')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    engines = args.engines.split(',')
+    unknown = [engine for engine in engines if engine not in ENGINES]
+    if unknown:
+        parser.error(f"unknown engines: {', '.join(unknown)} (available: {', '.join(ENGINES)})")
+
+    results = []
+    last_run = {}  # engine → (messages, seconds) của run thành công gần nhất
+    for size in sorted(sizes):
+        corpus_path, gt_path = corpus_files(args.workdir, size, args.seed)
+        for engine in engines:
+            row = {'engine': engine, 'messages': size}
+            if engine in last_run:
+                prev_size, prev_seconds = last_run[engine]
+                estimate = prev_seconds * size / prev_size
+                if estimate > args.budget:
+                    row['status'] = f'skipped (est. {estimate:.0f}s)'
+                    results.append(row)
+                    print(f"{engine} @ {size}: {row['status']}")
+                    continue
+            elif any(r['engine'] == engine and r['status'] != 'ok' for r in results):
+                row['status'] = 'skipped'
+                results.append(row)
+                continue
+
+            print(f"{engine} @ {size} ...", flush=True)
+            row.update(bench_one(engine, corpus_path, gt_path, timeout=2 * args.budget))
+            results.append(row)
+            if row['status'] == 'ok':
+                last_run[engine] = (size, row['seconds'])
+                print(f"  {row['seconds']:.2f}s, {row['deals']} deals, F1 {row['f1']:.3f}")
+            else:
+                print(f"  {row['status']}")
+
+    print_results(results)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'seed': args.seed, 'budget': args.budget, 'results': results}, f, indent=2)
+    pd.DataFrame(results, columns=RESULT_COLUMNS).to_csv(
+        os.path.splitext(args.output)[0] + '.csv', index=False, encoding='utf-8-sig')
+    print(f"Results saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
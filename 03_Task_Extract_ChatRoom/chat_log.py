@@ -0,0 +1,64 @@
+"""
+Chat log loader - parse time/Date 1 lần khi load
+
+- time ("17:04:11")        → seconds: int seconds-of-day (-1 nếu không parse được)
+- Date ("October 22, 2024") → date_ordinal: int (date.toordinal()); nhãn không
+  phải ngày (vd "TODAY" - ngày export) xếp sau mọi ngày có trong file, theo thứ
+  tự xuất hiện; NaN → -1
+
+Các stage so sánh cùng ngày / tính gap bằng integer trên 2 cột này thay vì
+strptime + so sánh string trong từng vòng lặp.
+"""
+
+import numpy as np
+import pandas as pd
+
+TIME_FORMAT = '%H:%M:%S'
+DATE_FORMAT = '%B %d, %Y'
+MISSING = -1
+
+
+def parse_seconds(times):
+    """'HH:MM:SS' → int64 seconds-of-day (MISSING nếu không parse được)"""
+    parsed = pd.to_datetime(pd.Series(times), format=TIME_FORMAT, errors='coerce')
+    seconds = parsed.dt.hour * 3600 + parsed.dt.minute * 60 + parsed.dt.second
+    return seconds.fillna(MISSING).to_numpy(dtype=np.int64)
+
+
+def parse_date_ordinal(dates):
+    """'October 22, 2024' → int64 ordinal; nhãn khác xếp sau ngày lớn nhất"""
+    dates = pd.Series(dates)
+    parsed = pd.to_datetime(dates, format=DATE_FORMAT, errors='coerce')
+
+    ordinals = np.full(len(dates), MISSING, dtype=np.int64)
+    valid = parsed.notna().to_numpy()
+    if valid.any():
+        # ordinal dạng date.toordinal() (1 = 0001-01-01)
+        epoch_days = parsed[valid].to_numpy().astype('datetime64[D]').astype(np.int64)
+        ordinals[valid] = epoch_days + pd.Timestamp('1970-01-01').toordinal()
+
+    labels = dates.notna().to_numpy() & ~valid
+    if labels.any():
+        next_ordinal = ordinals.max() + 1 if valid.any() else 0
+        codes, _ = pd.factorize(dates[labels])
+        ordinals[labels] = next_ordinal + codes
+    return ordinals
+
+
+def time_columns(df, time_col='time', date_col='Date'):
+    """(seconds, date_ordinal) - dùng cột đã parse nếu có, không thì parse"""
+    if 'seconds' in df.columns and 'date_ordinal' in df.columns:
+        return df['seconds'].to_numpy(dtype=np.int64), df['date_ordinal'].to_numpy(dtype=np.int64)
+    return parse_seconds(df[time_col]), parse_date_ordinal(df[date_col])
+
+
+def load_chat_log(path):
+    """Load input CSV + thêm cột seconds, date_ordinal"""
+    df = pd.read_csv(path, encoding='utf-8-sig')
+    df['seconds'] = parse_seconds(df['time'])
+    df['date_ordinal'] = parse_date_ordinal(df['Date'])
+
+    bad_times = (df['seconds'] == MISSING).sum()
+    if bad_times:
+        print(f"WARNING: {bad_times} messages with unparseable time")
+    return df
@@ -6,72 +6,27 @@ Tạo new input file với expanded bank coverage
 import pandas as pd
 import numpy as np
 
+from bank_directory import BankResolver, load_bank_directory
+
 def get_expanded_bank_mappings():
-    """Comprehensive bank mappings để cover 25/30 GT banks"""
-    
-    return {
-        # Specific domain mappings first (higher priority)
-        'pvcombank': 'PVCB',
-        'eximbank': 'EIBV', 
-        'sacombank': 'SGTT',
-        
-        # Major banks
-        'vib': 'VIB',
-        'vpbank': 'VPB',
-        'vcb': 'VCB', 
-        'vietcombank': 'VCB',
-        'acb': 'ACB',
-        'techcombank': 'TCB',
-        'tcb': 'TCB',
-        'bidv': 'BIDV',
-        'mbbank': 'MB',  # mbbank trước mb
-        'mb': 'MB',
-        'msb': 'MSB',
-        'ocb': 'OCB',
-        'shb': 'SHB',
-        
-        # Previously missing banks now found
-        'baca': 'ABBK',
-        'bacabank': 'ABBK', 
-        'abbank': 'ABBK',
-        'hdbank': 'HDB',
-        'nasbank': 'NABV',  # Bac A Bank
-        'seabank': 'SEAV',   # SeABank
-        'namabank': 'SABH',  # Nam A Bank
-        'baovietbank': 'BVBH',  # Bao Viet Bank
-        'ncb': 'NCB',
-        'kienlongbank': 'KLBV',
-        'dongabank': 'EABS',
-        'vietbank': 'VNTT',
-        'vietcapitalbank': 'VCCB',
-        'fubon': 'Fubon',
-        'indovina': 'Indovina',
-        'vietinbank': 'ICBV',  # VietinBank = ICBV
-        'agribank': 'VBAH',   # Agribank
-        
-        # Still missing: EIBV, LVBT, PVCB, SGTT, TPB
-        # Try additional patterns
-        'lienviet': 'LVBT',
-        'pvcom': 'PVCB',
-        'sacom': 'SGTT',
-        'tpbank': 'TPB',
-        'tpb': 'TPB'
-    }
+    """Comprehensive bank mappings để cover 25/30 GT banks
+
+    Token → bank theo thứ tự ưu tiên, đọc từ bank_directory.json (dùng chung với server)
+    """
+    return dict(load_bank_directory()['email_tokens'])
+
+_resolvers = {}
+
+def get_bank_resolver(valid_banks=None):
+    """BankResolver (compile + memo) cho từng tập valid_banks"""
+    key = None if valid_banks is None else frozenset(valid_banks)
+    if key not in _resolvers:
+        _resolvers[key] = BankResolver.from_directory(valid_banks=key)
+    return _resolvers[key]
 
 def map_email_to_bank_expanded(email, valid_banks=None):
     """Enhanced email to bank mapping"""
-    if pd.isna(email) or not isinstance(email, str):
-        return None
-    
-    email_lower = str(email).lower()
-    mappings = get_expanded_bank_mappings()
-    
-    for email_part, bank_name in mappings.items():
-        if email_part in email_lower:
-            if valid_banks is None or bank_name in valid_banks:
-                return bank_name
-    
-    return None
+    return get_bank_resolver(valid_banks).resolve(email)
 
 def create_expanded_input_with_banks():
     """Create input file với expanded bank coverage (25/30 GT banks)"""
@@ -95,7 +50,7 @@ def create_expanded_input_with_banks():
     print(f"Original input messages: {len(df)}")
     
     # Apply expanded bank mapping
-    df['bank_name'] = df['trader'].apply(lambda x: map_email_to_bank_expanded(x, valid_banks))
+    df['bank_name'] = get_bank_resolver(valid_banks).map(df['trader'])  # mỗi email resolve 1 lần
     
     # Filter to only messages với mapped banks
     df_filtered = df[df['bank_name'].notna()].copy()
@@ -0,0 +1,17 @@
+"""
+Extraction package - 1 entry point cho mọi version của rule pipeline
+
+- registry: tên stage → implementation (các function step trong solution_*)
+- specs:    pipeline spec từng version (v2, step, debug, names, v3, v4, v5)
+- cache:    output của từng stage lưu trên disk, key = hash(input + code + config)
+- pipeline: run_pipeline() chạy spec, chỉ tính lại các stage có key đổi
+
+Usage:
+    python -m extraction --version v5
+    python -m extraction --version v4 --input input_expanded_banks.csv --no_cache
+"""
+
+from .registry import STAGE_REGISTRY, register_stage, get_stage
+from .specs import StageSpec, PIPELINES, OUTPUTS
+from .cache import StageCache, code_fingerprint
+from .pipeline import run_pipeline, final_output
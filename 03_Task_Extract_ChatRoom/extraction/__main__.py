@@ -0,0 +1,58 @@
+"""
+CLI: python -m extraction --version v5 [--input ...] [--output ...] [--features features.parquet]
+"""
+
+import argparse
+
+from chat_log import load_chat_log
+from feature_store import build_features, preload_features
+from instrumentation import build_report, write_report
+from intermediate_store import save_intermediate
+from . import PIPELINES, StageCache, run_pipeline, final_output
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a versioned extraction pipeline with stage cache')
+    parser.add_argument('--version', default='v5', choices=list(PIPELINES))
+    parser.add_argument('--input', default='input_expanded_banks.csv')
+    parser.add_argument('--output', default=None, help='Mặc định: solution_<version>_pipeline_results.csv')
+    parser.add_argument('--intermediate', default=None, help='Lưu step 5 DataFrame (.parquet / .feather) nếu cần debug')
+    parser.add_argument('--csv', action='store_true', help='Ghi thêm intermediate dạng CSV (utf-8-sig) cho Excel')
+    parser.add_argument('--cache_dir', default='.stage_cache')
+    parser.add_argument('--no_cache', action='store_true')
+    parser.add_argument('--features', default=None,
+                        help='Feature store (feature_store.py): build / dùng lại, nạp keyword + confirm status vào feature cache')
+    parser.add_argument('--report', default=None, help='Ghi run report (JSON): time/CPU/rows/memory/rule hits từng stage')
+    args = parser.parse_args()
+
+    df = load_chat_log(args.input)
+    print(f"Loaded {len(df)} messages from input")
+    if args.features:
+        features, info = build_features(df, args.features)
+        preload_features(df, features)
+        print(f"Features: {args.features} ({info['computed']} computed, {info['reused']} reused)")
+    print()
+
+    cache = None if args.no_cache else StageCache(args.cache_dir)
+    step5_df, stats = run_pipeline(df, args.version, cache=cache)
+
+    if args.intermediate:
+        saved = save_intermediate(step5_df, args.intermediate, csv=args.csv)
+        print(f"Intermediate results saved: {', '.join(saved)}")
+
+    final_df = final_output(step5_df, args.version)
+
+    if args.report:
+        write_report(args.report, build_report(args.version, args.input, stats,
+                                               {'deals': len(final_df)}))
+    if len(final_df) > 0:
+        output_file = args.output or f"solution_{args.version}_pipeline_results.csv"
+        final_df.to_csv(output_file, index=False, encoding='utf-8-sig')
+        print(f"Valid deals extracted: {len(final_df)}")
+        print(f"File saved: {output_file}")
+    else:
+        print("No valid deals created!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+On-disk cache cho output của từng stage
+
+Key của stage = sha256(key stage trước + code fingerprint + config); stage đầu
+tiên dùng hash của input DataFrame. Sửa code / config của 1 stage chỉ đổi key
+của stage đó và các stage sau → các stage trước load lại từ cache.
+
+Code fingerprint: source của function + các function/class/constant cùng
+project mà nó dùng (đi theo tên global trong bytecode), nên sửa helper như
+extract_volume cũng làm stage dùng nó chạy lại. Regex compile sẵn tính theo
+pattern + flags. Instance của class trong project (vd keyword_scanner.SCANNER,
+feature_cache.FEATURES) tính theo class của nó + fingerprint_data() nếu class
+có định nghĩa (dữ liệu build instance, vd keyword tables); state lúc chạy như
+nội dung cache không được tính.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import re
+import types
+
+import pandas as pd
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Constant đơn giản được đưa vào fingerprint (dict rules, pattern, threshold, ...)
+CONSTANT_TYPES = (str, int, float, bool, tuple, list, dict, frozenset, set)
+
+
+def _is_project_object(obj):
+    module = inspect.getmodule(obj)
+    path = getattr(module, '__file__', None)
+    return path is not None and os.path.abspath(path).startswith(PROJECT_DIR + os.sep)
+
+
+def _code_names(code):
+    """Tên global dùng trong code object (kể cả comprehension / hàm lồng nhau)"""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            names |= _code_names(const)
+    return names
+
+
+def _stable_repr(value):
+    if isinstance(value, (set, frozenset)):
+        return repr(sorted(map(repr, value)))
+    if isinstance(value, re.Pattern):
+        # repr() của Pattern cắt pattern dài
+        return repr((value.pattern, value.flags))
+    if isinstance(value, (list, tuple)) and any(isinstance(item, re.Pattern) for item in value):
+        return repr([_stable_repr(item) for item in value])
+    return repr(value)
+
+
+def _is_project_instance(value):
+    """Instance (không phải class / function / module) của 1 class trong project"""
+    return (not isinstance(value, (type, types.FunctionType, types.ModuleType))
+            and type(value) not in CONSTANT_TYPES and _is_project_object(type(value)))
+
+
+def _module_name(obj):
+    """__module__ của obj; '__main__' (file chạy trực tiếp) → tên module theo path file
+
+    Để fingerprint giống nhau dù hàm được import hay chạy qua `python file.py`.
+    """
+    module = getattr(obj, '__module__', '') or ''
+    if module == '__main__':
+        path = getattr(inspect.getmodule(obj), '__file__', None)
+        if path:
+            relative = os.path.relpath(os.path.abspath(path), PROJECT_DIR)
+            module = os.path.splitext(relative)[0].replace(os.sep, '.')
+    return module
+
+
+def code_fingerprint(func):
+    """sha256 của source func + các dependency trong project"""
+    digest = hashlib.sha256()
+    seen = set()
+    pending = [func]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        digest.update(f"{_module_name(obj)}.{getattr(obj, '__qualname__', '')}\n".encode())
+        if inspect.isclass(obj) and hasattr(obj, '_fields'):
+            # namedtuple: không có source, fields là định nghĩa
+            digest.update(f"{obj._fields}\n".encode())
+            continue
+        digest.update(inspect.getsource(obj).encode())
+
+        if inspect.isclass(obj):
+            codes = [member.__code__ for member in vars(obj).values() if inspect.isfunction(member)]
+            namespace = vars(inspect.getmodule(obj))
+        else:
+            codes = [obj.__code__]
+            namespace = obj.__globals__
+
+        for name in sorted(set().union(*map(_code_names, codes)) if codes else ()):
+            value = namespace.get(name)
+            if (inspect.isfunction(value) or inspect.isclass(value)) and _is_project_object(value):
+                pending.append(value)
+            elif type(value) in CONSTANT_TYPES and not name.startswith('__'):
+                # type() chứ không isinstance: bỏ qua Counter/state (vd RULE_HITS)
+                digest.update(f"{name}={_stable_repr(value)}\n".encode())
+            elif callable(getattr(value, '__wrapped__', None)) and _is_project_object(value.__wrapped__):
+                # functools.lru_cache / wraps (vd remove_accents)
+                pending.append(value.__wrapped__)
+            elif isinstance(value, re.Pattern):
+                digest.update(f"{name}={_stable_repr(value)}\n".encode())
+            elif _is_project_instance(value):
+                pending.append(type(value))
+                data = getattr(value, 'fingerprint_data', None)
+                if callable(data):
+                    digest.update(f"{name}={_stable_repr(data())}\n".encode())
+    return digest.hexdigest()
+
+
+def frame_hash(df):
+    """sha256 của DataFrame (columns + values)"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in df.columns]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def stage_key(previous_key, func, config):
+    """Cache key của stage tiếp theo"""
+    digest = hashlib.sha256()
+    digest.update(previous_key.encode())
+    digest.update(code_fingerprint(func).encode())
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class StageCache:
+    """Lưu output của stage: <cache_dir>/<version>/<stage>-<key>.pkl"""
+
+    def __init__(self, cache_dir='.stage_cache'):
+        self.cache_dir = cache_dir
+
+    def path(self, version, stage, key):
+        return os.path.join(self.cache_dir, version, f"{stage}-{key[:16]}.pkl")
+
+    def load(self, version, stage, key):
+        path = self.path(version, stage, key)
+        if not os.path.exists(path):
+            return None
+        return pd.read_pickle(path)
+
+    def save(self, version, stage, key, df):
+        path = self.path(version, stage, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Ghi file tạm rồi rename → không để lại cache hỏng nếu bị ngắt giữa chừng
+        tmp_path = path + '.tmp'
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
@@ -0,0 +1,64 @@
+"""
+Chạy pipeline theo spec của version, dùng cache cho từng stage
+
+Tính trước key của mọi stage (không cần chạy), load output của stage cuối
+cùng có trong cache rồi chỉ chạy các stage sau nó.
+"""
+
+from stage_runner import run_stage, print_stage_report
+from .cache import frame_hash, stage_key
+from .registry import get_stage
+from .specs import PIPELINES, OUTPUTS
+
+
+def resolve(version):
+    """[(spec, function)] của version"""
+    if version not in PIPELINES:
+        raise KeyError(f"Unknown version: {version} (available: {', '.join(PIPELINES)})")
+    return [(spec, get_stage(spec.impl)) for spec in PIPELINES[version]]
+
+
+def run_pipeline(df, version='v5', cache=None, report=True):
+    """Chạy các stage của version trên df (output của load_chat_log)
+
+    cache: StageCache hoặc None (không cache). Trả về (step5_df, stats).
+    """
+    stages = resolve(version)
+
+    keys = []
+    key = frame_hash(df)
+    for spec, func in stages:
+        key = stage_key(key, func, spec.config)
+        keys.append(key)
+
+    # Stage cuối cùng đã có trong cache
+    start = 0
+    if cache is not None:
+        for i in range(len(stages) - 1, -1, -1):
+            cached = cache.load(version, stages[i][0].name, keys[i])
+            if cached is not None:
+                df = cached
+                start = i + 1
+                break
+
+    stats = [{'stage': spec.name, 'seconds': 0.0, 'cpu_seconds': 0.0, 'rows_in': None,
+              'rows': len(df), 'rows_out': len(df), 'rows_per_sec': None, 'frame_bytes': None,
+              'rss_start': None, 'rss_end': None, 'rss_peak': None, 'rule_hits': {}, 'cached': True}
+             for spec, _ in stages[:start]]
+
+    for (spec, func), key in zip(stages[start:], keys[start:]):
+        df, stage_stats = run_stage(spec.name, func, df, spec.categories, **spec.config)
+        stage_stats['cached'] = False
+        stats.append(stage_stats)
+        if cache is not None:
+            cache.save(version, spec.name, key, df)
+
+    if report:
+        print_stage_report(stats)
+    return df, stats
+
+
+def final_output(step5_df, version='v5'):
+    """Final DataFrame (format GT) bằng create_final_output của version"""
+    return get_stage(OUTPUTS[version])(step5_df)
+
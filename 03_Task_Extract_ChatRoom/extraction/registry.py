@@ -0,0 +1,90 @@
+"""
+Stage registry - tên stage → implementation
+
+Implementation đăng ký bằng "module:function" (import khi dùng, nên load
+package không import mọi solution_*) hoặc trực tiếp bằng function.
+"""
+
+import importlib
+
+STAGE_REGISTRY = {}
+
+
+def register_stage(name, target=None):
+    """Đăng ký stage: register_stage('v5.reply', 'module:function') hoặc làm decorator"""
+    if target is None:
+        def decorator(func):
+            STAGE_REGISTRY[name] = func
+            return func
+        return decorator
+    STAGE_REGISTRY[name] = target
+    return target
+
+
+def get_stage(name):
+    """Function của stage đã đăng ký (import module nếu cần)"""
+    if name not in STAGE_REGISTRY:
+        raise KeyError(f"Unknown stage: {name}")
+    target = STAGE_REGISTRY[name]
+    if isinstance(target, str):
+        module_name, func_name = target.split(':')
+        target = getattr(importlib.import_module(module_name), func_name)
+        STAGE_REGISTRY[name] = target
+    return target
+
+
+# Step 1 vectorized (chung cho v3/v4/v5, version qua config)
+register_stage('vectorized.intent', 'vectorized_intent:vectorized_intent_detection')
+
+# solution_v2_window_logic
+register_stage('v2.intent', 'solution_v2_window_logic:step1_intent_detection')
+register_stage('v2.entities', 'solution_v2_window_logic:step2_entity_extraction')
+register_stage('v2.reply', 'solution_v2_window_logic:step3_reply_matching')
+register_stage('v2.confirm', 'solution_v2_window_logic:step4_confirmation_processing')
+register_stage('v2.assembly', 'solution_v2_window_logic:step5_deal_assembly')
+register_stage('v2.output', 'solution_v2_window_logic:create_final_output')
+
+# solution_step_by_step_intermediate
+register_stage('step.intent', 'solution_step_by_step_intermediate:step1_intent_detection')
+register_stage('step.entities', 'solution_step_by_step_intermediate:step2_entity_extraction')
+register_stage('step.reply', 'solution_step_by_step_intermediate:step3_reply_matching')
+register_stage('step.confirm', 'solution_step_by_step_intermediate:step4_confirmation_processing')
+register_stage('step.assembly', 'solution_step_by_step_intermediate:step5_deal_assembly')
+register_stage('step.output', 'solution_step_by_step_intermediate:create_final_output')
+
+# solution_debug_detailed
+register_stage('debug.intent', 'solution_debug_detailed:step1_intent_detection')
+register_stage('debug.entities', 'solution_debug_detailed:step2_entity_extraction')
+register_stage('debug.reply', 'solution_debug_detailed:step3_reply_matching')
+register_stage('debug.confirm', 'solution_debug_detailed:step4_confirmation_processing')
+register_stage('debug.assembly', 'solution_debug_detailed:step5_deal_assembly')
+register_stage('debug.output', 'solution_debug_detailed:create_final_output')
+
+# solution_debug_name_matching
+register_stage('names.intent', 'solution_debug_name_matching:step1_intent_detection')
+register_stage('names.entities', 'solution_debug_name_matching:step2_entity_extraction')
+register_stage('names.reply', 'solution_debug_name_matching:step3_reply_matching_with_names')
+register_stage('names.confirm', 'solution_debug_name_matching:step4_confirmation_with_names')
+register_stage('names.assembly', 'solution_debug_name_matching:step5_deal_assembly')
+register_stage('names.output', 'solution_debug_name_matching:create_final_output')
+
+# solution_v3_enhanced
+register_stage('v3.entities', 'solution_v3_enhanced:enhanced_entity_extraction')
+register_stage('v3.reply', 'solution_v3_enhanced:enhanced_reply_matching')
+register_stage('v3.confirm', 'solution_v3_enhanced:enhanced_confirmation_processing')
+register_stage('v3.assembly', 'solution_v3_enhanced:enhanced_deal_assembly')
+register_stage('v3.output', 'solution_v3_enhanced:create_final_output')
+
+# solution_v4_universal
+register_stage('v4.entities', 'solution_v4_universal:universal_entity_extraction')
+register_stage('v4.reply', 'solution_v4_universal:enhanced_reply_matching_v4')
+register_stage('v4.confirm', 'solution_v4_universal:enhanced_confirmation_processing_v4')
+register_stage('v4.assembly', 'solution_v4_universal:enhanced_deal_assembly_v4')
+register_stage('v4.output', 'solution_v4_universal:create_final_output')
+
+# solution_v5_collect_all_confirms
+register_stage('v5.entities', 'solution_v5_collect_all_confirms:enhanced_entity_extraction')
+register_stage('v5.reply', 'solution_v5_collect_all_confirms:enhanced_reply_matching')
+register_stage('v5.confirm', 'solution_v5_collect_all_confirms:enhanced_confirmation_processing_collect_all')
+register_stage('v5.assembly', 'solution_v5_collect_all_confirms:enhanced_deal_assembly')
+register_stage('v5.output', 'solution_v5_collect_all_confirms:create_final_output')
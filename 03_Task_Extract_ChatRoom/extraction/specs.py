@@ -0,0 +1,49 @@
+"""
+Pipeline spec cho từng version: danh sách stage (tên, implementation, config)
+
+- impl: tên trong STAGE_REGISTRY
+- config: kwargs truyền cho stage (và là 1 phần của cache key)
+- categories: cột string đổi sang category sau stage (như PIPELINE_STAGES của v5)
+"""
+
+from dataclasses import dataclass, field
+
+
+@dataclass
+class StageSpec:
+    name: str
+    impl: str
+    config: dict = field(default_factory=dict)
+    categories: list = field(default_factory=list)
+
+
+def five_stage(prefix, intent=None):
+    """Spec 5 stage chuẩn intent → entities → reply → confirm → assembly"""
+    return [
+        intent or StageSpec('intent', f'{prefix}.intent'),
+        StageSpec('entities', f'{prefix}.entities'),
+        StageSpec('reply', f'{prefix}.reply'),
+        StageSpec('confirm', f'{prefix}.confirm'),
+        StageSpec('assembly', f'{prefix}.assembly'),
+    ]
+
+
+PIPELINES = {
+    'v2': five_stage('v2'),
+    'step': five_stage('step'),
+    'debug': five_stage('debug'),
+    'names': five_stage('names'),
+    'v3': five_stage('v3', StageSpec('intent', 'vectorized.intent', {'version': 'v3'})),
+    'v4': five_stage('v4', StageSpec('intent', 'vectorized.intent', {'version': 'v4'})),
+    'v5': [
+        StageSpec('intent', 'vectorized.intent', {'version': 'v5'},
+                  ['date', 'bank_name', 'trader_name', 'intent_type', 'problems']),
+        StageSpec('entities', 'v5.entities', categories=['entity_side', 'entity_problems']),
+        StageSpec('reply', 'v5.reply', categories=['reply_bank', 'reply_trader', 'reply_action', 'reply_problems']),
+        StageSpec('confirm', 'v5.confirm', categories=['confirm_status', 'confirm_trader', 'confirm_problems']),
+        StageSpec('assembly', 'v5.assembly', categories=['final_buy_side', 'final_sell_side', 'deal_problems']),
+    ],
+}
+
+# Final output (format GT) của từng version
+OUTPUTS = {version: f'{version}.output' for version in PIPELINES}
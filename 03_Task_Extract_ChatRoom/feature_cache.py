@@ -0,0 +1,113 @@
+"""
+Feature cache - memo theo message (đã lower) dùng chung cho mọi stage trong 1 run
+
+Chat room lặp lại rất nhiều message ngắn ("done", "ok", "tks", "22 25"), nên
+mỗi feature của 1 message chỉ tính 1 lần rồi dùng lại ở các stage sau:
+
+- keywords:     keyword classes (keyword_scanner)
+- numeric:      numeric token stream (numbers, volume, 'for')
+- start_entities / reply_entities / confirm_status / confirm_entities:
+                kết quả rule của v5 (giá, side, action, target, status, key_calling)
+
+LRU có giới hạn (maxsize message), đếm hit / miss theo từng feature; stage
+runner ghi số hit / miss tăng thêm của từng stage vào run report.
+count_rule gọi trong lúc tính feature được ghi lại và phát lại khi hit, nên
+rule hits của run report không đổi khi có cache.
+put() nạp sẵn feature từ feature store (feature_store.preload_features).
+
+Giá trị trong cache dùng chung - chỉ đọc, không sửa.
+"""
+
+from collections import Counter, OrderedDict
+
+from instrumentation import count_rule, record_rules
+from keyword_scanner import SCANNER
+from numeric_tokens import NumericTokens
+
+DEFAULT_MAXSIZE = 65536
+
+
+class FeatureCache:
+    """LRU: message → {feature: (value, rule hits)}"""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = Counter()
+        self.misses = Counter()
+        self.evictions = 0
+
+    def _entry(self, message):
+        entry = self.entries.get(message)
+        if entry is None:
+            entry = self.entries[message] = {}
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.entries.move_to_end(message)
+        return entry
+
+    def get(self, message, feature, compute):
+        """compute(message) 1 lần / message / feature"""
+        entry = self._entry(message)
+        cached = entry.get(feature)
+        if cached is not None:
+            self.hits[feature] += 1
+            value, rules = cached
+            for rule, hits in rules:
+                count_rule(rule, hits)
+            return value
+
+        self.misses[feature] += 1
+        with record_rules() as rules:
+            value = compute(message)
+        entry[feature] = (value, tuple(rules))
+        return value
+
+    def put(self, message, feature, value, rules=()):
+        """Nạp sẵn feature đã tính ở nơi khác (feature store), không tính hit / miss"""
+        self._entry(message)[feature] = (value, tuple(rules))
+
+    def clear(self):
+        self.entries.clear()
+        self.hits.clear()
+        self.misses.clear()
+        self.evictions = 0
+
+    def snapshot(self):
+        return {'hits': dict(self.hits), 'misses': dict(self.misses), 'evictions': self.evictions}
+
+    def stats(self, since=None):
+        """Hit / miss / hit rate (tổng + từng feature), tính từ snapshot nếu có"""
+        since = since or {'hits': {}, 'misses': {}, 'evictions': 0}
+        features = {}
+        for feature in sorted(set(self.hits) | set(self.misses)):
+            hits = self.hits[feature] - since['hits'].get(feature, 0)
+            misses = self.misses[feature] - since['misses'].get(feature, 0)
+            if hits or misses:
+                features[feature] = {'hits': hits, 'misses': misses, 'hit_rate': hits / (hits + misses)}
+        hits = sum(row['hits'] for row in features.values())
+        misses = sum(row['misses'] for row in features.values())
+        return {
+            'entries': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+            'evictions': self.evictions - since['evictions'],
+            'features': features,
+        }
+
+
+FEATURES = FeatureCache()
+
+
+def keywords(message):
+    """Keyword classes của message (đã lower)"""
+    return FEATURES.get(message, 'keywords', SCANNER.classes)
+
+
+def numeric(message):
+    """NumericTokens của message (đã lower)"""
+    return FEATURES.get(message, 'numeric', NumericTokens)
@@ -0,0 +1,224 @@
+"""
+Feature store - bảng feature theo message, build 1 lần, dùng lại cho mọi version / sweep
+
+1 row / message của input (input_expanded_banks.csv):
+- message_id:      vị trí row trong input
+- seconds, date_ordinal: từ chat_log (integer)
+- message_hash:    hash nội dung message (đã lower), key của incremental rebuild
+- numbers:         list số không âm (extract_all_numbers)
+- volume, volume_unit: extract_volume
+- kw_<class>:      keyword flags (keyword_scanner.KEYWORD_CLASSES)
+- confirm_status:  fuzzy confirm status của v5 (confirmed / rejected / acknowledged / unknown)
+- confirm_rules:   rule hits lúc tính confirm_status ('confirm.status.<rule>', ';' nếu nhiều)
+- mentioned_name:  trader được gọi tên trong message (TraderNameIndex)
+
+Incremental: feature text chỉ phụ thuộc nội dung message, nên khi build lại
+chỉ tính các message_hash chưa có trong store cũ. Store cũ bị bỏ hẳn nếu code
+fingerprint của các hàm feature hoặc roster trader (cho mentioned_name) đổi.
+Metadata (fingerprint, roster hash, số message tính lại) ở <stem>.meta.json.
+
+Dùng trong pipeline: preload_features nạp kw_* (keyword classes) và
+confirm_status (kèm rule hits) vào feature cache, nên Step 1 (keyword flags)
+và Step 4 (confirm status) đọc từ store thay vì scan lại message
+(parameter_sweep.py, python -m extraction --features).
+
+Lưu bằng intermediate_store (.parquet mặc định, .pkl nếu không có pyarrow).
+
+Usage:
+    python feature_store.py --input input_expanded_banks.csv --output features.parquet
+    python feature_store.py --output features.parquet --columns message_id,volume,confirm_status
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from chat_log import load_chat_log
+from extraction.cache import code_fingerprint
+from feature_cache import FEATURES, keywords, numeric
+from instrumentation import record_rules
+from intermediate_store import save_intermediate, load_intermediate
+from keyword_scanner import KEYWORD_CLASSES
+from solution_debug_name_matching import TraderNameIndex, extract_name_from_message
+from solution_v5_collect_all_confirms import confirm_status
+
+DEFAULT_INPUT = 'input_expanded_banks.csv'
+DEFAULT_OUTPUT = 'features_input_expanded_banks.parquet'
+
+KEYWORD_COLUMNS = [f'kw_{name}' for name in KEYWORD_CLASSES]
+MESSAGE_COLUMNS = ['message_hash', 'numbers', 'volume', 'volume_unit'] + KEYWORD_COLUMNS + \
+    ['confirm_status', 'confirm_rules', 'mentioned_name']
+CATEGORY_COLUMNS = ['volume_unit', 'confirm_status', 'confirm_rules', 'mentioned_name']
+
+
+def message_features(message, name_index):
+    """Feature text của 1 message (đã lower)"""
+    tokens = numeric(message)
+    volume, unit = tokens.volume()
+    found = keywords(message)
+    with record_rules() as rules:
+        status = confirm_status(message)
+    row = {
+        'numbers': tokens.numbers(),
+        'volume': volume,
+        'volume_unit': unit,
+        'confirm_status': status,
+        'confirm_rules': ';'.join(rule for rule, hits in rules for _ in range(hits)),
+        'mentioned_name': extract_name_from_message(message, name_index),
+    }
+    for name, column in zip(KEYWORD_CLASSES, KEYWORD_COLUMNS):
+        row[column] = name in found
+    return row
+
+
+def _messages(df):
+    """Message đã lower của df (load_chat_log), như các stage dùng"""
+    column = 'message' if 'message' in df.columns else 'mess'
+    return [str(message).lower() for message in df[column]]
+
+
+def message_hashes(messages):
+    """uint64 hash nội dung (ổn định giữa các lần chạy)"""
+    return pd.util.hash_pandas_object(pd.Series(messages, dtype=object), index=False).to_numpy()
+
+
+def roster_hash(trader_names):
+    names = sorted(str(name) for name in pd.unique(trader_names))
+    return hashlib.sha256(json.dumps(names, ensure_ascii=False).encode()).hexdigest()
+
+
+def meta_path(path):
+    return os.path.splitext(path)[0] + '.meta.json'
+
+
+def _load_previous(path, fingerprint, roster):
+    """Bảng message_hash → feature của store cũ (None nếu không dùng lại được)"""
+    meta_file = meta_path(path)
+    if not os.path.exists(meta_file):
+        return None
+    with open(meta_file, encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('fingerprint') != fingerprint or meta.get('roster_hash') != roster:
+        return None
+    try:
+        previous = load_intermediate(path, columns=MESSAGE_COLUMNS)
+    except (OSError, ImportError, KeyError, ValueError):
+        return None
+    # category → object để concat với message mới không đổi dtype
+    return previous.drop_duplicates('message_hash').astype({column: object for column in CATEGORY_COLUMNS})
+
+
+def build_features(df, path=None, rebuild=False):
+    """Feature table của df (load_chat_log); path: store để dùng lại + ghi kết quả
+
+    Trả về (features, info) - info: số message tính lại / dùng lại, thời gian.
+    """
+    started = time.perf_counter()
+    messages = _messages(df)
+    hashes = message_hashes(messages)
+
+    fingerprint = code_fingerprint(message_features)
+    roster = roster_hash(df['trader_name'])
+    previous = None
+    if path is not None and not rebuild:
+        previous = _load_previous(path, fingerprint, roster)
+    known = set(previous['message_hash'].tolist()) if previous is not None else set()
+
+    # Chỉ tính message (nội dung) chưa có trong store
+    name_index = TraderNameIndex(df['trader_name'].unique().tolist())
+    new_rows = {}
+    for message, message_hash in zip(messages, hashes.tolist()):
+        if message_hash not in known and message_hash not in new_rows:
+            new_rows[message_hash] = message_features(message, name_index)
+    parts = []
+    if previous is not None:
+        parts.append(previous[previous['message_hash'].isin(hashes)])
+    if new_rows:
+        computed = pd.DataFrame.from_dict(new_rows, orient='index').rename_axis('message_hash').reset_index()
+        computed = computed[MESSAGE_COLUMNS].astype({'message_hash': np.uint64, 'volume': float})
+        parts.append(computed)
+    table = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=MESSAGE_COLUMNS)
+
+    seconds, date_ordinal = df['seconds'].to_numpy(), df['date_ordinal'].to_numpy()
+    features = pd.DataFrame({
+        'message_id': np.arange(len(df), dtype=np.int64),
+        'seconds': seconds,
+        'date_ordinal': date_ordinal,
+        'message_hash': hashes,
+    }).merge(table, on='message_hash', how='left', sort=False)
+
+    for column_name in KEYWORD_COLUMNS:
+        features[column_name] = features[column_name].astype(bool)
+    features['volume'] = features['volume'].astype(float)
+    for column_name in CATEGORY_COLUMNS:
+        features[column_name] = features[column_name].astype('category')
+
+    info = {
+        'rows': len(features),
+        'messages': len(set(hashes.tolist())),
+        'computed': len(new_rows),
+        'reused': len(known & set(hashes.tolist())),
+        'seconds': time.perf_counter() - started,
+    }
+
+    if path is not None:
+        saved = save_intermediate(features, path)
+        meta = {'fingerprint': fingerprint, 'roster_hash': roster, 'built': pd.Timestamp.now().isoformat(),
+                'files': saved, **info}
+        with open(meta_path(path), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+    return features, info
+
+
+def load_features(path=DEFAULT_OUTPUT, columns=None):
+    """Đọc feature table (chỉ các cột cần nếu có columns)"""
+    return load_intermediate(path, columns=columns)
+
+
+def preload_features(df, features, cache=FEATURES):
+    """Nạp keyword classes + confirm status của features (build_features(df)) vào feature cache
+
+    Stage gọi keywords() / confirm_status() sau đó lấy giá trị từ store (hit),
+    rule hits được phát lại như khi tính. Trả về số message đã nạp.
+    """
+    if len(features) != len(df):
+        raise ValueError(f"Feature table có {len(features)} rows, input có {len(df)} rows")
+    first = pd.Series(_messages(df)).drop_duplicates()
+    rows = features.iloc[first.index.to_numpy()]
+    flags = rows[KEYWORD_COLUMNS].to_numpy(dtype=bool)
+    names = list(KEYWORD_CLASSES)
+    for message, row_flags, status, rules in zip(first, flags, rows['confirm_status'], rows['confirm_rules']):
+        cache.put(message, 'keywords', frozenset(name for name, flag in zip(names, row_flags) if flag))
+        cache.put(message, 'confirm_status', status, [(rule, 1) for rule in rules.split(';') if rule])
+    return len(first)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build / inspect the per-message feature store')
+    parser.add_argument('--input', default=DEFAULT_INPUT)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--rebuild', action='store_true', help='Bỏ qua store cũ, tính lại tất cả')
+    parser.add_argument('--columns', default=None, help='Chỉ đọc + in các cột (không build)')
+    args = parser.parse_args()
+
+    if args.columns:
+        started = time.perf_counter()
+        features = load_features(args.output, columns=args.columns.split(','))
+        print(f"Loaded {len(features)} rows in {time.perf_counter() - started:.3f}s")
+        print(features.head().to_string())
+        return
+
+    df = load_chat_log(args.input)
+    features, info = build_features(df, args.output, rebuild=args.rebuild)
+    print(f"Feature store: {args.output}")
+    print(f"{info['rows']} rows, {info['messages']} distinct messages: "
+          f"{info['computed']} computed, {info['reused']} reused ({info['seconds']:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
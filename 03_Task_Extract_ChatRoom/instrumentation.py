@@ -0,0 +1,167 @@
+"""
+Instrumentation cho extraction runs
+
+- Rule hits: count_rule('volume.u') tại chỗ 1 regex / keyword rule khớp;
+  stage runner lấy số hit tăng thêm trong từng stage. record_rules() ghi lại
+  các hit trong 1 đoạn code (feature_cache phát lại khi dùng kết quả cache)
+- Run report (JSON): thông tin run + stats từng stage (wall/CPU time, rows
+  in/out, rows/sec, peak RSS, rule hits)
+- Compare: diff 2 report (2 lần chạy, hoặc 2 version trên cùng input)
+
+Usage:
+    python -m extraction --version v4 --report run_v4.json
+    python -m extraction --version v5 --report run_v5.json
+    python instrumentation.py compare run_v4.json run_v5.json
+"""
+
+import argparse
+import json
+import os
+import platform
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+RULE_HITS = Counter()
+_RECORDERS = []
+
+
+def count_rule(rule, hits=1):
+    """Ghi nhận rule khớp (hits lần)"""
+    RULE_HITS[rule] += int(hits)
+    for recorder in _RECORDERS:
+        recorder.append((rule, int(hits)))
+
+
+@contextmanager
+def record_rules():
+    """List (rule, hits) của các count_rule gọi trong block"""
+    recorder = []
+    _RECORDERS.append(recorder)
+    try:
+        yield recorder
+    finally:
+        _RECORDERS.pop()
+
+
+def rule_hits_since(snapshot):
+    """Số hit tăng thêm so với snapshot (dict(RULE_HITS) lúc trước)"""
+    return {rule: count - snapshot.get(rule, 0)
+            for rule, count in sorted(RULE_HITS.items())
+            if count != snapshot.get(rule, 0)}
+
+
+def build_report(version, input_file, stats, extra=None):
+    """Run report (dict, JSON-serializable)"""
+    import pandas as pd
+
+    stages = [dict(row) for row in stats]
+    total_hits = Counter()
+    cache_hits = cache_misses = 0
+    for row in stages:
+        total_hits.update(row.get('rule_hits', {}))
+        cache = row.get('feature_cache') or {}
+        cache_hits += cache.get('hits', 0)
+        cache_misses += cache.get('misses', 0)
+
+    report = {
+        'version': version,
+        'input': input_file,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'totals': {
+            'seconds': sum(row['seconds'] for row in stages),
+            'cpu_seconds': sum(row.get('cpu_seconds') or 0.0 for row in stages),
+            'rss_peak': max((row['rss_peak'] for row in stages if row.get('rss_peak')), default=None),
+            'feature_cache_hits': cache_hits,
+            'feature_cache_misses': cache_misses,
+            'feature_cache_hit_rate': cache_hits / (cache_hits + cache_misses) if cache_hits + cache_misses else None,
+        },
+        'stages': stages,
+        'rule_hits': dict(sorted(total_hits.items())),
+    }
+    if extra:
+        report.update(extra)
+    return report
+
+
+def write_report(path, report):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Run report saved: {path}")
+
+
+def load_report(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _ratio(old, new):
+    if not old:
+        return '    -'
+    return f"{new / old:5.2f}x"
+
+
+def compare_reports(old, new, top=20):
+    """In diff 2 report: stage metrics + rule hits thay đổi nhiều nhất"""
+    print(f"COMPARE: {old['version']} ({old['created_at']})  →  {new['version']} ({new['created_at']})")
+    print("-" * 70)
+
+    print(f"{'stage':<12} {'time old':>9} {'time new':>9} {'ratio':>7} {'rows/s old':>11} {'rows/s new':>11} {'rows out':>10}")
+    old_stages = {row['stage']: row for row in old['stages']}
+    new_stages = {row['stage']: row for row in new['stages']}
+    for name in list(old_stages) + [s for s in new_stages if s not in old_stages]:
+        a = old_stages.get(name, {})
+        b = new_stages.get(name, {})
+        rows_out = f"{a.get('rows_out', '-')}→{b.get('rows_out', '-')}"
+        print(f"{name:<12} {a.get('seconds', 0):9.3f} {b.get('seconds', 0):9.3f} "
+              f"{_ratio(a.get('seconds'), b.get('seconds', 0)):>7} "
+              f"{a.get('rows_per_sec') or 0:11.0f} {b.get('rows_per_sec') or 0:11.0f} {rows_out:>10}")
+    print(f"{'total':<12} {old['totals']['seconds']:9.3f} {new['totals']['seconds']:9.3f} "
+          f"{_ratio(old['totals']['seconds'], new['totals']['seconds']):>7}")
+    if 'deals' in old or 'deals' in new:
+        print(f"{'deals':<12} {old.get('deals', '-')!s:>9} {new.get('deals', '-')!s:>9}")
+    print()
+
+    old_hits = old.get('rule_hits', {})
+    new_hits = new.get('rule_hits', {})
+    changed = sorted(
+        ((rule, old_hits.get(rule, 0), new_hits.get(rule, 0)) for rule in set(old_hits) | set(new_hits)),
+        key=lambda item: (-abs(item[2] - item[1]), item[0])
+    )
+    changed = [item for item in changed if item[1] != item[2]]
+    print(f"RULE HITS CHANGED: {len(changed)}")
+    for rule, a, b in changed[:top]:
+        print(f"  {rule:<40} {a:8d} → {b:8d} ({b - a:+d})")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extraction run reports')
+    sub = parser.add_subparsers(dest='command', required=True)
+    compare = sub.add_parser('compare', help='Diff 2 run reports')
+    compare.add_argument('old')
+    compare.add_argument('new')
+    compare.add_argument('--top', type=int, default=20, help='Số rule hits thay đổi hiển thị')
+    show = sub.add_parser('show', help='In stage stats + rule hits của 1 report')
+    show.add_argument('report')
+    args = parser.parse_args()
+
+    if args.command == 'compare':
+        compare_reports(load_report(args.old), load_report(args.new), top=args.top)
+    elif args.command == 'show':
+        from stage_runner import print_stage_report
+        report = load_report(args.report)
+        print(f"{report['version']} - {report['input']} ({report['created_at']})")
+        print_stage_report(report['stages'])
+        for rule, count in sorted(report['rule_hits'].items(), key=lambda item: -item[1]):
+            print(f"  {rule:<40} {count:8d}")
+
+
+if __name__ == "__main__":
+    main()
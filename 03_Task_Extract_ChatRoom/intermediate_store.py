@@ -0,0 +1,118 @@
+"""
+Intermediate store - lưu / đọc step DataFrame dạng columnar
+
+- .parquet (mặc định) hoặc .feather / .arrow (Arrow IPC, không nén → đọc
+  memory-mapped); giữ nguyên dtype (category, bool, Int64, float)
+- Đọc chọn cột: load_intermediate(path, columns=[...])
+- CSV utf-8-sig (cho Excel) chỉ ghi khi cần: save_intermediate(..., csv=True)
+  hoặc chạy script với --csv
+
+Cần pyarrow. Nếu không có, lưu pickle (.pkl, vẫn giữ dtype) và in WARNING.
+Cột object chỉ chứa số / None (vd entity_price của v3/v4) đọc lại thành float64.
+
+Usage:
+    python intermediate_store.py intermediate_v5_collect_all_results.parquet --columns intent_type,reply_found
+    python intermediate_store.py intermediate_v5_collect_all_results.parquet --to_csv out.csv
+"""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+ARROW_EXTENSIONS = ('.feather', '.arrow')
+FALLBACK_EXTENSION = '.pkl'
+
+
+def csv_requested(argv=None):
+    """--csv trong command line của script"""
+    return '--csv' in (sys.argv if argv is None else argv)
+
+
+def _arrow_compatible(df):
+    """Cột object có giá trị lẫn kiểu (vd str + float) → str, giữ None/NaN"""
+    columns = {}
+    for column in df.columns:
+        if df[column].dtype != object:
+            continue
+        try:
+            pa.array(df[column], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            values = df[column]
+            columns[column] = values.where(values.isna(), values.astype(str))
+    return df.assign(**columns) if columns else df
+
+
+def save_intermediate(df, path, csv=False):
+    """Lưu df vào path (.parquet / .feather / .arrow); csv=True ghi thêm <stem>.csv
+
+    Trả về danh sách file đã ghi.
+    """
+    stem, ext = os.path.splitext(path)
+    saved = []
+
+    if pa is None:
+        print("WARNING: pyarrow not installed, saving intermediate as pickle")
+        path = stem + FALLBACK_EXTENSION
+        df.to_pickle(path)
+    elif ext in ARROW_EXTENSIONS:
+        feather.write_feather(_arrow_compatible(df), path, compression='uncompressed')
+    else:
+        _arrow_compatible(df).to_parquet(path)
+    saved.append(path)
+
+    if csv:
+        csv_path = stem + '.csv'
+        df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+        saved.append(csv_path)
+    return saved
+
+
+def load_intermediate(path, columns=None, memory_map=True):
+    """Đọc intermediate (chỉ các cột cần nếu có columns)"""
+    stem, ext = os.path.splitext(path)
+    fallback = stem + FALLBACK_EXTENSION
+    if (pa is None or not os.path.exists(path)) and ext != '.csv' and os.path.exists(fallback):
+        path, ext = fallback, FALLBACK_EXTENSION
+
+    if ext == FALLBACK_EXTENSION:
+        df = pd.read_pickle(path)
+        return df[columns] if columns else df
+    if ext == '.csv':
+        return pd.read_csv(path, encoding='utf-8-sig', usecols=columns)
+    if pa is None:
+        raise ImportError(f"pyarrow is required to read {path}")
+    if ext in ARROW_EXTENSIONS:
+        return feather.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+    return pd.read_parquet(path, columns=columns, memory_map=memory_map)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect / convert intermediate results')
+    parser.add_argument('path')
+    parser.add_argument('--columns', default=None, help='Danh sách cột, cách nhau bởi dấu phẩy')
+    parser.add_argument('--to_csv', default=None, help='Xuất CSV (utf-8-sig) cho Excel')
+    args = parser.parse_args()
+
+    columns = args.columns.split(',') if args.columns else None
+    df = load_intermediate(args.path, columns=columns)
+
+    if args.to_csv:
+        df.to_csv(args.to_csv, index=False, encoding='utf-8-sig')
+        print(f"CSV saved: {args.to_csv}")
+    else:
+        print(f"{len(df)} rows x {len(df.columns)} columns")
+        print(df.dtypes.to_string())
+        print()
+        print(df.head().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Keyword scanner - 1 regex cho mọi keyword list của intent / entities / reply / confirm
+
+Mỗi keyword (hoặc typo pattern) là 1 named group g<i>, gắn với các keyword
+class chứa nó (vd 'bid' ∈ bid_ask + side_bid). Regex:
+
+    (?=P0|P1|...)(?=(?P<g0>P0)?)(?=(?P<g1>P1)?)...
+
+- lookahead đầu: regex engine tự bỏ qua các vị trí không có keyword nào
+- mỗi group optional trong lookahead riêng: tại 1 vị trí báo MỌI pattern khớp
+  (kể cả chồng nhau: 'done' chứa 'on', 'oki' vừa là 'ok' vừa là 'ok[ie]')
+→ 1 lần finditer / message cho ra mọi keyword class + vị trí, cùng semantics
+với `any(kw in message for kw in ...)` và `re.search(pattern, message)`.
+
+Usage:
+    from keyword_scanner import SCANNER
+    SCANNER.classes('bid 44 4u')            # frozenset({'bid_ask', 'side_bid'})
+    SCANNER.scan('done anh toàn')           # {'confirm': [(0, 'done'), ...], 'time': [(1, 'on')], ...}
+    SCANNER.flags(messages, ['bid_ask'])    # bool array / class, scan mỗi message khác nhau 1 lần
+
+Memo theo message nằm ở feature_cache (dùng chung giữa các stage).
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+BID_ASK_KEYWORDS = ['bid', 'ask', 'offer', 'off', 'bán', 'mua', 'có', 'còn']
+TIME_KEYWORDS = ['on', 'spt', '1m', '1w', 'spot', '6m', '3m', '2m', '6w']
+REPLY_KEYWORDS = ['buy', 'sell', 'khớp']
+
+CONFIRM_KEYWORDS_PLAIN = ['done', 'ok', 'not suit', 'tks', 'thanks']
+CONFIRM_KEYWORDS_FUZZY = ['done', 'ok', 'not suit', 'tks', 'thanks', 'thank']
+CONFIRM_TYPO_PATTERNS = [
+    r'd[so]ne',     # dsone, dnoe
+    r'ok[ie]',      # oki, oke
+    r'tk+s+',       # tkss, tksss
+    r'than[kx]',    # thanx, thankx
+    r'don[ea]',     # dona, done
+    r'o+k+',        # ookkk
+]
+
+BID_KEYWORDS = ['bid', 'mua']
+ASK_KEYWORDS = ['ask', 'offer', 'off', 'có', 'còn', 'bán']
+
+
+def _literal(keywords):
+    return [re.escape(kw) for kw in keywords]
+
+
+# class → patterns (regex). Keyword thường đi qua re.escape
+KEYWORD_CLASSES = {
+    # Step 1: intent
+    'bid_ask': _literal(BID_ASK_KEYWORDS),
+    'time': _literal(TIME_KEYWORDS),
+    'reply': _literal(REPLY_KEYWORDS),
+    'confirm': _literal(CONFIRM_KEYWORDS_PLAIN),
+    'confirm_fuzzy': _literal(CONFIRM_KEYWORDS_FUZZY) + CONFIRM_TYPO_PATTERNS,
+    # Step 2: side của START
+    'side_bid': _literal(BID_KEYWORDS),
+    'side_ask': _literal(ASK_KEYWORDS),
+    # Step 3: action của REPLY
+    'action_buy': _literal(['buy']),
+    'action_sell': _literal(['sell']),
+    'action_match': _literal(['khớp']),
+    # Step 4: status của CONFIRM
+    'status_done_ok': _literal(['done', 'ok']),
+    'status_not_suit': _literal(['not suit']),
+    'status_thanks': _literal(['tks', 'thanks']),
+    'fuzzy_done': [r'd[so]ne'],
+    'fuzzy_oki': [r'ok[ie]'],
+    'fuzzy_tks': [r'tk+s+'],
+}
+
+
+class KeywordScanner:
+    """1 compiled regex cho tất cả keyword classes"""
+
+    def __init__(self, keyword_classes=KEYWORD_CLASSES):
+        self.keyword_classes = dict(keyword_classes)
+        self.patterns = []          # pattern i ↔ group g<i>
+        self.pattern_classes = []   # pattern i → tuple classes
+        index = {}
+        for name, patterns in self.keyword_classes.items():
+            for pattern in patterns:
+                if pattern not in index:
+                    index[pattern] = len(self.patterns)
+                    self.patterns.append(pattern)
+                    self.pattern_classes.append([])
+                self.pattern_classes[index[pattern]].append(name)
+        self.pattern_classes = [tuple(names) for names in self.pattern_classes]
+
+        any_pattern = '|'.join(self.patterns)
+        groups = ''.join(f'(?=(?P<g{i}>{pattern})?)' for i, pattern in enumerate(self.patterns))
+        self.regex = re.compile(f'(?=(?:{any_pattern})){groups}', re.DOTALL)
+
+    def fingerprint_data(self):
+        """Keyword tables cho extraction.cache.code_fingerprint"""
+        return self.keyword_classes
+
+    def scan(self, message):
+        """{class: [(vị trí, text khớp), ...]} theo thứ tự vị trí"""
+        hits = {}
+        for match in self.regex.finditer(message):
+            start = match.start()
+            for i, text in enumerate(match.groups()):
+                if text is not None:
+                    for name in self.pattern_classes[i]:
+                        hits.setdefault(name, []).append((start, text))
+        return hits
+
+    def classes(self, message):
+        """frozenset các class có ít nhất 1 hit"""
+        names = set()
+        for match in self.regex.finditer(message):
+            for i, text in enumerate(match.groups()):
+                if text is not None:
+                    names.update(self.pattern_classes[i])
+        return frozenset(names)
+
+    def flags(self, messages, names, classes=None):
+        """{class: bool array} cho 1 Series message (đã lower), scan mỗi message khác nhau 1 lần
+
+        classes: hàm message → classes thay cho self.classes (vd feature_cache.keywords)
+        """
+        classes = classes or self.classes
+        codes, uniques = pd.factorize(messages)
+        found = [classes(message) for message in uniques]
+        out = {}
+        for name in names:
+            unique_flags = np.fromiter((name in hit for hit in found), dtype=bool, count=len(found))
+            out[name] = unique_flags[codes] if len(codes) else np.zeros(0, dtype=bool)
+        return out
+
+
+SCANNER = KeywordScanner()
@@ -0,0 +1,120 @@
+"""
+Numeric tokenizer - 1 lần quét message cho number / volume / dấu âm / 'for'
+
+Thay cho các lần re.search / finditer lặp lại trong extract_volume,
+extract_all_numbers và rule 'for' của entity extraction. 1 regex đi từ trái
+sang phải, chỉ dừng ở vị trí có chữ số, '-' hoặc 'for'; tại mỗi vị trí các
+lookahead optional báo token nào bắt đầu ở đó:
+
+- number:     \\b\\d+(?:\\.\\d+)?\\b  (negative nếu có '-' trong 5 ký tự trước)
+- volume:     số + unit u / mio / k / m / mil (cùng regex với extract_volume)
+- negative:   dấu '-'
+- for:        marker 'for' (+ số ngay sau 'for ' nếu có)
+
+re.search(pattern) = vị trí đầu tiên pattern khớp, nên token đầu tiên của mỗi
+unit chính là kết quả re.search cũ; number token bỏ các vị trí đã nằm trong
+number trước đó (giống finditer không chồng nhau). Kết quả giống hệt các hàm cũ.
+
+Memo theo message: feature_cache.numeric(message).
+
+Usage:
+    tokens = NumericTokens('98 00 for 3')
+    tokens.numbers()               # [98.0, 0.0, 3.0]
+    tokens.volume()                # (None, None)
+    tokens.for_volume()            # 3.0
+    tokens.numbers_before_for()    # [98.0, 0.0]
+"""
+
+import re
+from collections import namedtuple
+
+NUMBER_PATTERN = r'\b\d+(?:\.\d+)?\b'
+
+# unit → (pattern số, multiplier); thứ tự = ưu tiên của extract_volume
+# ("1 u" có dấu cách đã nằm trong \s*u nên không cần pattern riêng)
+VOLUME_UNITS = [
+    ('u', r'(?P<u>\d+(?:\.\d+)?)\s*u\b', 1),            # 5u
+    ('mio', r'(?P<mio>\d+(?:\.\d+)?)\s*mio\b', 1),      # 1.5mio
+    ('k', r'(?P<k>\d+)\s*k\b', 0.001),                  # 500k → 0.5
+    ('m', r'(?P<m>\d+)\s*m\b', 1),                      # 10m → 10
+    ('mil', r'(?P<mil>\d+(?:\.\d+)?)\s*mil\b', 1),      # 2mil
+]
+
+NEGATIVE_CONTEXT = 5  # số ký tự trước number được kiểm tra '-'
+
+TOKEN_RE = re.compile(
+    r'(?=[\d-]|for)'
+    r'(?=(?P<negative>-)?)'
+    r'(?=(?P<for>for)?)'
+    r'(?=(?:for\s+(?P<for_number>\d+(?:\.\d+)?))?)'
+    rf'(?=(?P<number>{NUMBER_PATTERN})?)'
+    + ''.join(f'(?=(?:{pattern})?)' for _, pattern, _ in VOLUME_UNITS)
+)
+DIGIT_RE = re.compile(r'\d')
+
+Token = namedtuple('Token', ['kind', 'start', 'end', 'value', 'unit', 'negative'])
+
+
+class NumericTokens:
+    """Token stream của 1 message (đã lower), theo thứ tự vị trí"""
+
+    def __init__(self, message):
+        self.message = message
+        self.tokens = []
+        number_end = 0
+        dashes = []
+        for match in TOKEN_RE.finditer(message):
+            start = match.start()
+            if match.group('negative'):
+                dashes.append(start)
+                self.tokens.append(Token('negative', start, start + 1, None, None, False))
+            if match.group('for'):
+                value = match.group('for_number')
+                self.tokens.append(Token('for', start, start + 3, float(value) if value else None, None, False))
+            number = match.group('number')
+            if number and start >= number_end:
+                number_end = match.end('number')
+                negative = any(start - NEGATIVE_CONTEXT <= dash < start for dash in dashes[-NEGATIVE_CONTEXT:])
+                self.tokens.append(Token('number', start, number_end, float(number), None, negative))
+            for unit, _, _ in VOLUME_UNITS:
+                value = match.group(unit)
+                if value:
+                    self.tokens.append(Token('volume', start, match.end(unit), float(value), unit, False))
+
+    def kind(self, kind):
+        return [token for token in self.tokens if token.kind == kind]
+
+    def numbers(self):
+        """Numbers không âm - giống extract_all_numbers"""
+        return [token.value for token in self.tokens if token.kind == 'number' and not token.negative]
+
+    def volume(self):
+        """(volume, unit) theo thứ tự ưu tiên unit - giống extract_volume; (None, None) nếu không có"""
+        first = {}
+        for token in self.tokens:
+            if token.kind == 'volume' and token.unit not in first:
+                first[token.unit] = token
+        for unit, _, multiplier in VOLUME_UNITS:
+            if unit in first:
+                return first[unit].value * multiplier, unit
+        return None, None
+
+    def first_for(self):
+        """Token 'for' đầu tiên (None nếu message không có 'for')"""
+        return next((token for token in self.tokens if token.kind == 'for'), None)
+
+    def for_volume(self):
+        """Số sau 'for ' đầu tiên có số - giống re.search(r'for\\s+(\\d+(?:\\.\\d+)?)')"""
+        return next((token.value for token in self.tokens
+                     if token.kind == 'for' and token.value is not None), None)
+
+    def numbers_before_for(self):
+        """extract_all_numbers(message.split('for')[0])"""
+        marker = self.first_for()
+        if marker is None:
+            return self.numbers()
+        # Số sát 'for' (vd "98for"): trong chuỗi cắt có \\b ở cuối, trong message thì không
+        if marker.start > 0 and DIGIT_RE.match(self.message, marker.start - 1):
+            return NumericTokens(self.message[:marker.start]).numbers()
+        return [token.value for token in self.tokens
+                if token.kind == 'number' and not token.negative and token.end <= marker.start]
@@ -0,0 +1,144 @@
+"""
+Parallel v5 pipeline - chạy Step 2-5 theo partition Date trên nhiều CPU core
+
+Window / reply / confirm của v5 đều nằm trong 1 Date, nên:
+- Step 1 (vectorized, nhanh) chạy 1 lần trên cả file: carry-forward của
+  negative message lấy từ row trước đó, có thể thuộc ngày khác
+- Chia rows theo Date (hoặc Date + chat room với --room_column), gom các
+  partition thành task cân bằng theo số rows, chạy Step 2-5 mỗi task trong
+  ProcessPoolExecutor
+- Mỗi task kèm theo 5 START gần nhất trước mỗi REPLY (start_context của Step 3
+  lấy theo cả file, không theo ngày); deal của các row context bị bỏ
+- Merge: deal sort theo position gốc của START → STT giống chạy tuần tự
+
+Usage:
+    python parallel_pipeline.py
+    python parallel_pipeline.py --input input_expanded_banks.csv --workers 8
+    python parallel_pipeline.py --room_column room
+"""
+
+import argparse
+import contextlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from chat_log import load_chat_log, MISSING
+from stage_runner import run_stages
+from solution_v5_collect_all_confirms import PIPELINE_STAGES, create_final_output
+
+INTENT_STAGES = PIPELINE_STAGES[:1]
+DEAL_STAGES = PIPELINE_STAGES[1:]
+
+START_CONTEXT = 5  # = starts_before(reply_pos, 5) trong Step 3
+
+DEAL_COLUMNS = ['deal_valid', 'final_buy_side', 'final_sell_side', 'final_amount',
+                'final_price', 'final_actual_price']
+
+
+def partition_keys(step1_df, rooms=None):
+    """Key partition cho mỗi row: date_ordinal, hoặc id của (date, room)"""
+    dates = step1_df['date_ordinal'].to_numpy(dtype=np.int64)
+    if rooms is None:
+        return dates
+    keys, _ = pd.factorize(pd.MultiIndex.from_arrays([dates, np.asarray(rooms)]))
+    keys = keys.astype(np.int64)
+    keys[dates == MISSING] = MISSING  # NaN Date không khớp ngày nào
+    return keys
+
+
+def plan_tasks(keys, n_tasks):
+    """Gom partition thành n_tasks task (partition lớn trước, vào task ít rows nhất)"""
+    unique_keys, inverse, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+    order = np.argsort(-sizes, kind='stable')
+    task_of_key = np.empty(len(unique_keys), dtype=np.int64)
+    loads = np.zeros(min(n_tasks, len(unique_keys)), dtype=np.int64)
+    for key_idx in order:
+        task = int(np.argmin(loads))
+        task_of_key[key_idx] = task
+        loads[task] += sizes[key_idx]
+    task_of_row = task_of_key[inverse]
+    return [np.flatnonzero(task_of_row == task) for task in range(len(loads))]
+
+
+def with_start_context(step1_df, positions):
+    """positions + 5 START gần nhất (cả file) trước mỗi REPLY trong positions"""
+    intents = step1_df['intent_type'].to_numpy()
+    start_positions = np.flatnonzero(intents == 'START')
+    replies = positions[intents[positions] == 'REPLY']
+    hi = np.searchsorted(start_positions, replies, side='left')
+    context = [positions]
+    for k in range(1, START_CONTEXT + 1):
+        before = hi - k
+        context.append(start_positions[before[before >= 0]])
+    return np.unique(np.concatenate(context))
+
+
+def run_task(frame, owned):
+    """Step 2-5 trên 1 task, trả về các row deal hợp lệ (index = position gốc)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        step5_df, _ = run_stages(frame.reset_index(drop=True), DEAL_STAGES, report=False)
+    step5_df.index = frame.index
+    valid = step5_df['deal_valid'].to_numpy() & owned
+    return step5_df.loc[valid, DEAL_COLUMNS]
+
+
+def run_parallel(df, workers=None, room_column=None, tasks_per_worker=4):
+    """Chạy v5 trên df (output của load_chat_log), trả về final DataFrame (format GT)"""
+    workers = workers or os.cpu_count() or 1
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        step1_df, _ = run_stages(df, INTENT_STAGES, report=False)
+
+    rooms = df[room_column].to_numpy() if room_column else None
+    keys = partition_keys(step1_df, rooms)
+    # Mỗi partition là 1 "ngày" riêng cho WindowIndex → không ghép window giữa các room
+    step1_df['date_ordinal'] = keys
+
+    tasks = plan_tasks(keys, workers * tasks_per_worker)
+    print(f"Partitions: {len(np.unique(keys))}, tasks: {len(tasks)}, workers: {workers}")
+
+    jobs = []
+    for positions in tasks:
+        frame_positions = with_start_context(step1_df, positions)
+        frame = step1_df.iloc[frame_positions]
+        owned = np.isin(frame_positions, positions)
+        jobs.append((frame, owned))
+
+    if workers == 1:
+        parts = [run_task(frame, owned) for frame, owned in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(run_task, *zip(*jobs)))
+
+    # STT theo thứ tự START trong file gốc (giống chạy tuần tự)
+    deals = pd.concat(parts).sort_index() if parts else pd.DataFrame(columns=DEAL_COLUMNS)
+    return create_final_output(deals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Date-partitioned parallel v5 pipeline')
+    parser.add_argument('--input', default='input_expanded_banks.csv')
+    parser.add_argument('--output', default='solution_v5_parallel_results.csv')
+    parser.add_argument('--workers', type=int, default=None, help='Số process (mặc định: số CPU)')
+    parser.add_argument('--room_column', default=None, help='Cột chat room, partition theo (Date, room)')
+    args = parser.parse_args()
+
+    df = load_chat_log(args.input)
+    print(f"Loaded {len(df)} messages from input")
+
+    final_df = run_parallel(df, workers=args.workers, room_column=args.room_column)
+
+    if len(final_df) > 0:
+        final_df.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"Valid deals extracted: {len(final_df)}")
+        print(f"File saved: {args.output}")
+    else:
+        print("No valid deals created!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Parameter sweep - chạy v5 trên 1 grid ngưỡng rule, đánh giá với ground truth
+
+Ngưỡng (mặc định = giá trị gốc trong code):
+- quick_reply_seconds: Case 1 của Step 1 (1 số duy nhất + reply trong 30s)
+- reply_window:        START → REPLY (5 phút)
+- confirm_window:      START → CONFIRM (5 phút)
+- price_range:         final_price hợp lệ (0-99)
+- volume_range:        final_amount hợp lệ (0.1-100)
+
+Mỗi stage chỉ chạy 1 lần cho mỗi tổ hợp tham số mà nó phụ thuộc:
+- feature store (feature_store.py) build / dùng lại 1 lần; keyword classes +
+  confirm status của store nạp vào feature cache (process chính + mỗi worker),
+  Step 1 và Step 4 đọc từ đó thay vì scan lại message
+- Step 1-2 (intent + entities) chạy ở process chính, 1 lần / quick_reply_seconds
+- Grid chia theo (quick_reply_seconds, reply_window) thành task cho
+  ProcessPoolExecutor: task chạy Step 3 1 lần, Step 4 1 lần / confirm_window,
+  Step 5 + evaluate cho từng point
+
+Report xếp hạng theo F1 (rồi exact matches, precision): mỗi point có
+seconds = tổng thời gian các stage của point (như chạy riêng, kể cả stage
+dùng chung) và point_seconds = phần chỉ point đó tốn (Step 5 + evaluate).
+
+Usage:
+    python parameter_sweep.py
+    python parameter_sweep.py --reply_window 3,5,10 --confirm_window 5,10 --volume_range 0.1-100,1-50
+    python parameter_sweep.py --workers 1 --output sweep_results.csv
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from chat_log import load_chat_log
+from extraction import PIPELINES, get_stage
+from feature_store import build_features, preload_features
+from simple_evaluate import evaluate_frames
+from stage_runner import run_stage
+from vectorized_intent import QUICK_REPLY_SECONDS
+from solution_v5_collect_all_confirms import (
+    REPLY_WINDOW_MINUTES, CONFIRM_WINDOW_MINUTES, PRICE_RANGE, VOLUME_RANGE,
+)
+
+SPECS = {spec.name: spec for spec in PIPELINES['v5']}
+
+DEFAULT_GRID = {
+    'quick_reply_seconds': [20, QUICK_REPLY_SECONDS, 60],
+    'reply_window': [3, REPLY_WINDOW_MINUTES, 10],
+    'confirm_window': [3, CONFIRM_WINDOW_MINUTES, 10],
+    'price_range': [PRICE_RANGE],
+    'volume_range': [VOLUME_RANGE, (1, 100)],
+}
+
+# Step 1-2 theo quick_reply_seconds + ground truth; set trong từng worker (initializer)
+_PREFIXES = {}
+_GT = None
+
+
+def parse_values(text, cast=float):
+    """'3,5,10' → [3, 5, 10] (int nếu được)"""
+    values = []
+    for item in text.split(','):
+        value = cast(item)
+        values.append(int(value) if float(value).is_integer() else value)
+    return values
+
+
+def parse_ranges(text):
+    """'0-99,10-90' → [(0, 99), (10, 90)]"""
+    ranges = []
+    for item in text.split(','):
+        low, high = item.split('-', 1)
+        ranges.append(tuple(parse_values(f'{low},{high}')))
+    return ranges
+
+
+def grid_points(grid):
+    """Mọi tổ hợp của grid (dict tham số → list giá trị)"""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _stage(name, df, **config):
+    """1 stage của v5 (config của spec + tham số sweep), không in log"""
+    spec = SPECS[name]
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_stage(name, get_stage(spec.impl), df, spec.categories, **{**spec.config, **config})
+
+
+def run_prefix(df, quick_reply_seconds):
+    """Step 1-2 cho 1 giá trị quick_reply_seconds → (step2_df, seconds)"""
+    step1_df, intent_stats = _stage('intent', df, quick_reply_seconds=quick_reply_seconds)
+    step2_df, entity_stats = _stage('entities', step1_df)
+    return step2_df, intent_stats['seconds'] + entity_stats['seconds']
+
+
+def _init_worker(prefixes, gt_df, feature_seed=None):
+    """feature_seed: (df, features) để nạp feature store vào feature cache của worker"""
+    global _PREFIXES, _GT
+    _PREFIXES, _GT = prefixes, gt_df
+    if feature_seed is not None:
+        preload_features(*feature_seed)
+
+
+def run_task(quick_reply_seconds, reply_window, points):
+    """Step 3-5 + evaluate cho các point cùng (quick_reply_seconds, reply_window)"""
+    output = get_stage('v5.output')
+    step2_df, prefix_seconds = _PREFIXES[quick_reply_seconds]
+    step3_df, reply_stats = _stage('reply', step2_df.copy(), window_minutes=reply_window)
+
+    rows = []
+    for confirm_window in dict.fromkeys(point['confirm_window'] for point in points):
+        step4_df, confirm_stats = _stage('confirm', step3_df.copy(), window_minutes=confirm_window)
+        shared = prefix_seconds + reply_stats['seconds'] + confirm_stats['seconds']
+
+        for point in points:
+            if point['confirm_window'] != confirm_window:
+                continue
+            started = time.perf_counter()
+            step5_df, _ = _stage('assembly', step4_df.copy(),
+                                 price_range=point['price_range'], volume_range=point['volume_range'])
+            with contextlib.redirect_stdout(io.StringIO()):
+                final_df = output(step5_df)
+            metrics = evaluate_frames(final_df, _GT)
+            point_seconds = time.perf_counter() - started
+            rows.append({**point, **{key: value for key, value in metrics.items() if key != 'wrong_field_only'},
+                         'seconds': shared + point_seconds, 'point_seconds': point_seconds})
+    return rows
+
+
+def run_sweep(df, gt_df, grid, workers=None, feature_store=None):
+    """Chạy grid trên df (load_chat_log), trả về DataFrame kết quả đã xếp hạng"""
+    workers = workers or os.cpu_count() or 1
+    points = grid_points(grid)
+
+    # Feature 1 lần: build / load store, nạp vào feature cache cho các stage
+    started = time.perf_counter()
+    features, info = build_features(df, feature_store)
+    preload_features(df, features)
+    print(f"Features: {info['messages']} distinct messages ({info['computed']} computed, "
+          f"{info['reused']} reused) in {time.perf_counter() - started:.2f}s")
+
+    prefixes = {}
+    for quick_reply_seconds in grid['quick_reply_seconds']:
+        prefixes[quick_reply_seconds] = run_prefix(df, quick_reply_seconds)
+
+    tasks = {}
+    for point in points:
+        tasks.setdefault((point['quick_reply_seconds'], point['reply_window']), []).append(point)
+    print(f"Grid: {len(points)} points, {len(tasks)} tasks, workers: {workers}")
+
+    started = time.perf_counter()
+    if workers == 1:
+        _init_worker(prefixes, gt_df)
+        parts = [run_task(*key, group) for key, group in tasks.items()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(prefixes, gt_df, (df, features))) as executor:
+            futures = [executor.submit(run_task, *key, group) for key, group in tasks.items()]
+            parts = [future.result() for future in futures]
+    print(f"Sweep finished in {time.perf_counter() - started:.2f}s")
+
+    results = pd.DataFrame([row for part in parts for row in part])
+    results = results.sort_values(['f1', 'exact_matches', 'precision', 'seconds'],
+                                  ascending=[False, False, False, True], kind='stable')
+    results.insert(0, 'rank', range(1, len(results) + 1))
+    return results.reset_index(drop=True)
+
+
+def print_sweep_report(results, top=20):
+    print()
+    print(f"{'rank':>4} {'quick_s':>7} {'reply':>5} {'confirm':>7} {'price':>9} {'volume':>10} "
+          f"{'deals':>6} {'exact':>6} {'P':>6} {'R':>6} {'F1':>6} {'time(s)':>8}")
+    for row in results.head(top).itertuples(index=False):
+        price = f"{row.price_range[0]}-{row.price_range[1]}"
+        volume = f"{row.volume_range[0]}-{row.volume_range[1]}"
+        print(f"{row.rank:>4} {row.quick_reply_seconds:>7} {row.reply_window:>5} {row.confirm_window:>7} "
+              f"{price:>9} {volume:>10} {row.solution_deals:>6} {row.exact_matches:>6} "
+              f"{row.precision:6.3f} {row.recall:6.3f} {row.f1:6.3f} {row.seconds:8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel parameter sweep of v5 rule thresholds')
+    parser.add_argument('--input', default='input_expanded_banks.csv')
+    parser.add_argument('--gt', default='ground_truth_2digit.csv')
+    parser.add_argument('--quick_reply_seconds', default=None, help='vd 20,30,60')
+    parser.add_argument('--reply_window', default=None, help='Phút, vd 3,5,10')
+    parser.add_argument('--confirm_window', default=None, help='Phút, vd 3,5,10')
+    parser.add_argument('--price_range', default=None, help='vd 0-99,10-90')
+    parser.add_argument('--volume_range', default=None, help='vd 0.1-100,1-50')
+    parser.add_argument('--workers', type=int, default=None, help='Số process (mặc định: số CPU)')
+    parser.add_argument('--feature_store', default='features_input_expanded_banks.parquet')
+    parser.add_argument('--output', default='sweep_results.csv')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    grid = dict(DEFAULT_GRID)
+    for name in ['quick_reply_seconds', 'reply_window', 'confirm_window']:
+        if getattr(args, name):
+            grid[name] = parse_values(getattr(args, name))
+    for name in ['price_range', 'volume_range']:
+        if getattr(args, name):
+            grid[name] = parse_ranges(getattr(args, name))
+
+    df = load_chat_log(args.input)
+    gt_df = pd.read_csv(args.gt, encoding='utf-8-sig')
+    print(f"Loaded {len(df)} messages, {len(gt_df)} ground truth deals")
+
+    results = run_sweep(df, gt_df, grid, workers=args.workers, feature_store=args.feature_store)
+    print_sweep_report(results, args.top)
+
+    results.to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(f"\nSweep results saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,26 +2,40 @@
 # -*- coding: utf-8 -*-
 """
 Remove Vietnamese accents function
+
+- Bảng ký tự s1 → s0 dùng str.translate (1 lần qua chuỗi, không s1.index(c))
+- Ký tự có dấu ngoài bảng (vd chuỗi đã tách dấu kiểu NFD) → fallback NFKD,
+  bỏ combining marks
+- Kết quả memo theo chuỗi gốc (tên trader lặp lại rất nhiều)
 """
 
+import unicodedata
+from functools import lru_cache
+
 s1 = u'ÀÁÂÃÈÉÊÌÍÒÓÔÕÙÚÝàáâãèéêìíòóôõùúýĂăĐđĨĩŨũƠơƯưẠạẢảẤấẦầẨẩẪẫẬậẮắẰằẲẳẴẵẶặẸẹẺẻẼẽẾếỀềỂểỄễỆệỈỉỊịỌọỎỏỐốỒồỔổỖỗỘộỚớỜờỞởỠỡỢợỤụỦủỨứỪừỬửỮữỰựỲỳỴỵỶỷỸỹ'
 s0 = u'AAAAEEEIIOOOOUUYaaaaeeeiioooouuyAaDdIiUuOoUuAaAaAaAaAaAaAaAaAaAaAaAaEeEeEeEeEeEeEeEeIiIiOoOoOoOoOoOoOoOoOoOoOoOoUuUuUuUuUuUuUuYyYyYyYy'
 
+ACCENT_TABLE = str.maketrans(s1, s0)
+
+
+def _strip_marks(text):
+    """NFKD rồi bỏ combining marks - cho ký tự không có trong bảng"""
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=65536)
 def remove_accents(input_str):
-    s = ''
-    print(input_str.encode('utf-8'))
-    for c in input_str:
-        if c in s1:
-            s += s0[s1.index(c)]
-        else:
-            s += c
+    s = input_str.translate(ACCENT_TABLE)
+    if not s.isascii() and any(unicodedata.combining(c) or unicodedata.decomposition(c) for c in s):
+        s = _strip_marks(s)
     return s
 
 # Test
 if __name__ == "__main__":
-    test_names = ['Trọng', 'Toàn', 'Phùng Huỳnh Kim', 'Toan Nguyen Duy']
-    
+    test_names = ['Trọng', 'Toàn', 'Phùng Huỳnh Kim', 'Toan Nguyen Duy', unicodedata.normalize('NFD', 'Toàn')]
+
     print("TESTING ACCENT REMOVAL:")
     for name in test_names:
         result = remove_accents(name)
-        print(f"{name} → {result}")
\ No newline at end of file
+        print(f"{name} → {result}")
+    print(remove_accents.cache_info())
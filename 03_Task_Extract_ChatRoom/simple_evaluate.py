@@ -2,50 +2,133 @@
 # -*- coding: utf-8 -*-
 """
 Simple evaluation - so sánh solution với ground truth
+
+Match 1-1 (multiset) trên (Buy_side, Sell_side, Amount, Actual_price_2digit):
+đánh số lần xuất hiện của từng key ở mỗi bên (cumcount) rồi merge 1 lần,
+nên mỗi deal của solution chỉ khớp tối đa 1 deal GT.
+
+Report: exact matches, precision, recall, F1 + partial match theo từng field
+(deal GT chưa khớp nhưng khớp đủ các field còn lại → field đó bị sai).
+
+Usage:
+    python simple_evaluate.py solution_v5_collect_all_results.csv
+    python simple_evaluate.py solution_v3_enhanced_results.csv solution_v4_universal_results.csv solution_v5_collect_all_results.csv
+    python simple_evaluate.py results/*.csv --gt ground_truth_2digit.csv
 """
 
+import argparse
+
 import pandas as pd
 
+KEY_COLUMNS = ['Buy_side', 'Sell_side', 'Amount', 'Actual_price_2digit']
+
+
+def _normalize(df):
+    """Chỉ giữ key columns với dtype so sánh được (Amount float, price int)"""
+    keys = pd.DataFrame({
+        'Buy_side': df['Buy_side'].astype(object),
+        'Sell_side': df['Sell_side'].astype(object),
+        'Amount': pd.to_numeric(df['Amount'], errors='coerce').astype(float),
+        'Actual_price_2digit': pd.to_numeric(df['Actual_price_2digit'], errors='coerce').astype('Int64'),
+    })
+    return keys.reset_index(drop=True)
+
+
+def _match_one_to_one(left, right, columns):
+    """Cặp (left position, right position) khớp 1-1 trên columns"""
+    # Key thiếu (NaN) không khớp gì - giống mask == của bản cũ
+    left = left[columns].assign(_left=left.index).dropna(subset=columns)
+    right = right[columns].assign(_right=right.index).dropna(subset=columns)
+    left['_n'] = left.groupby(columns).cumcount()
+    right['_n'] = right.groupby(columns).cumcount()
+    return left.merge(right, on=columns + ['_n'], how='inner')[['_left', '_right']]
+
+
+def evaluate_frames(solution_df, gt_df):
+    """Metrics của 1 solution DataFrame so với ground truth (dict)"""
+    solution = _normalize(solution_df) if len(solution_df) else pd.DataFrame(columns=KEY_COLUMNS)
+    gt = _normalize(gt_df)
+
+    matched = _match_one_to_one(gt, solution, KEY_COLUMNS) if len(solution) else pd.DataFrame(
+        columns=['_left', '_right'])
+    exact = len(matched)
+
+    precision = exact / len(solution) if len(solution) else 0.0
+    recall = exact / len(gt) if len(gt) else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+
+    # Partial: trong phần chưa khớp, GT deal khớp 1-1 với solution deal trên 3 field còn lại
+    gt_rest = gt.drop(index=matched['_left'].tolist())
+    solution_rest = solution.drop(index=matched['_right'].tolist())
+    partial = {}
+    for field in KEY_COLUMNS:
+        others = [column for column in KEY_COLUMNS if column != field]
+        partial[field] = len(_match_one_to_one(gt_rest, solution_rest, others)) if len(solution_rest) else 0
+
+    return {
+        'solution_deals': len(solution),
+        'gt_deals': len(gt),
+        'exact_matches': exact,
+        'precision': precision,
+        'recall': recall,
+        'f1': f1,
+        'accuracy': recall * 100,
+        'wrong_field_only': partial,
+    }
+
+
+def print_metrics(metrics):
+    print(f"Solution: {metrics['solution_deals']} deals")
+    print(f"Ground truth: {metrics['gt_deals']} deals")
+    print(f"\nKET QUA:")
+    print(f"Exact matches: {metrics['exact_matches']}/{metrics['gt_deals']}")
+    print(f"Do chinh xac (recall): {metrics['accuracy']:.1f}%")
+    print(f"Precision: {metrics['precision']:.3f}  Recall: {metrics['recall']:.3f}  F1: {metrics['f1']:.3f}")
+    print("Partial matches (chỉ sai 1 field):")
+    for field, count in metrics['wrong_field_only'].items():
+        print(f"  {field:<20} {count}")
+
+
 def evaluate_solution(solution_file, gt_file="ground_truth_2digit.csv"):
     """Đánh giá độ chính xác của solution"""
-    
+
     # Load files
     solution_df = pd.read_csv(solution_file, encoding='utf-8-sig')
     gt_df = pd.read_csv(gt_file, encoding='utf-8-sig')
-    
+
     print("DANH GIA KET QUA")
     print("=" * 40)
-    print(f"Solution: {len(solution_df)} deals")
-    print(f"Ground truth: {len(gt_df)} deals")
-    
-    # Exact matches
-    exact_matches = 0
-    
-    for _, gt_row in gt_df.iterrows():
-        # Tìm exact match trong solution
-        matches = solution_df[
-            (solution_df['Buy_side'] == gt_row['Buy_side']) &
-            (solution_df['Sell_side'] == gt_row['Sell_side']) &
-            (solution_df['Amount'] == gt_row['Amount']) &
-            (solution_df['Actual_price_2digit'] == gt_row['Actual_price_2digit'])
-        ]
-        
-        if len(matches) > 0:
-            exact_matches += 1
-    
-    accuracy = exact_matches / len(gt_df) * 100
-    
-    print(f"\nKET QUA:")
-    print(f"Exact matches: {exact_matches}/{len(gt_df)}")
-    print(f"Do chinh xac: {accuracy:.1f}%")
-    
-    return accuracy, exact_matches
+    metrics = evaluate_frames(solution_df, gt_df)
+    print_metrics(metrics)
+
+    return metrics['accuracy'], metrics['exact_matches']
+
+
+def evaluate_many(solution_files, gt_file="ground_truth_2digit.csv"):
+    """Đánh giá nhiều solution với cùng 1 ground truth (load GT 1 lần)"""
+    gt_df = pd.read_csv(gt_file, encoding='utf-8-sig')
+    rows = []
+    for solution_file in solution_files:
+        metrics = evaluate_frames(pd.read_csv(solution_file, encoding='utf-8-sig'), gt_df)
+        rows.append({'solution': solution_file, **metrics})
+
+    print(f"DANH GIA {len(rows)} SOLUTIONS (GT: {gt_file}, {len(gt_df)} deals)")
+    print("=" * 40)
+    print(f"{'solution':<45} {'deals':>6} {'exact':>6} {'P':>6} {'R':>6} {'F1':>6}  sai 1 field (buy/sell/amount/price)")
+    for row in rows:
+        partial = '/'.join(str(row['wrong_field_only'][field]) for field in KEY_COLUMNS)
+        print(f"{row['solution']:<45} {row['solution_deals']:>6} {row['exact_matches']:>6} "
+              f"{row['precision']:6.3f} {row['recall']:6.3f} {row['f1']:6.3f}  {partial}")
+    return rows
+
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) > 1:
-        solution_file = sys.argv[1]
+    parser = argparse.ArgumentParser(description='Evaluate solution files against ground truth')
+    parser.add_argument('solutions', nargs='*', default=["solution_step_results.csv"])
+    parser.add_argument('--gt', default="ground_truth_2digit.csv")
+    args = parser.parse_args()
+
+    if len(args.solutions) == 1:
+        evaluate_solution(args.solutions[0], args.gt)
     else:
-        solution_file = "solution_step_results.csv"
-    
-    evaluate_solution(solution_file)
\ No newline at end of file
+        evaluate_many(args.solutions, args.gt)
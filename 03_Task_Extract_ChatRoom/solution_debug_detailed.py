@@ -14,6 +14,7 @@ import pandas as pd
 import re
 from datetime import datetime, timedelta
 import numpy as np
+from intermediate_store import save_intermediate, csv_requested
 
 def step1_intent_detection(df):
     """
@@ -598,9 +599,9 @@ def main():
     step5_df = step5_deal_assembly(step4_df)
     
     # Save intermediate results
-    intermediate_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\debug_detailed_results.csv'
-    step5_df.to_csv(intermediate_file, index=False, encoding='utf-8-sig')
-    print(f"Intermediate results saved: {intermediate_file}")
+    intermediate_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\debug_detailed_results.parquet'
+    saved = save_intermediate(step5_df, intermediate_file, csv=csv_requested())  # --csv: thêm bản CSV cho Excel
+    print(f"Intermediate results saved: {', '.join(saved)}")
     
     # Create final output
     final_df = create_final_output(step5_df)
@@ -8,31 +8,20 @@ import pandas as pd
 import re
 import os
 from datetime import datetime
-import unicodedata
+from functools import lru_cache
+from intermediate_store import save_intermediate, csv_requested
+from remove_accents import remove_accents as _remove_accents
 
 def remove_accents(input_str):
-    """Remove Vietnamese accents using character mapping"""
+    """Remove Vietnamese accents (translate table + memo, xem remove_accents.py)"""
     if pd.isna(input_str):
         return ""
-    
-    s1 = u'ÀÁÂÃÈÉÊÌÍÒÓÔÕÙÚÝàáâãèéêìíòóôõùúýĂăĐđĨĩŨũƠơƯưẠạẢảẤấẦầẨẩẪẫẬậẮắẰằẲẳẴẵẶặẸẹẺẻẼẽẾếỀềỂểỄễỆệỈỉỊịỌọỎỏỐốỒồỔổỖỗỘộỚớỜờỞởỠỡỢợỤụỦủỨứỪừỬửỮữỰựỲỳỴỵỶỷỸỹ'
-    s0 = u'AAAAEEEIIOOOOUUYaaaaeeeiioooouuyAaDdIiUuOoUuAaAaAaAaAaAaAaAaAaAaAaAaEeEeEeEeEeEeEeEeIiIiOoOoOoOoOoOoOoOoOoOoOoOoUuUuUuUuUuUuUuYyYyYyYy'
-    
-    s = ''
-    for c in str(input_str):
-        if c in s1:
-            s += s0[s1.index(c)]
-        else:
-            s += c
-    return s
+    return _remove_accents(str(input_str))
 
-def normalize_name(name):
-    """Normalize Vietnamese name - remove accents, keep case"""
-    if pd.isna(name):
-        return ""
-    
+@lru_cache(maxsize=65536)
+def _normalize_name(name):
     # Remove accents
-    name = remove_accents(str(name))
+    name = _remove_accents(name)
     
     # Keep only alphanumeric và space
     name = re.sub(r'[^a-zA-Z0-9\s]', '', name)
@@ -44,36 +33,87 @@ def normalize_name(name):
         return first_name
     return ""
 
-def extract_name_from_message(message, trader_names):
-    """Extract trader name mentioned in REPLY/CONFIRM messages"""
+def normalize_name(name):
+    """Normalize Vietnamese name - remove accents, keep case (memo theo tên gốc)"""
+    if pd.isna(name):
+        return ""
+    return _normalize_name(str(name))
+
+# Common patterns for name calling
+NAME_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    r'buy\s+(\w+)',
+    r'sell\s+(\w+)', 
+    r'done\s+(?:a|anh|em|chi|c)\s+(\w+)',
+    r'ok\s+(\w+)',
+    r'tks\s+(\w+)',
+    r'(\w+)\s+\d+\s*u',  # "Toan 7u"
+    r'(?:done|ok|tks)\s+(\w+)(?:\s|$|nhé|ơi)',
+]]
+
+class TraderNameIndex:
+    """Index tên trader (first name đã normalize) → trader, build 1 lần cho roster
+
+    Giữ đúng semantics của vòng lặp cũ: trader đầu tiên (theo thứ tự roster) có
+    token in trader_norm hoặc trader_norm in token.
+    - containing: mọi substring của mọi trader_norm → vị trí roster nhỏ nhất
+      (token in trader_norm = 1 dict lookup)
+    - exact: trader_norm → vị trí roster nhỏ nhất; duyệt các substring của token
+      có độ dài trong tập độ dài tên (trader_norm in token)
+    Chi phí mỗi token chỉ phụ thuộc độ dài token, không phụ thuộc số trader.
+    """
+
+    def __init__(self, trader_names):
+        self.trader_names = list(trader_names)
+        self.containing = {}
+        self.exact = {}
+        for position, trader_name in enumerate(self.trader_names):
+            trader_norm = normalize_name(trader_name)
+            self.exact.setdefault(trader_norm, position)
+            for start in range(len(trader_norm) + 1):
+                for end in range(start, len(trader_norm) + 1):
+                    self.containing.setdefault(trader_norm[start:end], position)
+        self.lengths = sorted({len(trader_norm) for trader_norm in self.exact})
+        self._memo = {}
+
+    def lookup(self, token_norm):
+        """Trader khớp với token đã normalize (None nếu không có)"""
+        if token_norm in self._memo:
+            return self._memo[token_norm]
+
+        best = self.containing.get(token_norm)
+        for length in self.lengths:
+            if length > len(token_norm):
+                break
+            for start in range(len(token_norm) - length + 1):
+                position = self.exact.get(token_norm[start:start + length])
+                if position is not None and (best is None or position < best):
+                    best = position
+
+        trader_name = self.trader_names[best] if best is not None else None
+        self._memo[token_norm] = trader_name
+        return trader_name
+
+def extract_name_from_message(message, name_index):
+    """Extract trader name mentioned in REPLY/CONFIRM messages
+
+    name_index: TraderNameIndex của roster (list tên trader cũng được)
+    """
     if pd.isna(message):
         return None
+    if not isinstance(name_index, TraderNameIndex):
+        name_index = TraderNameIndex(name_index)
     
     message_lower = str(message).lower()
     
-    # Common patterns for name calling
-    patterns = [
-        r'buy\s+(\w+)',
-        r'sell\s+(\w+)', 
-        r'done\s+(?:a|anh|em|chi|c)\s+(\w+)',
-        r'ok\s+(\w+)',
-        r'tks\s+(\w+)',
-        r'(\w+)\s+\d+\s*u',  # "Toan 7u"
-        r'(?:done|ok|tks)\s+(\w+)(?:\s|$|nhé|ơi)',
-    ]
-    
     extracted_names = []
-    for pattern in patterns:
-        matches = re.findall(pattern, message_lower, re.IGNORECASE)
-        extracted_names.extend(matches)
+    for pattern in NAME_PATTERNS:
+        extracted_names.extend(pattern.findall(message_lower))
     
     # Match với trader names
     for extracted in extracted_names:
-        extracted_norm = normalize_name(extracted)
-        for trader_name in trader_names:
-            trader_norm = normalize_name(trader_name)
-            if extracted_norm in trader_norm or trader_norm in extracted_norm:
-                return trader_name
+        trader_name = name_index.lookup(normalize_name(extracted))
+        if trader_name is not None:
+            return trader_name
     
     return None
 
@@ -91,6 +131,7 @@ def step1_intent_detection(df):
     
     results = []
     trader_names = df['trader_name'].unique().tolist()
+    name_index = TraderNameIndex(trader_names)  # build 1 lần, không phải mỗi message x trader
     
     for idx, row in df.iterrows():
         message = str(row['mess']).lower()
@@ -122,7 +163,7 @@ def step1_intent_detection(df):
         
         # REPLY detection với name matching
         reply_keywords = ['buy', 'sell', 'khớp']
-        mentioned_trader = extract_name_from_message(row['mess'], trader_names)
+        mentioned_trader = extract_name_from_message(row['mess'], name_index)
         
         if any(kw in message for kw in reply_keywords):
             if intent_type == "NOISE":
@@ -628,9 +669,9 @@ def main():
     step5_df = step5_deal_assembly(step4_df)
     
     # Save debug results
-    debug_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\debug_name_matching_results.csv'
-    step5_df.to_csv(debug_file, index=False, encoding='utf-8-sig')
-    print(f"Debug results saved: {debug_file}")
+    debug_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\debug_name_matching_results.parquet'
+    saved = save_intermediate(step5_df, debug_file, csv=csv_requested())  # --csv: thêm bản CSV cho Excel
+    print(f"Debug results saved: {', '.join(saved)}")
     
     # Create final output
     final_df = create_final_output(step5_df)
@@ -13,6 +13,7 @@ from openai import OpenAI
 import concurrent.futures
 from tqdm import tqdm
 import threading
+from intermediate_store import save_intermediate, csv_requested
 
 def load_data():
     """Load input data and bank mapping"""
@@ -328,9 +329,9 @@ def main():
     step5_df = step5_deal_assembly(step4_df)
     
     # Save intermediate results
-    intermediate_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\intermediate_v3_genai_results.csv'
-    step5_df.to_csv(intermediate_file, index=False, encoding='utf-8-sig')
-    print(f"Intermediate results saved: {intermediate_file}")
+    intermediate_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\intermediate_v3_genai_results.parquet'
+    saved = save_intermediate(step5_df, intermediate_file, csv=csv_requested())  # --csv: thêm bản CSV cho Excel
+    print(f"Intermediate results saved: {', '.join(saved)}")
     
     # Create final output
     final_df = create_final_output(step5_df)
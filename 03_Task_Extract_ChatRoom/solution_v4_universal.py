@@ -14,6 +14,11 @@ import re
 from datetime import datetime, timedelta
 import numpy as np
 
+from chat_log import load_chat_log
+from vectorized_intent import vectorized_intent_detection
+from window_index import WindowIndex
+from intermediate_store import save_intermediate, csv_requested
+
 def extract_volume(message):
     """Universal volume extraction cho tất cả message types"""
     patterns = [
@@ -110,6 +115,10 @@ def check_single_number_case(row, df, idx):
     return False, None
 
 def enhanced_intent_detection(df):
+    """Enhanced intent detection (vectorized, output giống enhanced_intent_detection_loop)"""
+    return vectorized_intent_detection(df, 'v4')
+
+def enhanced_intent_detection_loop(df):
     """Enhanced intent detection với priority rules"""
     print("STEP 1: ENHANCED INTENT DETECTION")
     print("-" * 35)
@@ -415,38 +424,24 @@ def enhanced_reply_matching_v4(step2_df):
     
     start_messages = step3_df[step3_df['intent_type'] == 'START'].copy()
     
+    windows = WindowIndex(step3_df)
+    
     for start_idx, start_row in start_messages.iterrows():
-        start_time = datetime.strptime(start_row['time'], '%H:%M:%S')
+        start_pos = step3_df.index.get_loc(start_idx)
         start_trader = start_row['trader_name']
-        start_date = start_row['date']
-        
-        # WINDOW LOGIC
-        next_start_same_trader = step3_df[
-            (step3_df['intent_type'] == 'START') &
-            (step3_df['trader_name'] == start_trader) &
-            (step3_df['date'] == start_date) &
-            (step3_df.index > start_idx)
-        ]
         
-        window_end_idx = len(step3_df)
-        if not next_start_same_trader.empty:
-            window_end_idx = next_start_same_trader.index[0]
+        # WINDOW LOGIC: tới START tiếp theo cùng trader (index tính sẵn)
+        window_end_idx = windows.window_end(start_pos)
         
         # Find replies trong window
-        potential_replies = step3_df[
-            (step3_df['intent_type'] == 'REPLY') &
-            (step3_df['date'] == start_date) &
-            (step3_df.index > start_idx) &
-            (step3_df.index < window_end_idx) &
-            (step3_df['trader_name'] != start_trader)
-        ]
+        potential_replies = step3_df.iloc[windows.candidates(start_pos, 'REPLY', window_end_idx)]
+        potential_replies = potential_replies[potential_replies['trader_name'] != start_trader]
         
         best_reply = None
         min_time_gap = float('inf')
         
         for reply_idx, reply_row in potential_replies.iterrows():
-            reply_time = datetime.strptime(reply_row['time'], '%H:%M:%S')
-            time_gap = (reply_time - start_time).total_seconds() / 60
+            time_gap = windows.gap_minutes(start_pos, step3_df.index.get_loc(reply_idx))
             
             if time_gap <= 5 and time_gap < min_time_gap:
                 # Use pre-extracted entities
@@ -506,38 +501,26 @@ def enhanced_confirmation_processing_v4(step3_df):
         (step4_df['reply_found'])
     ].copy()
     
+    windows = WindowIndex(step4_df)
+    
     for start_idx, start_row in start_with_reply.iterrows():
-        start_time = datetime.strptime(start_row['time'], '%H:%M:%S')
+        start_pos = step4_df.index.get_loc(start_idx)
         start_trader = start_row['trader_name']
         reply_trader = start_row['reply_trader']
-        start_date = start_row['date']
-        
-        # WINDOW LOGIC for CONFIRM
-        next_start_same_trader = step4_df[
-            (step4_df['intent_type'] == 'START') &
-            (step4_df['trader_name'] == start_trader) &
-            (step4_df['date'] == start_date) &
-            (step4_df.index > start_idx)
-        ]
         
-        confirm_window_end_idx = len(step4_df)
-        if not next_start_same_trader.empty:
-            confirm_window_end_idx = next_start_same_trader.index[0]
+        # WINDOW LOGIC for CONFIRM: tới START tiếp theo cùng trader (index tính sẵn)
+        confirm_window_end_idx = windows.window_end(start_pos)
         
         # Find confirmations trong window
-        potential_confirms = step4_df[
-            (step4_df['intent_type'] == 'CONFIRM') &
-            (step4_df['date'] == start_date) &
-            (step4_df.index > start_idx) &
-            (step4_df.index < confirm_window_end_idx) &
-            (step4_df['trader_name'].isin([start_trader, reply_trader]))
+        potential_confirms = step4_df.iloc[windows.candidates(start_pos, 'CONFIRM', confirm_window_end_idx)]
+        potential_confirms = potential_confirms[
+            potential_confirms['trader_name'].isin([start_trader, reply_trader])
         ]
         
         best_confirm = None
         
         for confirm_idx, confirm_row in potential_confirms.iterrows():
-            confirm_time = datetime.strptime(confirm_row['time'], '%H:%M:%S')
-            time_gap = (confirm_time - start_time).total_seconds() / 60
+            time_gap = windows.gap_minutes(start_pos, step4_df.index.get_loc(confirm_idx))
             
             if time_gap <= 5:
                 confirm_message = str(confirm_row['message']).lower()
@@ -755,7 +738,7 @@ def main():
     
     # Load input
     input_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\input_expanded_banks.csv'
-    df = pd.read_csv(input_file, encoding='utf-8-sig')
+    df = load_chat_log(input_file)
     
     print(f"Loaded {len(df)} messages from input")
     print()
@@ -776,9 +759,9 @@ def main():
     step5_df = enhanced_deal_assembly_v4(step4_df)
     
     # Save intermediate results
-    intermediate_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\intermediate_v4_universal_results.csv'
-    step5_df.to_csv(intermediate_file, index=False, encoding='utf-8-sig')
-    print(f"Intermediate results saved: {intermediate_file}")
+    intermediate_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\intermediate_v4_universal_results.parquet'
+    saved = save_intermediate(step5_df, intermediate_file, csv=csv_requested())  # --csv: thêm bản CSV cho Excel
+    print(f"Intermediate results saved: {', '.join(saved)}")
     
     # Create final output
     final_df = create_final_output(step5_df)
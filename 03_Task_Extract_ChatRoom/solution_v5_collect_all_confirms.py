@@ -14,60 +14,38 @@ import re
 from datetime import datetime, timedelta
 import numpy as np
 
+from chat_log import load_chat_log
+from vectorized_intent import vectorized_intent_detection
+from window_index import WindowIndex
+from stage_runner import Stage, run_stages, set_rows
+from instrumentation import count_rule
+from feature_cache import FEATURES, keywords as message_keywords, numeric
+from intermediate_store import save_intermediate, csv_requested
+
+# Ngưỡng của rule (giá trị gốc); các stage nhận qua kwargs để parameter_sweep thử giá trị khác
+REPLY_WINDOW_MINUTES = 5      # START → REPLY
+CONFIRM_WINDOW_MINUTES = 5    # START → CONFIRM
+PRICE_RANGE = (0, 99)         # final_price hợp lệ (2 chữ số)
+VOLUME_RANGE = (0.1, 100)     # final_amount hợp lệ (triệu USD)
+
 def extract_volume(message):
-    """Universal volume extraction - KHÔNG extract từ FOR pattern ở đây"""
-    patterns = [
-        (r'(\d+(?:\.\d+)?)\s*u\b', 1),           # 5u
-        (r'(\d+(?:\.\d+)?)\s*mio\b', 1),         # 1.5mio 
-        (r'(\d+)\s*k\b', 0.001),                 # 500k → 0.5
-        (r'(\d+)\s*m\b', 1),                     # 10m → 10
-        # (r'for\s+(\d+(?:\.\d+)?)', 1),         # REMOVED: for 3 - handle in price extraction
-        (r'(\d+(?:\.\d+)?)\s+u\b', 1),           # "1 u" with space
-        (r'(\d+(?:\.\d+)?)\s*mil\b', 1)          # 2mil
-    ]
-    
-    for pattern, multiplier in patterns:
-        match = re.search(pattern, message)
-        if match:
-            return float(match.group(1)) * multiplier
-    return None
+    """Universal volume extraction - KHÔNG extract từ FOR pattern ở đây
+
+    u / mio / k (x0.001) / m / mil, unit đứng trước trong numeric_tokens.VOLUME_UNITS ưu tiên
+    """
+    volume, unit = numeric(message).volume()
+    if unit:
+        count_rule(f'volume.{unit}')
+    return volume
 
 def extract_all_numbers(message):
     """Extract tất cả numbers (exclude negative)"""
-    numbers = []
-    for match in re.finditer(r'\b\d+(?:\.\d+)?\b', message):
-        num = float(match.group())
-        # Check context for negative
-        start_pos = max(0, match.start() - 5)
-        context = message[start_pos:match.start()]
-        if '-' not in context:
-            numbers.append(num)
-    return numbers
+    return numeric(message).numbers()
 
 def is_confirm_message_fuzzy(message):
     """Check if message is CONFIRM với typo handling"""
-    message_lower = message.lower()
-    
-    # Direct matches
-    confirm_keywords = ['done', 'ok', 'not suit', 'tks', 'thanks', 'thank']
-    if any(kw in message_lower for kw in confirm_keywords):
-        return True
-    
-    # Common typos
-    typo_patterns = [
-        r'd[so]ne',     # dsone, dnoe
-        r'ok[ie]',      # oki, oke
-        r'tk+s+',       # tkss, tksss
-        r'than[kx]',    # thanx, thankx
-        r'don[ea]',     # dona, done
-        r'o+k+',        # ookkk
-    ]
-    
-    for pattern in typo_patterns:
-        if re.search(pattern, message_lower):
-            return True
-    
-    return False
+    # Direct matches + common typos (dsone, oke, tkss, ...): class confirm_fuzzy
+    return 'confirm_fuzzy' in message_keywords(message.lower())
 
 def check_single_number_case(row, df, idx):
     """Check case 1 số duy nhất + reply trong 30s"""
@@ -90,7 +68,7 @@ def check_single_number_case(row, df, idx):
                 time_diff = (reply_time - current_time).total_seconds()
                 if 0 < time_diff <= 30:
                     reply_message = str(reply['mess']).lower()
-                    if any(kw in reply_message for kw in ['buy', 'sell', 'khớp']):
+                    if 'reply' in message_keywords(reply_message):
                         return True, "single_number_with_quick_reply"
                 elif time_diff > 30:
                     break
@@ -100,6 +78,10 @@ def check_single_number_case(row, df, idx):
     return False, None
 
 def enhanced_intent_detection(df):
+    """Enhanced intent detection (vectorized, output giống enhanced_intent_detection_loop)"""
+    return vectorized_intent_detection(df, 'v5')
+
+def enhanced_intent_detection_loop(df):
     """Enhanced intent detection với fuzzy confirm detection"""
     print("STEP 1: ENHANCED INTENT DETECTION")
     print("-" * 35)
@@ -124,14 +106,10 @@ def enhanced_intent_detection(df):
         else:
             has_numbers = len(numbers) > 0
             
-            # Keywords
-            bid_ask_keywords = ['bid', 'ask', 'offer', 'off', 'bán', 'mua', 'có', 'còn']
-            has_bid_ask = any(kw in message for kw in bid_ask_keywords)
-            
-            time_keywords = ['on', 'spt', '1m', '1w', 'spot', '6m', '3m', '2m', '6w']
-            has_time_exclusion = any(kw in message for kw in time_keywords)
-            
-            reply_keywords = ['buy', 'sell', 'khớp']
+            # Keywords (1 lần scan cho mọi keyword class)
+            keywords = message_keywords(message)
+            has_bid_ask = 'bid_ask' in keywords
+            has_time_exclusion = 'time' in keywords
             
             # PRIORITY RULES
             
@@ -141,7 +119,7 @@ def enhanced_intent_detection(df):
                 confidence = 0.8
             
             # 2. REPLY có priority cao
-            elif any(kw in message for kw in reply_keywords):
+            elif 'reply' in keywords:
                 intent_type = "REPLY"
                 confidence = 0.7
             
@@ -166,7 +144,7 @@ def enhanced_intent_detection(df):
                         confidence = 0.7
                 
                 # Case 4: Volume patterns
-                elif re.search(r'\d+(?:\.\d+)?\s*(?:u|mio|k|m)\b', message):
+                elif any(token.unit in ('u', 'mio', 'k', 'm') for token in numeric(message).kind('volume')):
                     intent_type = "START"
                     confidence = 0.6
         
@@ -205,116 +183,138 @@ def enhanced_intent_detection(df):
     
     return step1_df
 
+def extract_start_entities(message):
+    """Extract price/volume/side (+ bid/ask spread) từ 1 START message (đã lower)
+
+    Memo theo message (feature_cache) - dict trả về dùng chung, chỉ đọc
+    """
+    return FEATURES.get(message, 'start_entities', _start_entities)
+
+def _start_entities(message):
+    problems = []
+    tokens = numeric(message)  # 1 lần quét: numbers, volume, 'for'
+    
+    # Extract numbers (exclude negative)
+    numbers = tokens.numbers()
+    
+    # Enhanced volume extraction
+    volume = extract_volume(message)
+    
+    # Enhanced price extraction
+    price = None
+    
+    # Priority 1: "for" pattern - FIX: volume AFTER for
+    if tokens.first_for() is not None:
+        # "98 00 for 3" → volume=3, price=98 hoặc 00
+        candidate_volume = tokens.for_volume()
+        if candidate_volume is not None:
+            count_rule('entities.price.for_pattern')
+            # FOR pattern means volume AFTER for
+            volume = candidate_volume
+            
+            # Price is one of the numbers BEFORE for
+            before_numbers = tokens.numbers_before_for()
+            
+            if before_numbers:
+                # Take last valid number as price
+                for num in reversed(before_numbers):
+                    if 0 <= num <= 99:
+                        price = num
+                        break
+            
+            if price is None and before_numbers:
+                problems.append(f"no_valid_price_before_for")
+    
+    # Priority 2: Numbers không phải volume
+    elif volume and numbers:
+        count_rule('entities.price.not_volume')
+        for num in numbers:
+            if abs(num - volume) > 0.1 and 0 <= num <= 99:
+                price = num
+                break
+        if price is None:
+            problems.append("no_valid_price_with_volume")
+    
+    # Priority 3: Any valid number
+    elif numbers:
+        count_rule('entities.price.any_number')
+        for num in numbers:
+            if 0 <= num <= 99:
+                price = num
+                break
+        if price is None and numbers:
+            problems.append("all_prices_out_of_range")
+    
+    # Enhanced side detection
+    side = None
+    keywords = message_keywords(message)
+    
+    if 'side_bid' in keywords:
+        side = 'bid'
+    elif 'side_ask' in keywords:
+        side = 'offer'
+    count_rule(f'entities.side.{side}')
+    
+    # Handle 2-number cases (bid/ask spread)
+    bid_price = None
+    ask_price = None
+    if len(numbers) == 2 and not volume:
+        sorted_nums = sorted([n for n in numbers if 0 <= n <= 99])
+        if len(sorted_nums) == 2:
+            count_rule('entities.spread')
+            bid_price = sorted_nums[0]
+            ask_price = sorted_nums[1]
+            
+            if side == 'bid':
+                price = bid_price
+            elif side == 'offer':
+                price = ask_price
+            else:
+                price = sorted_nums[0]
+    
+    # Validation
+    if price is None:
+        problems.append("no_price_extracted")
+    if side is None and (bid_price or ask_price):
+        problems.append("unclear_side_with_spread")
+    for problem in problems:
+        count_rule(f'entities.problem.{problem}')
+    
+    return {
+        'price': price,
+        'volume': volume,
+        'side': side,
+        'bid': bid_price,
+        'ask': ask_price,
+        'problems': problems
+    }
+
 def enhanced_entity_extraction(step1_df):
     """Enhanced entity extraction cho START messages"""
     print("STEP 2: ENHANCED ENTITY EXTRACTION")
     print("-" * 35)
     
-    step2_df = step1_df.copy()
+    step2_df = step1_df  # thêm cột in place, không copy frame
     
     # Initialize entity columns
-    step2_df['entity_price'] = None
-    step2_df['entity_volume'] = None  
+    step2_df['entity_price'] = np.nan
+    step2_df['entity_volume'] = np.nan
     step2_df['entity_side'] = None
-    step2_df['entity_bid'] = None
-    step2_df['entity_ask'] = None
+    step2_df['entity_bid'] = np.nan
+    step2_df['entity_ask'] = np.nan
     step2_df['entity_problems'] = ''
     
-    start_messages = step2_df[step2_df['intent_type'] == 'START']
+    start_positions = np.flatnonzero((step2_df['intent_type'] == 'START').to_numpy())
+    messages = step2_df['message'].to_numpy()
     
-    for idx, row in start_messages.iterrows():
-        message = str(row['message']).lower()
-        problems = []
-        
-        # Extract numbers (exclude negative)
-        numbers = extract_all_numbers(message)
-        
-        # Enhanced volume extraction
-        volume = extract_volume(message)
-        
-        # Enhanced price extraction
-        price = None
-        
-        # Priority 1: "for" pattern - FIX: volume AFTER for
-        if 'for' in message:
-            # "98 00 for 3" → volume=3, price=98 hoặc 00
-            for_match = re.search(r'for\s+(\d+(?:\.\d+)?)', message)
-            if for_match:
-                candidate_volume = float(for_match.group(1))
-                # FOR pattern means volume AFTER for
-                volume = candidate_volume
-                
-                # Price is one of the numbers BEFORE for
-                before_for = message.split('for')[0]
-                before_numbers = extract_all_numbers(before_for)
-                
-                if before_numbers:
-                    # Take last valid number as price
-                    for num in reversed(before_numbers):
-                        if 0 <= num <= 99:
-                            price = num
-                            break
-                
-                if price is None and before_numbers:
-                    problems.append(f"no_valid_price_before_for")
-        
-        # Priority 2: Numbers không phải volume
-        elif volume and numbers:
-            for num in numbers:
-                if abs(num - volume) > 0.1 and 0 <= num <= 99:
-                    price = num
-                    break
-            if price is None:
-                problems.append("no_valid_price_with_volume")
-        
-        # Priority 3: Any valid number
-        elif numbers:
-            for num in numbers:
-                if 0 <= num <= 99:
-                    price = num
-                    break
-            if price is None and numbers:
-                problems.append("all_prices_out_of_range")
-        
-        # Enhanced side detection
-        side = None
-        bid_keywords = ['bid', 'mua']
-        ask_keywords = ['ask', 'offer', 'off', 'có', 'còn', 'bán']
-        
-        if any(kw in message for kw in bid_keywords):
-            side = 'bid'
-        elif any(kw in message for kw in ask_keywords):
-            side = 'offer'
-        
-        # Handle 2-number cases (bid/ask spread)
-        bid_price = None
-        ask_price = None
-        if len(numbers) == 2 and not volume:
-            sorted_nums = sorted([n for n in numbers if 0 <= n <= 99])
-            if len(sorted_nums) == 2:
-                bid_price = sorted_nums[0]
-                ask_price = sorted_nums[1]
-                
-                if side == 'bid':
-                    price = bid_price
-                elif side == 'offer':
-                    price = ask_price
-                else:
-                    price = sorted_nums[0]
-        
-        # Validation
-        if price is None:
-            problems.append("no_price_extracted")
-        if side is None and (bid_price or ask_price):
-            problems.append("unclear_side_with_spread")
-        
-        # Update DataFrame
-        step2_df.at[idx, 'entity_price'] = price
-        step2_df.at[idx, 'entity_volume'] = volume
-        step2_df.at[idx, 'entity_side'] = side
-        step2_df.at[idx, 'entity_bid'] = bid_price
-        step2_df.at[idx, 'entity_ask'] = ask_price
-        step2_df.at[idx, 'entity_problems'] = ';'.join(problems)
+    all_entities = [extract_start_entities(str(messages[pos]).lower()) for pos in start_positions]
+    
+    # Update DataFrame (1 lần / cột)
+    for column, key in [('entity_price', 'price'), ('entity_volume', 'volume'),
+                        ('entity_side', 'side'), ('entity_bid', 'bid'), ('entity_ask', 'ask')]:
+        set_rows(step2_df, start_positions, column, [entities[key] for entities in all_entities])
+    set_rows(step2_df, start_positions, 'entity_problems',
+             [';'.join(entities['problems']) for entities in all_entities])
     
     # Statistics
     start_with_price = step2_df[(step2_df['intent_type'] == 'START') & (step2_df['entity_price'].notna())].shape[0]
@@ -334,132 +334,147 @@ def enhanced_reply_extraction_for_reply(row, start_messages_before):
     """Extract đầy đủ entities cho REPLY với universal extraction"""
     message = str(row['message']).lower()
     
+    # Action / target / volume chỉ phụ thuộc message → feature_cache
+    entities = FEATURES.get(message, 'reply_entities', _reply_entities)
+    target_trader = entities['reply_target_trader']
+    
+    # Get implied price from recent START
+    implied_price = None
+    if target_trader and not start_messages_before.empty:
+        for _, start_msg in start_messages_before.iterrows():
+            start_trader = str(start_msg['trader_name']).lower()
+            if target_trader.lower() in start_trader or start_trader in target_trader.lower():
+                implied_price = start_msg['entity_price']
+                break
+    
+    return {
+        'reply_action': entities['reply_action'],
+        'reply_target_trader': target_trader,
+        'reply_implied_price': implied_price,
+        'reply_volume': entities['reply_volume']
+    }
+
+def _reply_entities(message):
+    """Action, target trader, volume của 1 REPLY message (đã lower)"""
     # Extract action
     action = None
-    if 'buy' in message:
+    keywords = message_keywords(message)
+    if 'action_buy' in keywords:
         action = 'buy'
-    elif 'sell' in message:
+    elif 'action_sell' in keywords:
         action = 'sell'
-    elif 'khớp' in message:
+    elif 'action_match' in keywords:
         action = 'match'
+    count_rule(f'reply.action.{action}')
     
     # Extract target trader
     target_trader = None
     patterns = [
-        r'buy\s+a(?:nh)?\s+(\w+)',
-        r'sell\s+a(?:nh)?\s+(\w+)',
-        r'khớp\s+(?:với\s+)?(\w+)',
-        r'(?:buy|sell)\s+(\w+)',
-        r'done\s+(\w+)'
+        (r'buy\s+a(?:nh)?\s+(\w+)', 'buy_anh'),
+        (r'sell\s+a(?:nh)?\s+(\w+)', 'sell_anh'),
+        (r'khớp\s+(?:với\s+)?(\w+)', 'khop'),
+        (r'(?:buy|sell)\s+(\w+)', 'buy_sell'),
+        (r'done\s+(\w+)', 'done')
     ]
     
-    for pattern in patterns:
+    for pattern, rule in patterns:
         match = re.search(pattern, message)
         if match:
+            count_rule(f'reply.target.{rule}')
             target_trader = match.group(1)
             break
     
-    # Get implied price from recent START
-    implied_price = None
-    if target_trader and not start_messages_before.empty:
-        for _, start_msg in start_messages_before.iterrows():
-            start_trader = str(start_msg['trader_name']).lower()
-            if target_trader.lower() in start_trader or start_trader in target_trader.lower():
-                implied_price = start_msg['entity_price']
-                break
-    
     # Extract volume (universal)
     volume = extract_volume(message)
     
     return {
         'reply_action': action,
         'reply_target_trader': target_trader,
-        'reply_implied_price': implied_price,
         'reply_volume': volume
     }
 
-def enhanced_reply_matching(step2_df):
+def enhanced_reply_matching(step2_df, window_minutes=REPLY_WINDOW_MINUTES):
     """Enhanced reply matching với full entity extraction"""
     print("STEP 3: ENHANCED REPLY MATCHING")
     print("-" * 32)
     
-    step3_df = step2_df.copy()
+    step3_df = step2_df  # thêm cột in place, không copy frame
     
     # Initialize reply columns
     step3_df['reply_found'] = False
     step3_df['reply_bank'] = None
-    step3_df['reply_volume'] = None
+    step3_df['reply_volume'] = np.nan
     step3_df['reply_trader'] = None
     step3_df['reply_action'] = None
     step3_df['reply_target_trader'] = None
-    step3_df['reply_implied_price'] = None
-    step3_df['time_gap_minutes'] = None
+    step3_df['reply_implied_price'] = np.nan
+    step3_df['time_gap_minutes'] = np.nan
     step3_df['reply_problems'] = ''
     
-    start_messages = step3_df[step3_df['intent_type'] == 'START'].copy()
+    windows = WindowIndex(step3_df)
+    traders = step3_df['trader_name'].to_numpy(dtype=object)
+    banks = step3_df['bank_name'].to_numpy(dtype=object)
+    messages = step3_df['message'].to_numpy()
+    # Context START chỉ cần 2 cột; dùng object/float thường (iterrows trên cột category chậm)
+    start_context_columns = pd.DataFrame({
+        'trader_name': traders,
+        'entity_price': step3_df['entity_price'].to_numpy()
+    })
     
-    for start_idx, start_row in start_messages.iterrows():
-        start_time = datetime.strptime(start_row['time'], '%H:%M:%S')
-        start_trader = start_row['trader_name']
-        start_date = start_row['date']
-        
-        # WINDOW LOGIC
-        next_start_same_trader = step3_df[
-            (step3_df['intent_type'] == 'START') &
-            (step3_df['trader_name'] == start_trader) &
-            (step3_df['date'] == start_date) &
-            (step3_df.index > start_idx)
-        ]
+    found_positions = []
+    found_replies = []
+    missing_positions = []
+    
+    for start_pos in windows.start_positions:
+        start_trader = traders[start_pos]
         
-        window_end_idx = len(step3_df)
-        if not next_start_same_trader.empty:
-            window_end_idx = next_start_same_trader.index[0]
+        # WINDOW LOGIC: tới START tiếp theo cùng trader (index tính sẵn)
+        window_end_idx = windows.window_end(start_pos)
         
         # Find replies trong window
-        potential_replies = step3_df[
-            (step3_df['intent_type'] == 'REPLY') &
-            (step3_df['date'] == start_date) &
-            (step3_df.index > start_idx) &
-            (step3_df.index < window_end_idx) &
-            (step3_df['trader_name'] != start_trader)
-        ]
-        
-        best_reply = None
+        best_reply_pos = None
         min_time_gap = float('inf')
         
-        for reply_idx, reply_row in potential_replies.iterrows():
-            reply_time = datetime.strptime(reply_row['time'], '%H:%M:%S')
-            time_gap = (reply_time - start_time).total_seconds() / 60
+        for reply_pos in windows.candidates(start_pos, 'REPLY', window_end_idx):
+            if traders[reply_pos] == start_trader:
+                continue
+            time_gap = windows.gap_minutes(start_pos, reply_pos)
             
-            if time_gap <= 5 and time_gap < min_time_gap:
-                # Enhanced entity extraction for this reply
-                start_context = step3_df[
-                    (step3_df['intent_type'] == 'START') &
-                    (step3_df.index < reply_idx)
-                ].tail(5)
-                
-                enhanced_entities = enhanced_reply_extraction_for_reply(reply_row, start_context)
-                
-                best_reply = {
-                    'bank': reply_row['bank_name'],
-                    'trader': reply_row['trader_name'],
-                    'time_gap': time_gap,
-                    **enhanced_entities
-                }
+            if time_gap <= window_minutes and time_gap < min_time_gap:
+                best_reply_pos = reply_pos
                 min_time_gap = time_gap
         
-        # Update START message with reply info
+        best_reply = None
+        if best_reply_pos is not None:
+            # Enhanced entity extraction cho reply tốt nhất
+            reply_row = {'message': messages[best_reply_pos]}
+            start_context = start_context_columns.iloc[windows.starts_before(best_reply_pos, 5)]
+            
+            enhanced_entities = enhanced_reply_extraction_for_reply(reply_row, start_context)
+            
+            best_reply = {
+                'bank': banks[best_reply_pos],
+                'trader': traders[best_reply_pos],
+                'time_gap': min_time_gap,
+                **enhanced_entities
+            }
+        
+        # Gom kết quả, ghi vào DataFrame sau vòng lặp
         if best_reply:
-            step3_df.at[start_idx, 'reply_found'] = True
-            step3_df.at[start_idx, 'reply_bank'] = best_reply['bank']
-            step3_df.at[start_idx, 'reply_volume'] = best_reply['reply_volume']
-            step3_df.at[start_idx, 'reply_trader'] = best_reply['trader']
-            step3_df.at[start_idx, 'reply_action'] = best_reply['reply_action']
-            step3_df.at[start_idx, 'reply_target_trader'] = best_reply['reply_target_trader']
-            step3_df.at[start_idx, 'reply_implied_price'] = best_reply['reply_implied_price']
-            step3_df.at[start_idx, 'time_gap_minutes'] = best_reply['time_gap']
+            found_positions.append(start_pos)
+            found_replies.append(best_reply)
         else:
-            step3_df.at[start_idx, 'reply_problems'] = 'no_reply_found'
+            missing_positions.append(start_pos)
+    
+    # Update START messages with reply info
+    set_rows(step3_df, found_positions, 'reply_found', [True] * len(found_positions))
+    for column, key in [('reply_bank', 'bank'), ('reply_volume', 'reply_volume'),
+                        ('reply_trader', 'trader'), ('reply_action', 'reply_action'),
+                        ('reply_target_trader', 'reply_target_trader'),
+                        ('reply_implied_price', 'reply_implied_price'),
+                        ('time_gap_minutes', 'time_gap')]:
+        set_rows(step3_df, found_positions, column, [reply[key] for reply in found_replies])
+    set_rows(step3_df, missing_positions, 'reply_problems', ['no_reply_found'] * len(missing_positions))
     
     # Statistics
     starts_with_reply = step3_df[(step3_df['intent_type'] == 'START') & (step3_df['reply_found'])].shape[0]
@@ -478,9 +493,11 @@ def enhanced_reply_matching(step2_df):
     return step3_df
 
 def enhanced_entity_extraction_for_confirm(row):
-    """Extract đầy đủ entities cho CONFIRM"""
+    """Extract đầy đủ entities cho CONFIRM (memo theo message - key_calling tính 1 lần)"""
     message = str(row['message']).lower()
-    
+    return FEATURES.get(message, 'confirm_entities', _confirm_entities)
+
+def _confirm_entities(message):
     # Extract counterparty name
     counterparty = None
     patterns = [
@@ -518,17 +535,52 @@ def enhanced_entity_extraction_for_confirm(row):
         'confirm_key_calling': ','.join(key_calling) if key_calling else None
     }
 
-def enhanced_confirmation_processing_collect_all(step3_df):
+def confirm_status(confirm_message):
+    """Status của 1 CONFIRM message (đã lower) với fuzzy matching"""
+    return FEATURES.get(confirm_message, 'confirm_status', _confirm_status)
+
+def _confirm_status(confirm_message):
+    status = "unknown"
+    rule = None
+    keywords = message_keywords(confirm_message)
+    if 'status_done_ok' in keywords:
+        status, rule = "confirmed", 'done_ok'
+    elif 'status_not_suit' in keywords:
+        status, rule = "rejected", 'not_suit'
+    elif 'status_thanks' in keywords:
+        status, rule = "acknowledged", 'thanks'
+    else:
+        # Check fuzzy patterns
+        if 'fuzzy_done' in keywords:
+            status, rule = "confirmed", 'fuzzy_done'
+        elif 'fuzzy_oki' in keywords:
+            status, rule = "confirmed", 'fuzzy_oki'
+        elif 'fuzzy_tks' in keywords:
+            status, rule = "acknowledged", 'fuzzy_tks'
+    count_rule(f'confirm.status.{rule or status}')
+    return status
+
+def merge_confirm_status(final_status, status):
+    """Update final status với priority rules"""
+    if status == "confirmed":
+        final_status = "confirmed"
+    elif status == "acknowledged" and final_status not in ["confirmed", "rejected"]:
+        final_status = "acknowledged"
+    elif status == "rejected":
+        final_status = "rejected"  # Rejected overrides all
+    return final_status
+
+def enhanced_confirmation_processing_collect_all(step3_df, window_minutes=CONFIRM_WINDOW_MINUTES):
     """COLLECT ALL CONFIRMS trong window - không break!"""
     print("STEP 4: ENHANCED CONFIRMATION PROCESSING - COLLECT ALL")
     print("-" * 55)
     
-    step4_df = step3_df.copy()
+    step4_df = step3_df  # thêm cột in place, không copy frame
     
     # Initialize confirm columns
     step4_df['confirm_found'] = False
     step4_df['confirm_status'] = None
-    step4_df['confirm_volume'] = None
+    step4_df['confirm_volume'] = np.nan
     step4_df['confirm_trader'] = None
     step4_df['confirm_counterparty'] = None
     step4_df['confirm_key_calling'] = None
@@ -537,36 +589,31 @@ def enhanced_confirmation_processing_collect_all(step3_df):
     step4_df['confirm_problems'] = ''
     
     # Process START messages with replies
-    start_with_reply = step4_df[
-        (step4_df['intent_type'] == 'START') & 
-        (step4_df['reply_found'])
-    ].copy()
+    start_with_reply = np.flatnonzero(
+        ((step4_df['intent_type'] == 'START') & (step4_df['reply_found'])).to_numpy()
+    )
     
-    for start_idx, start_row in start_with_reply.iterrows():
-        start_time = datetime.strptime(start_row['time'], '%H:%M:%S')
-        start_trader = start_row['trader_name']
-        reply_trader = start_row['reply_trader']
-        start_date = start_row['date']
-        
-        # WINDOW LOGIC for CONFIRM
-        next_start_same_trader = step4_df[
-            (step4_df['intent_type'] == 'START') &
-            (step4_df['trader_name'] == start_trader) &
-            (step4_df['date'] == start_date) &
-            (step4_df.index > start_idx)
-        ]
+    windows = WindowIndex(step4_df)
+    traders = step4_df['trader_name'].to_numpy(dtype=object)
+    reply_traders = step4_df['reply_trader'].to_numpy(dtype=object)
+    messages = step4_df['message'].to_numpy()
+    
+    found_positions = []
+    found_results = []
+    missing_positions = []
+    
+    for start_pos in start_with_reply:
+        start_trader = traders[start_pos]
+        reply_trader = reply_traders[start_pos]
         
-        confirm_window_end_idx = len(step4_df)
-        if not next_start_same_trader.empty:
-            confirm_window_end_idx = next_start_same_trader.index[0]
+        # WINDOW LOGIC for CONFIRM: tới START tiếp theo cùng trader (index tính sẵn)
+        confirm_window_end_idx = windows.window_end(start_pos)
         
         # Find ALL confirmations trong window
-        potential_confirms = step4_df[
-            (step4_df['intent_type'] == 'CONFIRM') &
-            (step4_df['date'] == start_date) &
-            (step4_df.index > start_idx) &
-            (step4_df.index < confirm_window_end_idx) &
-            (step4_df['trader_name'].isin([start_trader, reply_trader]))
+        confirm_positions = windows.candidates(start_pos, 'CONFIRM', confirm_window_end_idx)
+        potential_confirms = [
+            pos for pos in confirm_positions
+            if traders[pos] in (start_trader, reply_trader)
         ]
         
         # COLLECT ALL CONFIRMS - không break!
@@ -574,29 +621,15 @@ def enhanced_confirmation_processing_collect_all(step3_df):
         final_status = "unknown"
         final_volume = None
         
-        for confirm_idx, confirm_row in potential_confirms.iterrows():
-            confirm_time = datetime.strptime(confirm_row['time'], '%H:%M:%S')
-            time_gap = (confirm_time - start_time).total_seconds() / 60
+        for confirm_pos in potential_confirms:
+            time_gap = windows.gap_minutes(start_pos, confirm_pos)
             
-            if time_gap <= 5:  # Within 5 minutes
+            if time_gap <= window_minutes:  # Within 5 minutes (mặc định)
+                confirm_row = {'message': messages[confirm_pos]}
                 confirm_message = str(confirm_row['message']).lower()
                 
                 # Determine status với fuzzy matching
-                status = "unknown"
-                if any(kw in confirm_message for kw in ['done', 'ok']):
-                    status = "confirmed"
-                elif 'not suit' in confirm_message:
-                    status = "rejected"
-                elif any(kw in confirm_message for kw in ['tks', 'thanks']):
-                    status = "acknowledged"
-                else:
-                    # Check fuzzy patterns
-                    if re.search(r'd[so]ne', confirm_message):
-                        status = "confirmed"
-                    elif re.search(r'ok[ie]', confirm_message):
-                        status = "confirmed"
-                    elif re.search(r'tk+s+', confirm_message):
-                        status = "acknowledged"
+                status = confirm_status(confirm_message)
                 
                 # Extract volume
                 confirm_volume = extract_volume(confirm_message)
@@ -606,22 +639,17 @@ def enhanced_confirmation_processing_collect_all(step3_df):
                 
                 # Add to collection
                 all_confirms.append({
-                    'idx': confirm_idx,
+                    'pos': confirm_pos,
                     'status': status,
                     'volume': confirm_volume,
-                    'trader': confirm_row['trader_name'],
+                    'trader': traders[confirm_pos],
                     'message': confirm_row['message'],
                     'time_gap': time_gap,
                     **enhanced_entities
                 })
                 
                 # Update final status với priority rules
-                if status == "confirmed":
-                    final_status = "confirmed"
-                elif status == "acknowledged" and final_status not in ["confirmed", "rejected"]:
-                    final_status = "acknowledged"
-                elif status == "rejected":
-                    final_status = "rejected"  # Rejected overrides all
+                final_status = merge_confirm_status(final_status, status)
                     
                 # Update volume if found
                 if confirm_volume and final_volume is None:
@@ -629,21 +657,29 @@ def enhanced_confirmation_processing_collect_all(step3_df):
                 
                 # KHÔNG BREAK - collect tất cả!
         
-        # Update START message with aggregated confirm info
+        # Aggregated confirm info cho START message
         if all_confirms:
-            step4_df.at[start_idx, 'confirm_found'] = True
-            step4_df.at[start_idx, 'confirm_status'] = final_status
-            step4_df.at[start_idx, 'confirm_volume'] = final_volume
-            step4_df.at[start_idx, 'confirm_count'] = len(all_confirms)
-            step4_df.at[start_idx, 'confirm_trader'] = all_confirms[0]['trader']
-            step4_df.at[start_idx, 'confirm_counterparty'] = all_confirms[0].get('confirm_counterparty')
-            step4_df.at[start_idx, 'confirm_key_calling'] = all_confirms[0].get('confirm_key_calling')
-            
             # Store all confirm messages for debugging
             confirm_msgs = [f"{c['status']}:{c['message'][:20]}" for c in all_confirms]
-            step4_df.at[start_idx, 'confirm_messages'] = ' | '.join(confirm_msgs)
+            found_positions.append(start_pos)
+            found_results.append({
+                'confirm_status': final_status,
+                'confirm_volume': final_volume,
+                'confirm_count': len(all_confirms),
+                'confirm_trader': all_confirms[0]['trader'],
+                'confirm_counterparty': all_confirms[0].get('confirm_counterparty'),
+                'confirm_key_calling': all_confirms[0].get('confirm_key_calling'),
+                'confirm_messages': ' | '.join(confirm_msgs),
+            })
         else:
-            step4_df.at[start_idx, 'confirm_problems'] = 'no_confirm_found'
+            missing_positions.append(start_pos)
+    
+    # Update START messages (1 lần / cột)
+    set_rows(step4_df, found_positions, 'confirm_found', [True] * len(found_positions))
+    for column in ['confirm_status', 'confirm_volume', 'confirm_count', 'confirm_trader',
+                   'confirm_counterparty', 'confirm_key_calling', 'confirm_messages']:
+        set_rows(step4_df, found_positions, column, [result[column] for result in found_results])
+    set_rows(step4_df, missing_positions, 'confirm_problems', ['no_confirm_found'] * len(missing_positions))
     
     # Statistics
     starts_with_confirm = step4_df[
@@ -672,20 +708,88 @@ def enhanced_confirmation_processing_collect_all(step3_df):
     
     return step4_df
 
-def enhanced_deal_assembly(step4_df):
+def assemble_deal(start_side, start_bank, reply_bank, volumes, chat_price,
+                  price_range=PRICE_RANGE, volume_range=VOLUME_RANGE):
+    """Ghép 1 deal từ START + reply + confirm.
+
+    Trả về (deal, []) nếu hợp lệ, (None, problems) nếu có problems cần ghi lại,
+    (None, []) nếu bị bỏ qua (unclear side, thiếu volume/price/bank).
+    """
+    problems = []
+    
+    # Determine buy/sell sides
+    if start_side == 'bid':
+        buy_side = start_bank
+        sell_side = reply_bank
+    elif start_side == 'offer':
+        buy_side = reply_bank
+        sell_side = start_bank
+    else:
+        count_rule('assembly.skip.unclear_side')
+        return None, []
+    
+    # Enhanced volume resolution: entity, reply, confirm volume
+    volumes = [v for v in volumes if pd.notna(v)]
+    if volumes:
+        final_amount = min(volumes)
+    else:
+        count_rule('assembly.skip.no_volume')
+        return None, []
+        
+    # Enhanced price handling
+    if pd.notna(chat_price):
+        if chat_price >= 400:
+            final_price = int(chat_price % 100)
+            actual_price = 25000 + int(chat_price)
+        elif chat_price <= 99:
+            final_price = int(chat_price)
+            actual_price = 25300 + int(chat_price)
+        else:
+            final_price = int(chat_price % 100)
+            actual_price = 25000 + int(chat_price)
+    else:
+        count_rule('assembly.skip.no_price')
+        return None, []
+    
+    # Enhanced validation
+    if buy_side == sell_side:
+        count_rule('assembly.skip.same_bank')
+        return None, []
+    if not (volume_range[0] <= final_amount <= volume_range[1]):
+        problems.append("volume_out_of_range")
+    if not (price_range[0] <= final_price <= price_range[1]):
+        problems.append("price_out_of_range")
+    if buy_side is None or sell_side is None:
+        count_rule('assembly.skip.missing_bank')
+        return None, []
+    
+    if problems:
+        for problem in problems:
+            count_rule(f'assembly.problem.{problem}')
+        return None, problems
+    count_rule('assembly.valid')
+    return {
+        'buy_side': buy_side,
+        'sell_side': sell_side,
+        'amount': final_amount,
+        'price': final_price,
+        'actual_price': actual_price
+    }, []
+
+def enhanced_deal_assembly(step4_df, price_range=PRICE_RANGE, volume_range=VOLUME_RANGE):
     """Enhanced deal assembly với improved validation"""
     print("STEP 5: ENHANCED DEAL ASSEMBLY")
     print("-" * 30)
     
-    step5_df = step4_df.copy()
+    step5_df = step4_df  # thêm cột in place, không copy frame
     
     # Initialize deal columns
     step5_df['deal_valid'] = False
     step5_df['final_buy_side'] = None
     step5_df['final_sell_side'] = None
-    step5_df['final_amount'] = None
-    step5_df['final_price'] = None
-    step5_df['final_actual_price'] = None
+    step5_df['final_amount'] = np.nan
+    step5_df['final_price'] = pd.Series(pd.NA, index=step5_df.index, dtype='Int64')
+    step5_df['final_actual_price'] = pd.Series(pd.NA, index=step5_df.index, dtype='Int64')
     step5_df['deal_problems'] = ''
     
     # Process confirmed deals
@@ -699,74 +803,22 @@ def enhanced_deal_assembly(step4_df):
     valid_deals = 0
     
     for idx, row in confirmed_deals.iterrows():
-        problems = []
-        
-        # Determine buy/sell sides
-        start_side = row['entity_side']
-        start_bank = row['bank_name']
-        reply_bank = row['reply_bank']
-        
-        if start_side == 'bid':
-            buy_side = start_bank
-            sell_side = reply_bank
-        elif start_side == 'offer':
-            buy_side = reply_bank
-            sell_side = start_bank
-        else:
-            problems.append("unclear_side")
-            continue
-        
-        # Enhanced volume resolution
-        volumes = []
-        if pd.notna(row['entity_volume']):
-            volumes.append(row['entity_volume'])
-        if pd.notna(row['reply_volume']):
-            volumes.append(row['reply_volume'])
-        if pd.notna(row['confirm_volume']):
-            volumes.append(row['confirm_volume'])
-        
-        if volumes:
-            final_amount = min(volumes)
-        else:
-            problems.append("no_volume")
-            continue
-            
-        # Enhanced price handling
-        chat_price = row['entity_price']
-        if pd.notna(chat_price):
-            if chat_price >= 400:
-                final_price = int(chat_price % 100)
-                actual_price = 25000 + int(chat_price)
-            elif chat_price <= 99:
-                final_price = int(chat_price)
-                actual_price = 25300 + int(chat_price)
-            else:
-                final_price = int(chat_price % 100)
-                actual_price = 25000 + int(chat_price)
-        else:
-            problems.append("no_price")
-            continue
-        
-        # Enhanced validation
-        if buy_side == sell_side:
-            problems.append("same_bank_sides")
-            continue
-        if not (0.1 <= final_amount <= 100):
-            problems.append("volume_out_of_range")
-        if not (0 <= final_price <= 99):
-            problems.append("price_out_of_range")
-        if buy_side is None or sell_side is None:
-            problems.append("missing_banks")
+        deal, problems = assemble_deal(
+            row['entity_side'], row['bank_name'], row['reply_bank'],
+            [row['entity_volume'], row['reply_volume'], row['confirm_volume']],
+            row['entity_price'], price_range, volume_range
+        )
+        if deal is None and not problems:
             continue
             
         # Mark as valid deal
-        if not problems:
+        if deal is not None:
             step5_df.at[idx, 'deal_valid'] = True
-            step5_df.at[idx, 'final_buy_side'] = buy_side
-            step5_df.at[idx, 'final_sell_side'] = sell_side
-            step5_df.at[idx, 'final_amount'] = final_amount
-            step5_df.at[idx, 'final_price'] = final_price
-            step5_df.at[idx, 'final_actual_price'] = actual_price
+            step5_df.at[idx, 'final_buy_side'] = deal['buy_side']
+            step5_df.at[idx, 'final_sell_side'] = deal['sell_side']
+            step5_df.at[idx, 'final_amount'] = deal['amount']
+            step5_df.at[idx, 'final_price'] = deal['price']
+            step5_df.at[idx, 'final_actual_price'] = deal['actual_price']
             valid_deals += 1
         else:
             step5_df.at[idx, 'deal_problems'] = ';'.join(problems)
@@ -806,6 +858,15 @@ def create_final_output(step5_df):
     final_df = pd.DataFrame(final_output)
     return final_df
 
+# Các stage của pipeline v5; cột string lặp lại đổi sang category sau mỗi stage
+PIPELINE_STAGES = [
+    Stage('intent', enhanced_intent_detection, ['date', 'bank_name', 'trader_name', 'intent_type', 'problems']),
+    Stage('entities', enhanced_entity_extraction, ['entity_side', 'entity_problems']),
+    Stage('reply', enhanced_reply_matching, ['reply_bank', 'reply_trader', 'reply_action', 'reply_problems']),
+    Stage('confirm', enhanced_confirmation_processing_collect_all, ['confirm_status', 'confirm_trader', 'confirm_problems']),
+    Stage('assembly', enhanced_deal_assembly, ['final_buy_side', 'final_sell_side', 'deal_problems']),
+]
+
 def main():
     """Main execution với collect all confirms"""
     
@@ -815,30 +876,18 @@ def main():
     
     # Load input
     input_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\input_expanded_banks.csv'
-    df = pd.read_csv(input_file, encoding='utf-8-sig')
+    df = load_chat_log(input_file)
     
     print(f"Loaded {len(df)} messages from input")
     print()
     
-    # Step 1: Enhanced Intent Detection với fuzzy
-    step1_df = enhanced_intent_detection(df)
-    
-    # Step 2: Enhanced Entity Extraction
-    step2_df = enhanced_entity_extraction(step1_df)
-    
-    # Step 3: Enhanced Reply Matching
-    step3_df = enhanced_reply_matching(step2_df)
-    
-    # Step 4: COLLECT ALL CONFIRMS - key fix!
-    step4_df = enhanced_confirmation_processing_collect_all(step3_df)
-    
-    # Step 5: Enhanced Deal Assembly
-    step5_df = enhanced_deal_assembly(step4_df)
+    # Step 1-5 trên cùng 1 frame (không copy), report time/memory từng stage
+    step5_df, _ = run_stages(df, PIPELINE_STAGES)
     
     # Save intermediate results
-    intermediate_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\intermediate_v5_collect_all_results.csv'
-    step5_df.to_csv(intermediate_file, index=False, encoding='utf-8-sig')
-    print(f"Intermediate results saved: {intermediate_file}")
+    intermediate_file = r'D:\Projects\03.FI_crawldata\03_Task_Extract_ChatRoom\intermediate_v5_collect_all_results.parquet'
+    saved = save_intermediate(step5_df, intermediate_file, csv=csv_requested())  # --csv: thêm bản CSV cho Excel
+    print(f"Intermediate results saved: {', '.join(saved)}")
     
     # Create final output
     final_df = create_final_output(step5_df)
@@ -0,0 +1,212 @@
+"""
+Stage runner - chạy các step của pipeline trên 1 DataFrame (không copy)
+
+- Mỗi stage nhận frame, thêm cột in place và trả về chính frame đó
+  (stage đầu tiên có thể trả về frame mới, vd Step 1 dựng frame từ input);
+  kết quả theo row ghi bằng set_rows (1 lần / cột)
+- Sau mỗi stage các cột string lặp lại (bank, trader, status, ...) được đổi
+  sang category
+- Report mỗi stage: wall/CPU time, rows in/out, rows/sec, memory của frame,
+  RSS đầu/cuối, peak RSS trong lúc chạy stage và rule hits (instrumentation)
+
+RSS đọc từ psutil nếu có, không thì /proc/self/statm (Linux) hoặc peak RSS
+của process (resource.getrusage). children=True cộng thêm RSS của mọi process
+con / cháu (vd worker của ProcessPoolExecutor) - psutil hoặc /proc.
+"""
+
+import os
+import sys
+import time
+import threading
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from instrumentation import RULE_HITS, rule_hits_since
+from feature_cache import FEATURES
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _statm_rss(pid):
+    with open(f'/proc/{pid}/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def _child_pids(pid):
+    """pid của mọi process con / cháu (Linux /proc)"""
+    children = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(name))
+
+    found, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def current_rss(children=False):
+    """RSS hiện tại của process (bytes), None nếu không đo được
+
+    children: cộng RSS của các process con / cháu đang chạy
+    """
+    if psutil is not None:
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        if children:
+            for child in process.children(recursive=True):
+                try:
+                    rss += child.memory_info().rss
+                except psutil.Error:
+                    pass
+        return rss
+    try:
+        rss = _statm_rss('self')
+        if children:
+            for pid in _child_pids(os.getpid()):
+                try:
+                    rss += _statm_rss(pid)
+                except (OSError, ValueError):
+                    pass  # process con vừa kết thúc
+        return rss
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # Peak RSS của process - KB trên Linux, bytes trên macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    return None
+
+
+class PeakRSS:
+    """Đo peak RSS trong 1 block bằng thread lấy mẫu (children: gồm cả process con)"""
+
+    def __init__(self, interval=0.005, children=False):
+        self.interval = interval
+        self.children = children
+        self.start = None
+        self.end = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            rss = current_rss(self.children)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def __enter__(self):
+        self.start = self.peak = current_rss(self.children)
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.end = current_rss(self.children)
+        if self.end is not None and (self.peak is None or self.end > self.peak):
+            self.peak = self.end
+
+
+@dataclass
+class Stage:
+    name: str
+    func: object
+    categories: list = field(default_factory=list)
+
+
+def to_categories(df, columns):
+    """Đổi các cột string lặp lại sang category (bỏ qua cột không có)"""
+    for column in columns:
+        if column in df.columns and df[column].dtype == object:
+            df[column] = df[column].astype('category')
+    return df
+
+
+def set_rows(df, positions, column, values):
+    """Ghi values vào các row (positions) của 1 cột trong 1 lần thay vì .at từng row"""
+    if len(positions):
+        df.iloc[positions, df.columns.get_loc(column)] = pd.array(values, dtype=df[column].dtype)
+
+
+def _mb(value):
+    return f"{value / 1024 / 1024:8.1f}" if value is not None else "     n/a"
+
+
+def run_stage(name, func, df, categories=(), **config):
+    """Chạy 1 stage + đo, trả về (frame, stats)"""
+    rows_in = len(df)
+    hits_before = dict(RULE_HITS)
+    cache_before = FEATURES.snapshot()
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    with PeakRSS() as rss:
+        df = func(df, **config)
+        to_categories(df, categories)
+    seconds = time.perf_counter() - started
+    return df, {
+        'stage': name,
+        'seconds': seconds,
+        'cpu_seconds': time.process_time() - cpu_started,
+        'rows_in': rows_in,
+        'rows': len(df),
+        'rows_out': len(df),
+        'rows_per_sec': rows_in / seconds if seconds > 0 else None,
+        'frame_bytes': int(df.memory_usage(deep=True).sum()),
+        'rss_start': rss.start,
+        'rss_end': rss.end,
+        'rss_peak': rss.peak,
+        'rule_hits': rule_hits_since(hits_before),
+        'feature_cache': FEATURES.stats(since=cache_before),
+    }
+
+
+def run_stages(df, stages, report=True):
+    """Chạy lần lượt các stage, trả về (frame cuối, stats từng stage)"""
+    stats = []
+    for stage in stages:
+        df, stage_stats = run_stage(stage.name, stage.func, df, stage.categories)
+        stats.append(stage_stats)
+
+    if report:
+        print_stage_report(stats)
+    return df, stats
+
+
+def print_stage_report(stats):
+    print("STAGE REPORT")
+    print("-" * 12)
+    print(f"{'stage':<12} {'time(s)':>8} {'cpu(s)':>8} {'rows':>8} {'rows/s':>9} "
+          f"{'frame MB':>9} {'RSS MB':>8} {'peak MB':>8} {'cache%':>7}")
+    for row in stats:
+        cached = '  (cached)' if row.get('cached') else ''
+        cpu = row.get('cpu_seconds')
+        rate = row.get('rows_per_sec')
+        hit_rate = (row.get('feature_cache') or {}).get('hit_rate')
+        cache_rate = f"{hit_rate * 100:7.1f}" if hit_rate is not None else "      -"
+        print(f"{row['stage']:<12} {row['seconds']:8.2f} "
+              f"{cpu if cpu is not None else float('nan'):8.2f} {row['rows']:8d} "
+              f"{rate if rate is not None else float('nan'):9.0f} "
+              f"{_mb(row['frame_bytes']):>9} {_mb(row['rss_end'])} {_mb(row['rss_peak'])} {cache_rate}{cached}")
+    print()
@@ -0,0 +1,281 @@
+"""
+Streaming deal engine - 1 lượt quét theo thứ tự chat log thay cho Step 2-5
+
+Intent của từng message lấy từ Step 1 vectorized (cần lookahead 30s cho
+Case 1 nên làm trên cả cột). Sau đó quét các message đúng 1 lần:
+- START  → mở window mới cho (date, trader); START tiếp theo cùng trader
+           đóng window cũ (giống window logic của v5)
+- REPLY  → gắn vào các window đang mở cùng ngày của trader khác (gap <= 5 phút,
+           giữ reply có gap nhỏ nhất)
+- CONFIRM → gom vào các window đang mở cùng ngày (gap <= 5 phút)
+- Window hết hạn → ghép deal ngay: khi mọi message còn lại của ngày đó có
+  seconds > START + 5 phút (suffix-min seconds theo ngày, tính sẵn 1 lần), nên
+  đúng cả khi thời gian trong ngày không sort; message cuối của ngày đóng mọi
+  window của ngày đó
+
+Output giống create_final_output của solution_v5_collect_all_confirms.
+Thời gian O(n log n + n · w), w = số window còn mở (START trong 5 phút gần
+nhất của ngày nếu thời gian đã sort; không sort thì w có thể lớn hơn, vì 1
+message đến sau có thể mang thời gian sớm hơn). Bộ nhớ O(w).
+
+Usage:
+    python streaming_engine.py
+    python streaming_engine.py --input input_expanded_banks.csv --output solution_streaming_results.csv
+"""
+
+import argparse
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from chat_log import load_chat_log, time_columns, MISSING
+from vectorized_intent import vectorized_intent_detection
+from solution_v5_collect_all_confirms import (
+    extract_volume,
+    extract_start_entities,
+    confirm_status,
+    merge_confirm_status,
+    assemble_deal,
+)
+
+WINDOW_MINUTES = 5
+WINDOW_SECONDS = WINDOW_MINUTES * 60  # gap <= 5 phút ⟺ seconds <= START + 300 (integer)
+
+OUTPUT_COLUMNS = ['STT', 'Buy_side', 'Amount', 'Price', 'Sell_side', 'Actual_price', 'Actual_price_2digit']
+
+
+class DealWindow:
+    """1 START đang chờ reply/confirm"""
+    __slots__ = ('pos', 'seconds', 'trader', 'bank', 'entities', 'closed',
+                 'reply_gap', 'reply_bank', 'reply_trader', 'reply_volume', 'confirms')
+
+    def __init__(self, pos, seconds, trader, bank, entities):
+        self.pos = pos
+        self.seconds = seconds
+        self.trader = trader
+        self.bank = bank
+        self.entities = entities
+        self.closed = False
+        self.reply_gap = float('inf')
+        self.reply_bank = None
+        self.reply_trader = None
+        self.reply_volume = None
+        self.confirms = []  # (trader, status, volume) theo thứ tự message
+
+    def gap(self, seconds):
+        return int(seconds - self.seconds) / 60
+
+    def offer_reply(self, seconds, trader, bank, message):
+        time_gap = self.gap(seconds)
+        if time_gap <= WINDOW_MINUTES and time_gap < self.reply_gap:
+            self.reply_gap = time_gap
+            self.reply_bank = bank
+            self.reply_trader = trader
+            self.reply_volume = extract_volume(message)
+
+    def offer_confirm(self, seconds, trader, status, volume):
+        # reply_trader có thể còn thay đổi → lọc trader khi đóng window
+        if self.gap(seconds) <= WINDOW_MINUTES:
+            self.confirms.append((trader, status, volume))
+
+    def close(self):
+        """Đóng window, trả về deal (dict) hoặc None"""
+        self.closed = True
+        if self.reply_gap == float('inf'):
+            return None
+
+        final_status = "unknown"
+        final_volume = None
+        confirm_count = 0
+        for trader, status, volume in self.confirms:
+            if trader != self.trader and trader != self.reply_trader:
+                continue
+            confirm_count += 1
+            final_status = merge_confirm_status(final_status, status)
+            if volume and final_volume is None:
+                final_volume = volume
+
+        if not confirm_count or final_status != "confirmed":
+            return None
+
+        deal, _ = assemble_deal(
+            self.entities['side'], self.bank, self.reply_bank,
+            [self.entities['volume'], self.reply_volume, final_volume],
+            self.entities['price']
+        )
+        return deal
+
+
+class StreamingDealEngine:
+    def __init__(self):
+        self.open_windows = {}   # date_ordinal → {START position: DealWindow} đang mở
+        self.expiry = {}         # date_ordinal → heap (START seconds, position)
+        self.by_trader = {}      # (date_ordinal, trader) → DealWindow đang mở
+        self.deals = []          # (start position, deal)
+        self.stats = {
+            'messages': 0,
+            'windows_opened': 0,
+            'windows_timed_out': 0,
+            'windows_with_reply': 0,
+            'max_open_windows': 0,
+        }
+        self._open_count = 0
+
+    def _close(self, window, date):
+        if window.closed:
+            return
+        self.open_windows[date].pop(window.pos, None)
+        if window.reply_gap != float('inf'):
+            self.stats['windows_with_reply'] += 1
+        deal = window.close()
+        self._open_count -= 1
+        if deal is not None:
+            self.deals.append((window.pos, deal))
+
+    def _expire(self, date, next_min):
+        """Đóng các window không message nào còn lại của ngày lọt vào được
+
+        next_min: seconds nhỏ nhất trong các message sau của ngày (inf nếu hết ngày)
+        """
+        heap = self.expiry.get(date)
+        windows = self.open_windows.get(date)
+        while heap and heap[0][0] + WINDOW_SECONDS < next_min:
+            _, pos = heapq.heappop(heap)
+            window = windows.get(pos)
+            if window is not None:
+                self.stats['windows_timed_out'] += 1
+                self._close(window, date)
+                if self.by_trader.get((date, window.trader)) is window:
+                    del self.by_trader[(date, window.trader)]
+        if not heap and date in self.expiry:
+            del self.expiry[date], self.open_windows[date]
+
+    def process(self, pos, date, seconds, trader, bank, intent, message, next_min=None):
+        """1 message; next_min (nếu có) = min seconds của các message sau cùng ngày"""
+        self.stats['messages'] += 1
+        if date == MISSING:
+            return  # mask gốc `date == start_date` không bao giờ khớp NaN
+
+        self._handle(pos, date, seconds, trader, bank, intent, message)
+        if next_min is not None:
+            self._expire(date, next_min)
+
+    def _handle(self, pos, date, seconds, trader, bank, intent, message):
+        if intent == 'START':
+            if not pd.isna(trader):
+                previous = self.by_trader.pop((date, trader), None)
+                if previous is not None:
+                    self._close(previous, date)
+
+            window = DealWindow(pos, seconds, trader, bank, extract_start_entities(str(message).lower()))
+            self.open_windows.setdefault(date, {})[pos] = window
+            heapq.heappush(self.expiry.setdefault(date, []), (seconds, pos))
+            if not pd.isna(trader):
+                self.by_trader[(date, trader)] = window
+            self.stats['windows_opened'] += 1
+            self._open_count += 1
+            self.stats['max_open_windows'] = max(self.stats['max_open_windows'], self._open_count)
+
+        elif intent == 'REPLY':
+            lowered = str(message).lower()
+            for window in self.open_windows.get(date, {}).values():
+                if window.trader != trader:
+                    window.offer_reply(seconds, trader, bank, lowered)
+
+        elif intent == 'CONFIRM':
+            lowered = str(message).lower()
+            status = None
+            for window in self.open_windows.get(date, {}).values():
+                if status is None:
+                    status = confirm_status(lowered)
+                    volume = extract_volume(lowered)
+                window.offer_confirm(seconds, trader, status, volume)
+
+    def finish(self):
+        """Đóng tất cả window còn mở, trả về deals theo thứ tự START"""
+        for date, windows in list(self.open_windows.items()):
+            for window in list(windows.values()):
+                self._close(window, date)
+        self.open_windows.clear()
+        self.expiry.clear()
+        self.by_trader.clear()
+        self.deals.sort(key=lambda item: item[0])
+        return [deal for _, deal in self.deals]
+
+
+def next_min_seconds(dates, seconds):
+    """Với mỗi row: min seconds của các row sau cùng ngày (inf nếu là row cuối của ngày)
+
+    MISSING (-1) giữ nguyên như trong gap của v5 (nhỏ hơn mọi thời gian).
+    """
+    frame = pd.DataFrame({'date': dates, 'seconds': seconds.astype(float)})
+    suffix_min = frame[::-1].groupby('date', sort=False)['seconds'].cummin()[::-1]
+    following = suffix_min.groupby(frame['date'], sort=False).shift(-1)
+    return following.fillna(np.inf).to_numpy()
+
+
+def run_streaming(step1_df):
+    """Chạy engine trên output Step 1, trả về final DataFrame (format GT)"""
+    print("STREAMING DEAL ENGINE")
+    print("-" * 21)
+
+    seconds, dates = time_columns(step1_df, date_col='date')
+    next_min = next_min_seconds(dates, seconds)
+
+    engine = StreamingDealEngine()
+    columns = zip(
+        dates.tolist(), seconds.tolist(), step1_df['trader_name'], step1_df['bank_name'],
+        step1_df['intent_type'], step1_df['message'], next_min.tolist()
+    )
+    for pos, (date, sec, trader, bank, intent, message, following) in enumerate(columns):
+        engine.process(pos, date, sec, trader, bank, intent, message, next_min=following)
+
+    deals = engine.finish()
+    stats = engine.stats
+    print(f"Messages streamed: {stats['messages']}")
+    print(f"START windows: {stats['windows_opened']} (expired: {stats['windows_timed_out']})")
+    print(f"Windows with reply: {stats['windows_with_reply']}")
+    print(f"Max open windows: {stats['max_open_windows']}")
+    print(f"Valid deals: {len(deals)}")
+    print()
+
+    if not deals:
+        print("No valid deals found!")
+        return pd.DataFrame()
+
+    final_output = []
+    for deal in deals:
+        final_output.append({
+            'STT': len(final_output) + 1,
+            'Buy_side': deal['buy_side'],
+            'Amount': deal['amount'],
+            'Price': deal['price'],
+            'Sell_side': deal['sell_side'],
+            'Actual_price': deal['actual_price'],
+            'Actual_price_2digit': deal['price']
+        })
+    return pd.DataFrame(final_output, columns=OUTPUT_COLUMNS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming deal extraction (v5 rules)')
+    parser.add_argument('--input', default='input_expanded_banks.csv')
+    parser.add_argument('--output', default='solution_streaming_results.csv')
+    args = parser.parse_args()
+
+    df = load_chat_log(args.input)
+    print(f"Loaded {len(df)} messages from input")
+    print()
+
+    step1_df = vectorized_intent_detection(df, 'v5')
+    final_df = run_streaming(step1_df)
+
+    if len(final_df) > 0:
+        final_df.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"Valid deals extracted: {len(final_df)}")
+        print(f"File saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
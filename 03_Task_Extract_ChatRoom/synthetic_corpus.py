@@ -0,0 +1,228 @@
+"""
+Synthetic FX chat corpus - sinh chat room VN/EN giống input_expanded_banks.csv
+kèm ground truth deals (format ground_truth_2digit.csv)
+
+Mỗi ngày gồm các episode đan xen nhau theo thời gian:
+- deal:       START (offer 44 4u / bid 91 1u) → REPLY (buy a Toàn 2u) →
+              CONFIRM (done Toàn / dsone / oke) → ack (tks / tkss)  → 1 GT deal
+- quote:      START không ai reply
+- rejected:   START → REPLY → "not suit"
+- no confirm: START → REPLY, không confirm
+- noise:      chat linh tinh, spread "27 28", số âm "bid on -1.4", giờ "10h30"
+Typo (dsone, dne, oke, okie, tkss, ...) theo typo_rate.
+
+Usage:
+    python synthetic_corpus.py --messages 100000 --output synthetic_100k.csv
+    (ghi synthetic_100k.csv + synthetic_100k_ground_truth.csv)
+"""
+
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+
+from remove_accents import ACCENT_TABLE as ASCII_TABLE
+
+BANKS = ['MSB', 'ABBK', 'ICBV', 'BIDV', 'MB', 'VIB', 'TPB', 'SABH', 'SEAV', 'NCB',
+         'OCB', 'VPB', 'VNTT', 'TCB', 'Fubon', 'NABV', 'VCB', 'HDB', 'LVBT', 'SHB']
+
+GIVEN_NAMES = ['Toàn', 'Tân', 'Khánh', 'Phùng', 'Minh', 'Hải', 'Tuệ', 'Hoài', 'An', 'Duy',
+               'Phong', 'Thái', 'Lan', 'Hương', 'Vy', 'Nam', 'Long', 'Trang', 'Quân', 'Linh',
+               'Dũng', 'Hà', 'Sơn', 'Thảo', 'Việt', 'Bảo', 'Hiếu', 'Ngọc', 'Tùng', 'Yến']
+MIDDLE_NAMES = ['Thanh', 'Thi', 'Minh', 'Duc', 'Van', 'Ngoc', 'Kim', 'Bao', 'Thu', 'Huu']
+FAMILY_NAMES = ['Nguyen', 'Tran', 'Le', 'Pham', 'Hoang', 'Vu', 'Dang', 'Bui', 'Do', 'Huynh']
+
+START_OFFER = ['offer {p} {v}u', 'offer {p} {v}u nhé', '{p} còn {v}u', 'off {p} {v}u',
+               'có {p} {v}u', 'offer {p}', 'bán {p} {v}u']
+START_BID = ['bid {p} {v}u', 'bid {p} {v}u if suit', 'mua {p} {v}u', 'bid {p}', 'bid {v}u {p}']
+REPLY_BUY = ['buy a {name} {v}u', 'buy {name} {v}u nhé', 'buy a {name}', 'buy {v}u', 'buy anh {name} {v}u']
+REPLY_SELL = ['sell a {name} {v}u', 'sell {name} {v}u', 'sell a {name}', 'sell {v}u', 'sell anh {name} {v}u luôn']
+CONFIRM = ['done {name}', 'done anh {name}', 'ok {name}', 'done {v}u', 'done', 'ok em']
+CONFIRM_TYPO = ['dsone {name}', 'dne {name}', 'oke {name}', 'okie', 'doen {name}', 'oki em']
+ACK = ['tks', 'e tks', 'tks anh', 'thanks', 'dạ tks anh']
+ACK_TYPO = ['tkss', 'em tksss', 'tkks', 'thnks']
+REJECT = ['not suit {name}', 'not suit', 'thôi ko suit']
+NOISE = [':)))', ':D', 'fomo quá', 'tom pls', '2u tom pls', 'signal gì vậy a', 'lừa gì :))', 'oái',
+         'all hả', 'ok', 'sell 9days', '10h30 nhé', 'bid on -1.4', 'offer -2', '{p} {p2}', '{p}/{p2}',
+         '00', 'tăng rồi', 'giá nào a', 'có ai offer ko', 'hôm nay vắng nhỉ', 'spot bao nhiêu a',
+         'đợi tí', 'lên luôn ko', '{p} tăng', 'nghỉ trưa', 'em chào các anh']
+
+VOLUMES = [1, 2, 2, 2, 3, 3, 3, 5, 5, 4, 10, 15]
+DAY_START = 8 * 3600 + 30 * 60
+DAY_END = 17 * 3600
+
+EPISODES = ['deal', 'quote', 'rejected', 'no_confirm', 'noise']
+EPISODE_WEIGHTS = [0.05, 0.25, 0.02, 0.05, 0.63]
+
+
+def build_roster(rng, n_traders=100):
+    """[(trader_name, email, bank, tên gọi có dấu)]"""
+    roster = []
+    for i in range(n_traders):
+        given = GIVEN_NAMES[i % len(GIVEN_NAMES)]
+        bank = rng.choice(BANKS)
+        ascii_given = given.translate(ASCII_TABLE)
+        trader_name = f"{ascii_given} {rng.choice(MIDDLE_NAMES)} {rng.choice(FAMILY_NAMES)}"
+        email = f"{ascii_given.lower()}{i}.{bank.lower()}@com.vn"
+        roster.append((trader_name, email, bank, given))
+    return roster
+
+
+def trading_days(count, start=date(2024, 10, 1)):
+    days = []
+    day = start
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+class CorpusGenerator:
+    def __init__(self, seed=0, per_day=1500, typo_rate=0.15, n_traders=100):
+        self.rng = random.Random(seed)
+        self.per_day = per_day
+        self.typo_rate = typo_rate
+        self.roster = build_roster(self.rng, n_traders)
+
+    def _called(self, trader):
+        """Tên gọi trong message: có dấu / không dấu / lowercase"""
+        given = trader[3]
+        roll = self.rng.random()
+        if roll < 0.6:
+            return given
+        if roll < 0.85:
+            return given.translate(ASCII_TABLE)
+        return given.lower()
+
+    def _fill(self, template, **values):
+        return template.format(**values).strip()
+
+    def _pick(self, plain, typo):
+        return self.rng.choice(typo if self.rng.random() < self.typo_rate else plain)
+
+    def _noise(self):
+        p = self.rng.randint(0, 99)
+        return self._fill(self.rng.choice(NOISE), p=f"{p:02d}", p2=f"{min(99, p + self.rng.randint(1, 5)):02d}")
+
+    def _episode(self, kind, t0, base):
+        """[(seconds, trader, message)], deal dict hoặc None"""
+        rng = self.rng
+        if kind == 'noise':
+            return [(t0, rng.choice(self.roster), self._noise())], None
+
+        quoter = rng.choice(self.roster)
+        side = rng.choice(['offer', 'bid'])
+        price = rng.randint(0, 99)
+        volume = rng.choice(VOLUMES)
+        template = rng.choice(START_OFFER if side == 'offer' else START_BID)
+        events = [(t0, quoter, self._fill(template, p=f"{price:02d}", v=volume))]
+        if kind == 'quote':
+            return events, None
+
+        replier = rng.choice([t for t in rng.sample(self.roster, 5) if t[2] != quoter[2]] or [quoter])
+        if replier[2] == quoter[2]:
+            return events, None
+        reply_volume = min(volume, rng.choice(VOLUMES)) if rng.random() < 0.3 else volume
+        t_reply = t0 + rng.randint(3, 60)
+        template = rng.choice(REPLY_BUY if side == 'offer' else REPLY_SELL)
+        events.append((t_reply, replier, self._fill(template, name=self._called(quoter), v=reply_volume)))
+
+        if kind == 'no_confirm':
+            return events, None
+        t_confirm = t_reply + rng.randint(5, 120)
+        if kind == 'rejected':
+            events.append((t_confirm, quoter, self._fill(rng.choice(REJECT), name=self._called(replier))))
+            return events, None
+
+        template = self._pick(CONFIRM, CONFIRM_TYPO)
+        events.append((t_confirm, quoter, self._fill(template, name=self._called(replier), v=reply_volume)))
+        if rng.random() < 0.6:
+            events.append((t_confirm + rng.randint(2, 40), replier, self._pick(ACK, ACK_TYPO)))
+
+        buy_bank, sell_bank = (replier[2], quoter[2]) if side == 'offer' else (quoter[2], replier[2])
+        deal = {
+            'Buy_side': buy_bank,
+            'Amount': float(min(volume, reply_volume)),
+            'Price': price,
+            'Sell_side': sell_bank,
+            'Actual_price': base + price,
+            'Actual_price_2digit': price,
+        }
+        return events, deal
+
+    def _day(self, target):
+        """Messages + deals của 1 ngày (đúng target messages)"""
+        rng = self.rng
+        base = rng.choice([25300, 25400])
+        events = []
+        deals = []
+        while len(events) < target:
+            kind = rng.choices(EPISODES, EPISODE_WEIGHTS)[0]
+            t0 = rng.randint(DAY_START, DAY_END - 300)
+            episode, deal = self._episode(kind, t0, base)
+            if len(events) + len(episode) > target:
+                episode, deal = [(t0, rng.choice(self.roster), self._noise())], None
+            order = len(events)
+            events.extend((t, order + i, trader, message) for i, (t, trader, message) in enumerate(episode))
+            if deal is not None:
+                deals.append((t0, order, deal))
+        events.sort(key=lambda event: (event[0], event[1]))
+        deals.sort(key=lambda item: (item[0], item[1]))
+        return events, [deal for _, _, deal in deals]
+
+    def generate(self, n_messages):
+        """(chat DataFrame format input_expanded_banks.csv, ground truth DataFrame)"""
+        n_days = max(1, -(-n_messages // self.per_day))
+        rows = []
+        all_deals = []
+        remaining = n_messages
+        for day in trading_days(n_days):
+            target = min(self.per_day, remaining)
+            events, deals = self._day(target)
+            label = f"{day:%B} {day.day:02d}, {day.year}"
+            for seconds, _, trader, message in events:
+                rows.append((f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}",
+                             trader[0], trader[1], message, label, trader[2]))
+            all_deals.extend(deals)
+            remaining -= target
+
+        chat_df = pd.DataFrame(rows, columns=['time', 'trader_name', 'trader', 'mess', 'Date', 'bank_name'])
+        gt_df = pd.DataFrame(all_deals, columns=['Buy_side', 'Amount', 'Price', 'Sell_side',
+                                                 'Actual_price', 'Actual_price_2digit'])
+        gt_df.insert(0, 'STT', range(1, len(gt_df) + 1))
+        return chat_df, gt_df
+
+
+def generate_corpus(n_messages, seed=0, **options):
+    return CorpusGenerator(seed=seed, **options).generate(n_messages)
+
+
+def ground_truth_path(corpus_path):
+    stem, _ = os.path.splitext(corpus_path)
+    return f"{stem}_ground_truth.csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic FX chat corpus + ground truth')
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--per_day', type=int, default=1500, help='Messages mỗi ngày')
+    parser.add_argument('--typo_rate', type=float, default=0.15)
+    parser.add_argument('--output', default=None, help='Mặc định: synthetic_<messages>.csv')
+    args = parser.parse_args()
+
+    output = args.output or f"synthetic_{args.messages}.csv"
+    chat_df, gt_df = generate_corpus(args.messages, seed=args.seed, per_day=args.per_day,
+                                     typo_rate=args.typo_rate)
+    chat_df.to_csv(output, index=False, encoding='utf-8-sig')
+    gt_df.to_csv(ground_truth_path(output), index=False, encoding='utf-8-sig')
+    print(f"Messages: {len(chat_df)} ({chat_df['Date'].nunique()} days)")
+    print(f"Ground truth deals: {len(gt_df)}")
+    print(f"Files saved: {output}, {ground_truth_path(output)}")
+
+
+if __name__ == "__main__":
+    main()
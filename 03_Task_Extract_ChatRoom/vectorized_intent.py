@@ -0,0 +1,266 @@
+"""
+Vectorized intent detection (Step 1) cho solution v3/v4/v5
+
+Thay vòng lặp df.iterrows() bằng các phép toán trên cả cột:
+- keyword flags: keyword_scanner (1 regex cho mọi keyword class), scan mỗi
+  message khác nhau 1 lần
+- number counts: Series.str.count trên regex số
+- CONFIRM / REPLY / START masks → priority rules bằng np.select
+- single number + quick reply (Case 1): QuickReplyIndex theo từng ngày,
+  lookahead 30s bằng searchsorted thay vì mask cả DataFrame cho mỗi row
+
+Output giống hệt enhanced_intent_detection của từng version (kể cả các
+quirks của vòng lặp gốc, xem _carry_forward).
+"""
+
+import re
+import numpy as np
+import pandas as pd
+
+from chat_log import time_columns, MISSING
+from instrumentation import count_rule
+from keyword_scanner import SCANNER
+from feature_cache import keywords as message_keywords, numeric
+
+NUMBER_PATTERN = r'\b\d+(?:\.\d+)?\b'
+NUMBER_RE = re.compile(NUMBER_PATTERN)
+
+TWO_NUMBER_PATTERN = r'\d+\s*[/-]?\s*\d+'
+
+QUICK_REPLY_SECONDS = 30
+
+# Khác biệt giữa các version (giữ đúng logic gốc của từng file)
+# confirm_class: keyword class của keyword_scanner (v5 có thêm 'thank' + typo patterns)
+# quick_reply: cách check_single_number_case của version đó duyệt các reply
+#   max_candidates - .head(10) trên các message sau đó của trader khác (None = không giới hạn)
+#   strict - chỉ tính reply có 0 < time_diff và dừng ở reply đầu tiên > 30s
+INTENT_RULES = {
+    'v3': {
+        'confirm_class': 'confirm',
+        'volume_pattern': r'\d+(?:\.\d+)?\s*(?:u|mio|k)\b',
+        'numbers_found': False,
+        'quick_reply': {'max_candidates': None, 'strict': False},
+    },
+    'v4': {
+        'confirm_class': 'confirm',
+        'volume_pattern': r'\d+(?:\.\d+)?\s*(?:u|mio|k|m)\b',
+        'numbers_found': True,
+        'quick_reply': {'max_candidates': 10, 'strict': True},
+    },
+    'v5': {
+        'confirm_class': 'confirm_fuzzy',
+        'volume_pattern': r'\d+(?:\.\d+)?\s*(?:u|mio|k|m)\b',
+        'numbers_found': True,
+        'quick_reply': {'max_candidates': 10, 'strict': True},
+    },
+}
+
+TWO_NUMBER_RE = re.compile(TWO_NUMBER_PATTERN)
+
+
+def extract_all_numbers(message):
+    """Extract tất cả numbers (exclude negative) - giống extract_all_numbers trong v4/v5"""
+    return numeric(message).numbers()
+
+
+class QuickReplyIndex:
+    """Index theo ngày cho Case 1 (1 số duy nhất + reply buy/sell/khớp trong 30s)
+
+    Mỗi ngày giữ các positions theo thứ tự index cùng seconds-of-day, trader code
+    và cờ reply keyword đã tính sẵn. Nếu thời gian trong ngày đã sort (chat log
+    luôn như vậy) thì cửa sổ 30s là 1 lát cắt searchsorted → O(log n + k) mỗi
+    lần check; nếu không thì duyệt tuần tự giống hệt check_single_number_case.
+    window: độ dài cửa sổ quick reply (giây)
+    """
+
+    def __init__(self, df, is_reply, max_candidates=10, strict=True, window=QUICK_REPLY_SECONDS):
+        self.max_candidates = max_candidates
+        self.strict = strict
+        self.window = window
+
+        seconds, date_ordinal = time_columns(df)
+        trader_codes, _ = pd.factorize(df['trader_name'])
+        date_codes, _ = pd.factorize(date_ordinal)
+        date_codes[date_ordinal == MISSING] = -1
+
+        self.seconds = seconds
+        self.trader = trader_codes
+        self.is_reply = np.asarray(is_reply, dtype=bool)
+
+        # position → (date code, vị trí trong ngày)
+        self.date_of = date_codes
+        self.rank = np.zeros(len(df), dtype=np.int64)
+        self.dates = []
+        for code in range(date_codes.max() + 1 if len(df) else 0):
+            positions = np.flatnonzero(date_codes == code)
+            self.rank[positions] = np.arange(len(positions))
+            date_seconds = seconds[positions]
+            is_sorted = bool(np.all(np.diff(date_seconds) >= 0)) and not (date_seconds == MISSING).any()
+            self.dates.append((positions, date_seconds, is_sorted))
+
+    def has_quick_reply(self, pos):
+        """True nếu message ở position pos có reply của trader khác trong 30s"""
+        code = self.date_of[pos]
+        current = self.seconds[pos]
+        if code < 0 or current == MISSING:
+            return False
+
+        positions, date_seconds, is_sorted = self.dates[code]
+        start = self.rank[pos] + 1
+        end = len(positions)
+        if is_sorted:
+            end = int(np.searchsorted(date_seconds, current + self.window, side='right'))
+
+        trader = self.trader[pos]
+        seen = 0
+        for j in positions[start:end]:
+            # NaN trader_name != NaN trader_name trong pandas mask gốc
+            if self.trader[j] == trader and trader != -1:
+                continue
+            seen += 1
+            if self.max_candidates is not None and seen > self.max_candidates:
+                return False
+
+            reply_time = self.seconds[j]
+            if reply_time == MISSING:
+                continue
+            diff = reply_time - current
+            if self.strict:
+                if 0 < diff <= self.window:
+                    if self.is_reply[j]:
+                        return True
+                elif diff > self.window:
+                    return False
+            elif diff <= self.window and self.is_reply[j]:
+                return True
+        return False
+
+
+def _contains(messages, regex):
+    return messages.str.contains(regex, regex=True).to_numpy(dtype=bool)
+
+
+def _carry_forward(values, negative):
+    """Vòng lặp gốc không gán has_numbers/has_bid_ask/has_time_exclusion
+    cho message có số âm, nên các row đó giữ giá trị của row trước.
+    Giữ nguyên hành vi này để output không đổi (row đầu tiên → False)."""
+    series = pd.Series(np.where(negative, np.nan, values.astype(float)))
+    return series.ffill().fillna(0).to_numpy() > 0
+
+
+def _numbers_found(messages, has_dash):
+    """str(numbers) như vòng lặp gốc; row có '-' dùng lại hàm scalar để giữ
+    đúng rule loại số âm (context 5 ký tự trước số)"""
+    found = messages.str.findall(NUMBER_RE)
+    out = []
+    for tokens, message, dash in zip(found, messages, has_dash):
+        if dash:
+            numbers = extract_all_numbers(message)
+        else:
+            numbers = [float(tok) for tok in tokens]
+        out.append(str(numbers) if numbers else '')
+    return out
+
+
+def vectorized_intent_detection(df, version='v5', quick_reply_seconds=QUICK_REPLY_SECONDS):
+    """Step 1 vectorized, output giống enhanced_intent_detection (loop) của version
+
+    quick_reply_seconds: cửa sổ reply của Case 1 (1 số duy nhất), cho parameter sweep
+    """
+    print("STEP 1: ENHANCED INTENT DETECTION")
+    print("-" * 35)
+
+    rules = INTENT_RULES[version]
+    messages = df['mess'].astype(str).str.lower()
+    seconds, date_ordinal = time_columns(df)
+
+    has_dash = messages.str.contains('-', regex=False).to_numpy(dtype=bool)
+    has_digit = messages.str.contains(r'\d', regex=True).to_numpy(dtype=bool)
+    negative = has_dash & has_digit
+
+    number_count = messages.str.count(NUMBER_PATTERN).to_numpy()
+    has_numbers = number_count > 0
+    keywords = SCANNER.flags(messages, ['bid_ask', 'time', 'reply', rules['confirm_class']],
+                             classes=message_keywords)
+    has_bid_ask = keywords['bid_ask']
+    has_time_exclusion = keywords['time']
+
+    is_confirm = keywords[rules['confirm_class']]
+    is_reply = keywords['reply']
+    two_number = _contains(messages, TWO_NUMBER_RE)
+    has_volume = _contains(messages, re.compile(rules['volume_pattern']))
+
+    # START candidates: không âm, không CONFIRM/REPLY, có số, không có time keyword
+    start_base = ~negative & ~is_confirm & ~is_reply & has_numbers & ~has_time_exclusion
+
+    # Case 1: 1 số duy nhất + quick reply
+    single_start = np.zeros(len(df), dtype=bool)
+    single_candidates = start_base & (number_count == 1)
+    if single_candidates.any():
+        quick_reply = QuickReplyIndex(df, is_reply, window=quick_reply_seconds, **rules['quick_reply'])
+        for pos in np.flatnonzero(single_candidates):
+            single_start[pos] = quick_reply.has_quick_reply(pos)
+
+    conditions = [
+        negative,
+        ~negative & is_confirm,
+        ~negative & ~is_confirm & is_reply,
+        start_base & single_start,                                          # Case 1
+        start_base & has_bid_ask,                                           # Case 2
+        start_base & (number_count == 2) & two_number,                      # Case 3
+        start_base & (number_count != 2) & has_volume,                      # Case 4
+    ]
+    intent_type = np.select(conditions, ['NOISE', 'CONFIRM', 'REPLY', 'START', 'START', 'START', 'START'],
+                            default='NOISE')
+
+    # Rule hits: regex / keyword khớp + rule quyết định intent (rule đầu tiên đúng)
+    for rule, mask in [('has_numbers', has_numbers), ('bid_ask', has_bid_ask),
+                       ('time_exclusion', has_time_exclusion), ('confirm_patterns', is_confirm),
+                       ('reply', is_reply), ('two_number', two_number), ('volume', has_volume),
+                       ('negative', negative)]:
+        count_rule(f'intent.match.{rule}', mask.sum())
+    decided_by = np.select(conditions, range(len(conditions)), default=-1)
+    for i, rule in enumerate(['negative', 'confirm', 'reply', 'start_single_quick_reply',
+                              'start_bid_ask', 'start_two_numbers', 'start_volume']):
+        count_rule(f'intent.decided.{rule}', (decided_by == i).sum())
+    confidence = np.select(conditions, [0.0, 0.8, 0.7, 0.9, 0.8, 0.7, 0.6], default=0.0)
+
+    # Flags trong output (row âm giữ giá trị row trước - xem _carry_forward)
+    out_has_numbers = _carry_forward(has_numbers, negative)
+    out_has_bid_ask = _carry_forward(has_bid_ask, negative)
+    out_has_time_exclusion = _carry_forward(has_time_exclusion, negative)
+
+    problems = pd.Series(np.where(negative, 'negative_number_excluded',
+                                  np.where(start_base & single_start, 'single_number_with_quick_reply', '')))
+    problems = problems + ';' + np.where(~out_has_numbers & out_has_bid_ask, 'no_numbers', '')
+    problems = problems + ';' + np.where(out_has_time_exclusion & out_has_bid_ask, 'time_exclusion', '')
+    problems = problems.str.replace(r';{2,}', ';', regex=True).str.strip(';')
+
+    step1_df = pd.DataFrame({
+        'index': df.index,
+        'time': df['time'].to_numpy(),
+        'date': df['Date'].to_numpy(),
+        'bank_name': df['bank_name'].to_numpy(),
+        'trader_name': df['trader_name'].to_numpy(),
+        'message': df['mess'].to_numpy(),
+        'intent_type': intent_type,
+        'confidence_score': confidence,
+        'problems': problems.to_numpy(),
+        'has_numbers': out_has_numbers,
+        'has_bid_ask': out_has_bid_ask,
+        'has_time_exclusion': out_has_time_exclusion,
+        'seconds': seconds,
+        'date_ordinal': date_ordinal,
+    })
+    if rules['numbers_found']:
+        step1_df['numbers_found'] = _numbers_found(messages, has_dash)
+
+    print(f"Messages processed: {len(step1_df)}")
+    print(f"START intents: {(step1_df['intent_type'] == 'START').sum()}")
+    print(f"REPLY intents: {(step1_df['intent_type'] == 'REPLY').sum()}")
+    print(f"CONFIRM intents: {(step1_df['intent_type'] == 'CONFIRM').sum()}")
+    print(f"NOISE: {(step1_df['intent_type'] == 'NOISE').sum()}")
+    print(f"Avg confidence: {step1_df['confidence_score'].mean():.2f}")
+    print()
+
+    return step1_df
@@ -0,0 +1,67 @@
+"""
+Window index cho reply/confirm matching (Step 3 / Step 4)
+
+Tính sẵn 1 lần trên step DataFrame (RangeIndex, như output của Step 1):
+- next_start[pos]: position của START tiếp theo cùng trader, cùng ngày
+  (= window end; len(df) nếu không có)
+- positions theo (date, intent_type): mảng position đã sort, nên candidates
+  trong window (start, end) là 1 lát cắt searchsorted
+- seconds-of-day / date_ordinal (integer, từ chat_log) cho mọi row
+
+Thay cho các mask trên cả DataFrame mỗi START (next_start_same_trader,
+potential_replies/potential_confirms, start_context.tail(5)) → O(n log n) cả stage.
+"""
+
+import numpy as np
+import pandas as pd
+
+from chat_log import time_columns, MISSING
+
+
+class WindowIndex:
+    def __init__(self, df, date_col='date'):
+        n = len(df)
+        self.size = n
+        self.seconds, self.date = time_columns(df, date_col=date_col)
+        self.trader, _ = pd.factorize(df['trader_name'])
+
+        intents = df['intent_type'].to_numpy()
+        self.by_date_intent = {}
+        frame = pd.DataFrame({'date': self.date, 'intent': intents, 'pos': np.arange(n)})
+        for (date, intent), group in frame.groupby(['date', 'intent'], sort=False):
+            self.by_date_intent[(date, intent)] = group['pos'].to_numpy()
+
+        # Tất cả START (mọi ngày) cho start_context
+        self.start_positions = np.flatnonzero(intents == 'START')
+
+        # START tiếp theo cùng trader + cùng ngày
+        self.next_start = np.full(n, n, dtype=np.int64)
+        starts = frame.iloc[self.start_positions].assign(trader=self.trader[self.start_positions])
+        # NaN trader_name (code -1) / date (MISSING) không bằng giá trị nào (kể cả NaN) trong mask gốc
+        starts = starts[(starts['trader'] >= 0) & (starts['date'] != MISSING)]
+        following = starts.groupby(['date', 'trader'], sort=False)['pos'].shift(-1)
+        has_next = following.notna().to_numpy()
+        self.next_start[starts['pos'].to_numpy()[has_next]] = following.to_numpy()[has_next].astype(np.int64)
+
+    def window_end(self, pos):
+        """Position của START tiếp theo cùng trader (exclusive window end)"""
+        return int(self.next_start[pos])
+
+    def candidates(self, pos, intent, end):
+        """Positions cùng ngày với pos, intent_type = intent, pos < p < end"""
+        date = self.date[pos]
+        positions = self.by_date_intent.get((date, intent)) if date != MISSING else None
+        if positions is None:
+            return np.empty(0, dtype=np.int64)
+        lo = np.searchsorted(positions, pos, side='right')
+        hi = np.searchsorted(positions, end, side='left')
+        return positions[lo:hi]
+
+    def starts_before(self, pos, count=5):
+        """count START positions gần nhất trước pos (tương đương .tail(count))"""
+        hi = np.searchsorted(self.start_positions, pos, side='left')
+        return self.start_positions[max(0, hi - count):hi]
+
+    def gap_minutes(self, start_pos, pos):
+        """(time[pos] - time[start_pos]) tính bằng phút"""
+        return int(self.seconds[pos] - self.seconds[start_pos]) / 60
@@ -4,20 +4,45 @@ Cleanup Notification Queue
 ---------------------------
 Removes duplicate messages from notification_queue.jsonl
 
+Only needed for the legacy single-file queue: server.py now writes to the
+segmented log in data/notification_log/ (see notification_log.py), whose
+retention deletes segments automatically once the email service has read them.
+
 This script:
-1. Reads all notifications from notification_queue.jsonl
-2. Deduplicates messages across all notifications
-3. Creates a clean version with only unique messages
-4. Backs up the original file
+1. Takes the checkpoint lock (shared with EmailService and the legacy migration)
+2. Streams notifications from notification_queue.jsonl line by line
+3. Drops messages already seen (set of 64-bit fingerprints)
+4. Writes the surviving notifications, one per line, to a temp file
+5. Rewrites email_checkpoint.json so it points at the same position in the new file
+6. Atomically swaps the new file in (the original is kept as a backup)
+7. Releases the lock after lines appended during the swap are carried over
+
+The checkpoint is rewritten before the swap, so nobody ever sees the new file
+with the old line ids. Only one notification is held at a time, but the
+fingerprint set still grows with the number of unique messages (one 64-bit
+int, roughly 70 bytes in a Python set, per message - much less than the
+messages themselves). It is safe to run while server.py keeps appending:
+lines written during compaction are carried over into the new file.
 
 Usage:
     python cleanup_queue.py
+    python cleanup_queue.py --no-backup
 """
 
 import os
 import json
-from datetime import datetime
+import time
 import shutil
+import hashlib
+import argparse
+from collections import deque
+from datetime import datetime
+
+from notification_log import checkpoint_lock
+
+
+# Same size as server.py's seen_messages_cache
+SEEN_CACHE_SIZE = 1000
 
 
 def get_message_hash(message):
@@ -29,10 +54,194 @@ def get_message_hash(message):
     return f"{date}|{time}|{sender}|{content}"
 
 
-def cleanup_notification_queue():
+def fingerprint(msg_hash):
+    """64-bit fingerprint of a message hash (keeps the dedup set small)"""
+    return int.from_bytes(hashlib.blake2b(msg_hash.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class QueueCompactor:
+    def __init__(self):
+        self.seen = set()
+        self.recent_hashes = deque(maxlen=SEEN_CACHE_SIZE)
+        self.stats = {
+            'lines_in': 0,
+            'lines_out': 0,
+            'malformed': 0,
+            'messages_in': 0,
+            'messages_out': 0,
+            'duplicates': 0
+        }
+
+    def compact_line(self, line):
+        """Deduplicate one queue line; return the output line or None to drop it"""
+        try:
+            notification = json.loads(line)
+        except json.JSONDecodeError as e:
+            self.stats['malformed'] += 1
+            print(f"   ⚠️  Skipping malformed line {self.stats['lines_in']}: {e}")
+            return None
+
+        data = notification.get('data')
+        if not (data and isinstance(data, dict)):
+            return None
+
+        unique_messages = []
+        for msg in data.get('messages', []):
+            self.stats['messages_in'] += 1
+            msg_hash = get_message_hash(msg)
+            fp = fingerprint(msg_hash)
+            if fp in self.seen:
+                self.stats['duplicates'] += 1
+                continue
+            self.seen.add(fp)
+            self.recent_hashes.append(msg_hash)
+            unique_messages.append(msg)
+
+        if not unique_messages:
+            return None
+
+        self.stats['messages_out'] += len(unique_messages)
+        data['messages'] = unique_messages
+        if 'message_count' in notification:
+            notification['message_count'] = len(unique_messages)
+        return json.dumps(notification, ensure_ascii=False) + '\n'
+
+    def copy_lines(self, src, dst, checkpoint_line, id_map):
+        """Compact every complete line from src into dst.
+
+        `id_map` records the output line count once input line `checkpoint_line`
+        has been consumed, which is the new value for last_notification_id.
+        Returns the src offset just past the last complete line.
+        """
+        while True:
+            pos = src.tell()
+            raw = src.readline()
+            if not raw:
+                return pos
+            if not raw.endswith(b'\n'):
+                # Server is mid-write; pick this line up on the next pass
+                src.seek(pos)
+                return pos
+
+            self.stats['lines_in'] += 1
+            line = raw.decode('utf-8').strip()
+            if line:
+                out = self.compact_line(line)
+                if out is not None:
+                    dst.write(out)
+                    self.stats['lines_out'] += 1
+
+            if self.stats['lines_in'] == checkpoint_line:
+                id_map['last_notification_id'] = self.stats['lines_out']
+
+
+def load_checkpoint(checkpoint_file):
+    """Load email_checkpoint.json (None if missing/unreadable)"""
+    try:
+        if os.path.exists(checkpoint_file):
+            with open(checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    except Exception as e:
+        print(f"⚠️  Could not read checkpoint: {e}")
+    return None
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temp file and rename it over path"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _compact_locked(queue_file, checkpoint_file, backup):
+    """Compaction body, run while holding the checkpoint lock
+
+    Returns (compactor, backup_path), or None if the queue was left unchanged.
+    """
+    checkpoint = load_checkpoint(checkpoint_file)
+    checkpoint_line = checkpoint.get('last_notification_id', 0) if checkpoint else 0
+    if checkpoint:
+        print(f"📌 Email checkpoint: line {checkpoint_line}")
+        print()
+
+    compactor = QueueCompactor()
+    id_map = {'last_notification_id': 0}
+    tmp_path = f"{queue_file}.compact.tmp"
+    backup_path = None
+    checkpoint_rewritten = False
+
+    # Stream + deduplicate
+    print("1️⃣  Streaming and deduplicating notifications...")
+    try:
+        with open(queue_file, 'rb') as src, open(tmp_path, 'w', encoding='utf-8') as dst:
+            compactor.copy_lines(src, dst, checkpoint_line, id_map)
+
+            # Catch up with lines the server appended meanwhile
+            print("2️⃣  Catching up with new appends...")
+            offset = compactor.copy_lines(src, dst, checkpoint_line, id_map)
+            for _ in range(20):
+                if os.path.getsize(queue_file) <= offset:
+                    break
+                time.sleep(0.05)
+                offset = compactor.copy_lines(src, dst, checkpoint_line, id_map)
+
+            dst.flush()
+            os.fsync(dst.fileno())
+
+            if checkpoint_line > compactor.stats['lines_in']:
+                # Checkpoint pointed past the end of the file: everything was emailed
+                id_map['last_notification_id'] = compactor.stats['lines_out']
+
+            if backup:
+                backup_path = f"{queue_file}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                try:
+                    os.link(queue_file, backup_path)
+                except OSError:
+                    shutil.copy2(queue_file, backup_path)
+                print(f"✅ Backup created: {backup_path}")
+
+            # Checkpoint first: the lines it covers were all read above, and the
+            # lock keeps anyone from using it until the new file is in place
+            if checkpoint is not None:
+                print("3️⃣  Rewriting email checkpoint...")
+                remapped = dict(checkpoint, last_notification_id=id_map['last_notification_id'],
+                                compacted_at=datetime.now().isoformat())
+                write_json_atomic(checkpoint_file, remapped)
+                checkpoint_rewritten = True
+                print(f"✅ Checkpoint: line {checkpoint_line} → {id_map['last_notification_id']}")
+
+            print("4️⃣  Swapping in compacted queue...")
+            os.replace(tmp_path, queue_file)
+            checkpoint_rewritten = False  # swap done, checkpoint and queue agree
+
+            # Anything appended to the old file between the last read and the
+            # swap is still readable through our open handle
+            time.sleep(0.2)
+            tail_start = compactor.stats['lines_out']
+            with open(queue_file, 'a', encoding='utf-8') as new_dst:
+                compactor.copy_lines(src, new_dst, checkpoint_line, id_map)
+            if compactor.stats['lines_out'] > tail_start:
+                print(f"   ↪️  Carried over {compactor.stats['lines_out'] - tail_start} late notification(s)")
+    except Exception as e:
+        print(f"❌ Error compacting queue: {e}")
+        if checkpoint_rewritten:
+            # Swap never happened: the old queue still matches the old checkpoint
+            write_json_atomic(checkpoint_file, checkpoint)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    return compactor, backup_path
+
+
+def cleanup_notification_queue(data_dir=None, backup=True):
     """Clean up the notification queue file by removing duplicates"""
-    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+    data_dir = data_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
     queue_file = os.path.join(data_dir, 'notification_queue.jsonl')
+    checkpoint_file = os.path.join(data_dir, 'email_checkpoint.json')
 
     print("=" * 60)
     print("🧹 Notification Queue Cleanup")
@@ -51,108 +260,16 @@ def cleanup_notification_queue():
     print(f"📊 Original size: {file_size:,} bytes ({file_size / 1024:.2f} KB)")
     print()
 
-    # Read all notifications
-    print("1️⃣  Reading notifications...")
-    notifications = []
-    try:
-        with open(queue_file, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                try:
-                    notification = json.loads(line.strip())
-                    notifications.append(notification)
-                except json.JSONDecodeError as e:
-                    print(f"   ⚠️  Skipping malformed line {line_num}: {e}")
-    except Exception as e:
-        print(f"❌ Error reading file: {e}")
+    with checkpoint_lock(checkpoint_file):
+        result = _compact_locked(queue_file, checkpoint_file, backup)
+    if result is None:
         return
+    compactor, backup_path = result
 
-    print(f"✅ Read {len(notifications)} notifications")
-    print()
-
-    # Count original messages
-    original_message_count = 0
-    for notif in notifications:
-        if notif.get('data') and isinstance(notif['data'], dict):
-            messages = notif['data'].get('messages', [])
-            original_message_count += len(messages)
-
-    print(f"📊 Original message count: {original_message_count:,}")
-    print()
-
-    # Deduplicate messages
-    print("2️⃣  Deduplicating messages...")
-    seen_messages = set()
-    unique_messages = []
-    duplicate_count = 0
-
-    for notif in notifications:
-        if notif.get('data') and isinstance(notif['data'], dict):
-            messages = notif['data'].get('messages', [])
-
-            for msg in messages:
-                msg_hash = get_message_hash(msg)
-                if msg_hash not in seen_messages:
-                    seen_messages.add(msg_hash)
-                    unique_messages.append(msg)
-                else:
-                    duplicate_count += 1
-
-    new_message_count = len(unique_messages)
-    print(f"✅ Found {new_message_count:,} unique messages")
-    print(f"🗑️  Removed {duplicate_count:,} duplicates")
-    print()
-
-    # Calculate reduction
-    reduction_percent = (1 - new_message_count / original_message_count) * 100 if original_message_count > 0 else 0
-    print(f"📉 Reduction: {reduction_percent:.1f}%")
-    print()
-
-    # Create new cleaned notification
-    print("3️⃣  Creating cleaned notification...")
-    cleaned_notification = {
-        'timestamp': datetime.now().isoformat(),
-        'type': 'cleanup',
-        'data': {
-            'messages': unique_messages
-        },
-        'message_count': new_message_count,
-        'received_at': datetime.now().isoformat(),
-        'cleanup_info': {
-            'original_notifications': len(notifications),
-            'original_messages': original_message_count,
-            'unique_messages': new_message_count,
-            'duplicates_removed': duplicate_count,
-            'cleaned_at': datetime.now().isoformat()
-        }
-    }
-
-    # Backup original file
-    print("4️⃣  Backing up original file...")
-    backup_path = f"{queue_file}.backup.{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-    try:
-        shutil.copy2(queue_file, backup_path)
-        print(f"✅ Backup created: {backup_path}")
-    except Exception as e:
-        print(f"❌ Error creating backup: {e}")
-        return
-
-    print()
-
-    # Write cleaned version
-    print("5️⃣  Writing cleaned version...")
-    try:
-        with open(queue_file, 'w', encoding='utf-8') as f:
-            f.write(json.dumps(cleaned_notification, ensure_ascii=False) + '\n')
-        print(f"✅ Cleaned file written")
-    except Exception as e:
-        print(f"❌ Error writing cleaned file: {e}")
-        print(f"💡 Restoring from backup...")
-        shutil.copy2(backup_path, queue_file)
-        return
-
-    # Get new file size
+    stats = compactor.stats
     new_file_size = os.path.getsize(queue_file)
     size_reduction = (1 - new_file_size / file_size) * 100 if file_size > 0 else 0
+    reduction_percent = (stats['duplicates'] / stats['messages_in'] * 100) if stats['messages_in'] > 0 else 0
 
     print()
     print("=" * 60)
@@ -164,35 +281,36 @@ def cleanup_notification_queue():
     print(f"   New size: {new_file_size:,} bytes ({new_file_size / 1024:.2f} KB)")
     print(f"   Size reduction: {size_reduction:.1f}%")
     print()
-    print(f"   Original notifications: {len(notifications)}")
-    print(f"   New notifications: 1 (consolidated)")
-    print()
-    print(f"   Original messages: {original_message_count:,}")
-    print(f"   Unique messages: {new_message_count:,}")
-    print(f"   Duplicates removed: {duplicate_count:,}")
+    print(f"   Original notifications: {stats['lines_in']:,}")
+    print(f"   New notifications: {stats['lines_out']:,}")
+    if stats['malformed']:
+        print(f"   Malformed lines skipped: {stats['malformed']:,}")
     print()
-    print(f"💾 Backup saved to: {backup_path}")
+    print(f"   Original messages: {stats['messages_in']:,}")
+    print(f"   Unique messages: {stats['messages_out']:,}")
+    print(f"   Duplicates removed: {stats['duplicates']:,} ({reduction_percent:.1f}%)")
     print()
+    if backup_path:
+        print(f"💾 Backup saved to: {backup_path}")
+        print()
 
-    # Also create a seen_messages_cache.json with all the unique messages
-    print("6️⃣  Creating seen messages cache...")
+    # Refresh seen_messages_cache.json with the most recent unique messages
+    print("5️⃣  Updating seen messages cache...")
     cache_file = os.path.join(data_dir, 'seen_messages_cache.json')
     try:
-        message_hashes = [get_message_hash(msg) for msg in unique_messages]
+        message_hashes = list(compactor.recent_hashes)
         cache_data = {
             'message_hashes': message_hashes,
             'last_updated': datetime.now().isoformat(),
             'total_cached': len(message_hashes),
             'created_by': 'cleanup_queue.py'
         }
+        write_json_atomic(cache_file, cache_data)
 
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, indent=2, ensure_ascii=False)
-
-        print(f"✅ Cache file created: {cache_file}")
+        print(f"✅ Cache file updated: {cache_file}")
         print(f"   Cached {len(message_hashes)} message hashes")
     except Exception as e:
-        print(f"⚠️  Could not create cache file: {e}")
+        print(f"⚠️  Could not update cache file: {e}")
 
     print()
     print("🎉 All done! Your notification queue is now clean and deduplicated.")
@@ -200,4 +318,9 @@ def cleanup_notification_queue():
 
 
 if __name__ == '__main__':
-    cleanup_notification_queue()
+    parser = argparse.ArgumentParser(description='Deduplicate notification_queue.jsonl in place')
+    parser.add_argument('--dir', help='Data directory (default: ./data next to this script)')
+    parser.add_argument('--no-backup', action='store_true', help='Do not keep the original queue file')
+    args = parser.parse_args()
+
+    cleanup_notification_queue(data_dir=args.dir, backup=not args.no_backup)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Combined Server + Email Service
+-------------------------------
+Runs the ingest server and EmailService in one process, connected by an
+in-process NotificationBus instead of notification_queue.jsonl.
+
+- The Flask server runs in a background thread and publishes new messages to the bus
+- The email service loop runs in the main thread and wakes up on every publish
+- At most one digest per `digest_window_seconds` (email_config.json, default 30s),
+  so ingest-to-email latency is bounded by that window rather than a polling interval
+- On Ctrl+C, unsent notifications are spilled to data/notification_bus_spill.jsonl
+- On start, a backlog left by the two-process setup (legacy notification_queue.jsonl,
+  then anything after the email service's offset in data/notification_log/) is
+  moved to the front of the bus spill file, so it is emailed first
+
+Usage:
+    python combined.py
+    python combined.py --crawl_account "Your Name"
+"""
+
+import os
+import argparse
+import threading
+from datetime import datetime
+
+import server
+from email_service import EmailService
+from notification_bus import NotificationBus
+from notification_log import migrate_legacy_queue
+
+
+def move_log_backlog(log, bus):
+    """Hand notifications not yet emailed from the log to the bus (spill file first, then commit)"""
+    consumer = log.consumer('email_service')
+    records = consumer.read()
+    if not records:
+        return 0
+
+    bus.requeue([notification for _, notification in records])
+    consumer.commit(records[-1][0])
+    print(f"📦 Moved {len(records)} pending notification(s) from the notification log to the bus")
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Refinitiv Messenger server + email service (single process)')
+    parser.add_argument('--crawl_account', type=str, default='Bạn',
+                       help='Account name to use for outgoing messages (default: Bạn)')
+    parser.add_argument('--bus_size', type=int, default=1000,
+                       help='Max notifications held in memory before spilling to disk (default: 1000)')
+    args = parser.parse_args()
+
+    server.server_config['crawl_account'] = args.crawl_account
+
+    bus = NotificationBus(
+        spill_file=os.path.join(server.data_dir, 'notification_bus_spill.jsonl'),
+        maxsize=args.bus_size
+    )
+    server.attach_notification_bus(bus)
+
+    # Same startup migration as server.py
+    migrate_legacy_queue(server.notification_log, server.notification_queue_file,
+                         os.path.join(server.data_dir, 'email_checkpoint.json'))
+
+    service = EmailService(bus=bus)
+    ssl_context, protocol = server.get_ssl_context()
+
+    if not service.email_config.get('enabled'):
+        print("⚠️  Email is disabled in config - running the server only (notification log)")
+        server.attach_notification_bus(None)
+        server.app.run(host='0.0.0.0', port=server.PORT, debug=False, ssl_context=ssl_context)
+        return
+
+    # Backlog written by server.py + email_service.py goes out before new messages
+    move_log_backlog(server.notification_log, bus)
+
+    print(f"🚀 Combined server started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📡 Listening on {protocol}://localhost:{server.PORT}")
+    print(f"📊 Data: {server.data_dir}")
+    print(f"👤 Crawl Account: {server.server_config['crawl_account']}")
+    print(f"\n⏳ Waiting for messages...")
+
+    # Flask in a daemon thread; the asyncio email loop keeps the main thread for signal handling
+    web_thread = threading.Thread(
+        target=server.app.run,
+        kwargs={
+            'host': '0.0.0.0',
+            'port': server.PORT,
+            'debug': False,
+            'use_reloader': False,
+            'threaded': True,
+            'ssl_context': ssl_context
+        },
+        daemon=True
+    )
+    web_thread.start()
+
+    try:
+        service.run('bus')
+    except KeyboardInterrupt:
+        print("\n👋 Service stopped by user")
+
+
+if __name__ == '__main__':
+    main()
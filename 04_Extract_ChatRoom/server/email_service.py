@@ -5,8 +5,8 @@ Email Notification Service
 Standalone service that monitors for new messenger data and sends email notifications.
 
 This service:
-1. Monitors notification_queue.jsonl for new data events
-2. Tracks what has been emailed via email_checkpoint.json
+1. Monitors the segmented notification log (data/notification_log/) for new data events
+2. Tracks what has been emailed via its consumer offset in the log
 3. Sends email summaries at configured intervals or on events
 4. Runs independently from the web server
 
@@ -18,13 +18,15 @@ Usage:
 
 import os
 import json
-import time
+import signal
+import asyncio
 import argparse
 from datetime import datetime, timedelta
-import threading
-import schedule
 from pathlib import Path
 
+from routing import RoutingIndex, DEFAULT_GROUP
+from notification_log import NotificationLog, checkpoint_lock
+
 # Email providers
 try:
     from sendgrid import SendGridAPIClient
@@ -43,22 +45,45 @@ except ImportError:
 
 
 class EmailService:
-    def __init__(self, server_dir=None):
-        """Initialize the email service"""
+    def __init__(self, server_dir=None, bus=None):
+        """Initialize the email service (reading from an in-process NotificationBus if given)"""
         self.server_dir = server_dir or os.path.dirname(os.path.abspath(__file__))
         self.data_dir = os.path.join(self.server_dir, 'data')
-        self.queue_file = os.path.join(self.data_dir, 'notification_queue.jsonl')
+        self.log_dir = os.path.join(self.data_dir, 'notification_log')
         self.checkpoint_file = os.path.join(self.data_dir, 'email_checkpoint.json')
+        self.checkpoint_lock = checkpoint_lock(self.checkpoint_file)
 
         # Ensure data directory exists
         os.makedirs(self.data_dir, exist_ok=True)
 
+        # In-process bus (combined mode) replaces the notification log
+        self.bus = bus
+        self.bus_pending = []
+        self.bus_seq = 0
+
+        # Segmented log written by server.py; our position is the consumer offset
+        self.log = None
+        self.consumer = None
+        if self.bus is None:
+            self.log = NotificationLog(self.log_dir)
+            self.consumer = self.log.consumer('email_service')
+
         # Load email configuration
         self.email_config = self.load_email_config()
 
+        # Compile recipient routing rules once
+        self.routing = RoutingIndex.from_config(self.email_config, base_dir=self.server_dir)
+
         # Load checkpoint
         self.checkpoint = self.load_checkpoint()
 
+        # Per-group delivery ahead of the committed offset: group -> id of the
+        # last notification already emailed to that group
+        self.group_progress = {}
+        if self.bus is None:
+            self.group_progress = {group: tuple(offset) for group, offset
+                                   in self.checkpoint.get('group_offsets', {}).items()}
+
         # Statistics
         self.stats = {
             'emails_sent': 0,
@@ -69,8 +94,13 @@ class EmailService:
 
         print(f"📧 Email Service initialized")
         print(f"📂 Data directory: {self.data_dir}")
-        print(f"📋 Queue file: {self.queue_file}")
-        print(f"📌 Checkpoint file: {self.checkpoint_file}")
+        if self.bus is not None:
+            print(f"🚌 Reading from in-process notification bus")
+        else:
+            print(f"📋 Notification log: {self.log_dir}")
+            print(f"📌 Log position: segment {self.consumer.segment}, byte {self.consumer.position}")
+        if self.routing.rule_count:
+            print(f"🧭 Routing: {self.routing.rule_count} rule(s) → {len(self.routing.groups)} group(s)")
 
     def load_email_config(self):
         """Load email configuration from email_config.json"""
@@ -92,13 +122,21 @@ class EmailService:
             print(f"❌ Error loading email config: {e}")
             return {'enabled': False}
 
+    def load_checkpoint_file(self):
+        """Checkpoint as currently on disk (None if missing/unreadable)"""
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
     def load_checkpoint(self):
         """Load the checkpoint tracking what has been emailed"""
         try:
             if os.path.exists(self.checkpoint_file):
                 with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
                     checkpoint = json.load(f)
-                    print(f"📌 Loaded checkpoint: {checkpoint.get('last_notification_id', 0)} notifications processed")
+                    print(f"📌 Loaded checkpoint (last email: {checkpoint.get('last_email_timestamp') or 'never'})")
                     return checkpoint
             else:
                 print("📌 No checkpoint found, starting fresh")
@@ -112,37 +150,36 @@ class EmailService:
             return {'last_notification_id': 0, 'last_email_timestamp': None}
 
     def save_checkpoint(self):
-        """Save the checkpoint to disk"""
+        """Save the checkpoint to disk
+
+        Waits while cleanup_queue.py compacts a legacy queue, and keeps the
+        last_notification_id on disk (cleanup_queue.py owns that field).
+        """
         try:
-            with open(self.checkpoint_file, 'w', encoding='utf-8') as f:
-                json.dump(self.checkpoint, f, indent=2, ensure_ascii=False)
+            with self.checkpoint_lock:
+                on_disk = self.load_checkpoint_file()
+                if on_disk and 'last_notification_id' in on_disk:
+                    self.checkpoint['last_notification_id'] = on_disk['last_notification_id']
+                with open(self.checkpoint_file, 'w', encoding='utf-8') as f:
+                    json.dump(self.checkpoint, f, indent=2, ensure_ascii=False)
         except Exception as e:
             print(f"❌ Error saving checkpoint: {e}")
 
     def read_new_notifications(self):
-        """Read new notifications from the queue since last checkpoint"""
-        if not os.path.exists(self.queue_file):
-            return []
+        """Read new notifications from the log since the committed offset"""
+        if self.bus is not None:
+            # Unsent notifications stay in bus_pending until acknowledged; hold at most
+            # bus.maxsize in memory, the rest waits in the bus (spilled to disk)
+            for notification in self.bus.drain(max(0, self.bus.maxsize - len(self.bus_pending))):
+                self.bus_seq += 1
+                self.bus_pending.append({'id': self.bus_seq, 'notification': notification})
+            return list(self.bus_pending)
 
         try:
-            notifications = []
-            last_id = self.checkpoint.get('last_notification_id', 0)
-
-            with open(self.queue_file, 'r', encoding='utf-8') as f:
-                for line_num, line in enumerate(f, 1):
-                    if line_num <= last_id:
-                        continue
-
-                    try:
-                        notification = json.loads(line.strip())
-                        notifications.append({
-                            'id': line_num,
-                            'notification': notification
-                        })
-                    except json.JSONDecodeError as e:
-                        print(f"⚠️  Skipping malformed notification at line {line_num}: {e}")
-
-            return notifications
+            return [
+                {'id': offset, 'notification': notification}
+                for offset, notification in self.consumer.read()
+            ]
         except Exception as e:
             print(f"❌ Error reading notifications: {e}")
             return []
@@ -171,8 +208,8 @@ class EmailService:
 
         return unique_messages
 
-    def send_email(self, messages):
-        """Send email with collected messages"""
+    def send_email(self, messages, recipients=None, group=None):
+        """Send email with collected messages (to a routing group's recipients if given)"""
         if not self.email_config.get('enabled'):
             print("📧 Email disabled, skipping send")
             return False
@@ -180,11 +217,18 @@ class EmailService:
         provider = self.email_config.get('provider', 'smtp').lower()
 
         if provider == 'sendgrid':
-            return self._send_email_sendgrid(messages)
+            return self._send_email_sendgrid(messages, recipients, group)
         else:
-            return self._send_email_smtp(messages)
+            return self._send_email_smtp(messages, recipients, group)
 
-    def _send_email_sendgrid(self, messages):
+    def _email_subject(self, group=None):
+        """Subject line, tagged with the routing group for non-default digests"""
+        subject = self.email_config.get('subject_prefix', 'Refinitiv Messenger Data')
+        if group and group != DEFAULT_GROUP:
+            subject = f"{subject} [{group}]"
+        return subject
+
+    def _send_email_sendgrid(self, messages, recipients=None, group=None):
         """Send email using SendGrid API"""
         if not SENDGRID_AVAILABLE:
             print("❌ SendGrid library not installed. Run: pip install sendgrid")
@@ -195,7 +239,8 @@ class EmailService:
             api_key = self.email_config.get('sendgrid_api_key')
             from_email = self.email_config.get('from_email')
             from_name = self.email_config.get('from_name', 'Refinitiv Messenger Bot')
-            recipients = self.email_config.get('recipient_emails', [])
+            if recipients is None:
+                recipients = self.email_config.get('recipient_emails', [])
 
             if not api_key or api_key == 'PASTE_YOUR_SENDGRID_API_KEY_HERE':
                 print("⚠️  SendGrid API key not configured. Update email_config.json")
@@ -207,7 +252,7 @@ class EmailService:
 
             # Build email body
             message_count = len(messages)
-            subject = self.email_config.get('subject_prefix', 'Refinitiv Messenger Data')
+            subject = self._email_subject(group)
 
             body_parts = []
             body_parts.append(f"📊 Data Summary Report")
@@ -267,7 +312,7 @@ class EmailService:
             print(f"❌ Error sending email via SendGrid: {e}")
             return False
 
-    def _send_email_smtp(self, messages):
+    def _send_email_smtp(self, messages, recipients=None, group=None):
         """Send email using SMTP (Gmail)"""
         if not SMTP_AVAILABLE:
             print("❌ SMTP libraries not available")
@@ -277,7 +322,8 @@ class EmailService:
             # Get email settings
             gmail_user = self.email_config.get('gmail_user')
             gmail_password = self.email_config.get('gmail_app_password')
-            recipients = self.email_config.get('recipient_emails', [])
+            if recipients is None:
+                recipients = self.email_config.get('recipient_emails', [])
 
             if not isinstance(recipients, list):
                 recipients = [recipients]
@@ -293,7 +339,7 @@ class EmailService:
 
             # Build email body
             message_count = len(messages)
-            subject = self.email_config.get('subject_prefix', 'Refinitiv Messenger Data')
+            subject = self._email_subject(group)
 
             body_parts = []
             body_parts.append(f"📊 Data Summary Report")
@@ -353,6 +399,70 @@ class EmailService:
             print(f"❌ Error sending email via SMTP: {e}")
             return False
 
+    def send_digests(self, notifications):
+        """Send one digest per routing group; return the notifications every group has received
+
+        A group only gets messages from notifications after its group_progress,
+        so when one group fails the others are not emailed the same digest again.
+        A group without recipients counts as not sent (messages stay pending).
+        """
+        seen_messages = set()
+        digests = {}
+        for notif_entry in notifications:
+            for msg in self.collect_messages_from_notifications([notif_entry]):
+                msg_key = f"{msg.get('date', '')}|{msg.get('time', '')}|{msg.get('sender', '')}|{msg.get('content', '')}"
+                if msg_key in seen_messages:
+                    continue
+                seen_messages.add(msg_key)
+                for group in self.routing.route(msg):
+                    done = self.group_progress.get(group)
+                    if done is None or notif_entry['id'] > done:
+                        digests.setdefault(group, []).append((notif_entry['id'], msg))
+
+        last_id = notifications[-1]['id']
+        blocked = None  # first notification a failed group still needs
+
+        for group, share in digests.items():
+            group_messages = [msg for _, msg in share]
+            recipients = self.routing.recipients(group)
+            if not recipients:
+                print(f"⚠️  No recipients for group '{group}', keeping {len(group_messages)} message(s) pending")
+                sent = False
+            else:
+                if len(digests) > 1 or group != DEFAULT_GROUP:
+                    print(f"🧭 Group '{group}': {len(group_messages)} message(s) → {len(recipients)} recipient(s)")
+                sent = self.send_email(group_messages, recipients=recipients, group=group)
+
+            if sent:
+                self.group_progress[group] = last_id
+            elif blocked is None or share[0][0] < blocked:
+                blocked = share[0][0]
+
+        if blocked is None:
+            return notifications
+        return [n for n in notifications if n['id'] < blocked]
+
+    def _sync_group_offsets(self):
+        """Copy group_progress into the checkpoint (log mode)"""
+        if self.bus is None:
+            self.checkpoint['group_offsets'] = {group: list(offset) for group, offset in self.group_progress.items()}
+
+    def acknowledge(self, notifications):
+        """Mark notifications as emailed (commit log offset, or drop from pending in bus mode)"""
+        last_id = notifications[-1]['id']
+        # Progress up to the committed position is implied by the offset itself
+        self.group_progress = {group: done for group, done in self.group_progress.items() if done > last_id}
+
+        if self.bus is not None:
+            del self.bus_pending[:len(notifications)]
+            return
+
+        self.consumer.commit(last_id)
+        self.checkpoint['last_email_timestamp'] = datetime.now().isoformat()
+        self._sync_group_offsets()
+        self.save_checkpoint()
+        print(f"📌 Log position updated: segment {self.consumer.segment}, byte {self.consumer.position}")
+
     def process_notifications(self):
         """Process new notifications and send email if needed"""
         notifications = self.read_new_notifications()
@@ -368,88 +478,206 @@ class EmailService:
         if messages:
             print(f"📝 Collected {len(messages)} unique message(s)")
 
-            # Send email
-            if self.send_email(messages):
-                # Update checkpoint only after successful email
-                last_notif_id = notifications[-1]['id']
-                self.checkpoint['last_notification_id'] = last_notif_id
-                self.checkpoint['last_email_timestamp'] = datetime.now().isoformat()
+            # Send one digest per routing group; acknowledge what every group received
+            delivered = self.send_digests(notifications)
+            if delivered:
+                self.acknowledge(delivered)
+                self.stats['messages_processed'] += len(self.collect_messages_from_notifications(delivered))
+            elif self.bus is None:
+                # Keep the groups that did get their digest from receiving it again
+                self._sync_group_offsets()
                 self.save_checkpoint()
-
-                self.stats['messages_processed'] += len(messages)
-                print(f"📌 Checkpoint updated: {last_notif_id}")
+            if len(delivered) < len(notifications):
+                print(f"⏳ {len(notifications) - len(delivered)} notification(s) kept pending for retry")
         else:
             print("ℹ️  No messages in notifications")
+            self.acknowledge(notifications)
 
         return len(messages)
 
-    def run_scheduled(self):
-        """Run in scheduled mode (time-based, like the original server)"""
-        interval = self.email_config.get('interval_minutes', 5)
+    def _queue_signature(self):
+        """Cheap change marker for the log (manifest mtime + active segment size)"""
+        try:
+            manifest_mtime = os.stat(self.log.manifest_file).st_mtime_ns
+            active_id = self.log.segments()[-1]
+            return (manifest_mtime, os.path.getsize(self.log.segment_path(active_id)))
+        except (OSError, IndexError, ValueError):
+            return None
 
-        print(f"🕐 Starting scheduled mode (every {interval} minutes)")
-        print(f"ℹ️  Note: Emails will only be sent when there are NEW messages (not already emailed)")
-        schedule.every(interval).minutes.do(self.process_notifications)
+    async def _watch_queue(self, changed, stop, watch_interval):
+        """Set `changed` whenever the log grows or rolls to a new segment"""
+        last_signature = self._queue_signature()
 
-        # Run immediately on start
-        print(f"\n⏰ [{datetime.now().strftime('%H:%M:%S')}] Running initial check...")
-        self.process_notifications()
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=watch_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            signature = self._queue_signature()
+            if signature != last_signature:
+                last_signature = signature
+                changed.set()
+
+    @staticmethod
+    async def _wait_any(events, timeout=None):
+        """Wait until any event is set or the timeout expires"""
+        waiters = [asyncio.ensure_future(event.wait()) for event in events]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+    def _install_shutdown_handlers(self, loop, stop):
+        """Stop the loop cleanly on Ctrl+C / SIGTERM"""
+        def request_stop(*_):
+            if not stop.is_set():
+                print("\n👋 Shutting down email service...")
+            loop.call_soon_threadsafe(stop.set)
 
-        next_run = datetime.now() + timedelta(minutes=interval)
-        print(f"⏰ Next scheduled check: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+        for sig in (signal.SIGINT, getattr(signal, 'SIGTERM', None)):
+            if sig is None:
+                continue
+            try:
+                loop.add_signal_handler(sig, request_stop)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Windows event loops have no add_signal_handler
+                signal.signal(sig, request_stop)
+
+    async def run_loop(self, watch_file=False, min_interval=0, max_latency=None,
+                       watch_interval=1.0, run_on_start=True, announce_checks=False, stop=None):
+        """Single scheduler loop behind every run mode.
+
+        A check runs when the notification log changes (watch_file) or when
+        max_latency seconds have passed since the last check, but never more
+        often than once every min_interval seconds. Notifications are processed
+        in a worker thread so SMTP/SendGrid calls never block the loop.
+        """
+        loop = asyncio.get_running_loop()
+        stop = stop or asyncio.Event()
+        changed = asyncio.Event()
+        self._install_shutdown_handlers(loop, stop)
+
+        watcher = None
+        if watch_file:
+            watcher = asyncio.ensure_future(self._watch_queue(changed, stop, watch_interval))
+
+        if self.bus is not None:
+            self.bus.add_listener(lambda: loop.call_soon_threadsafe(changed.set))
+
+        if run_on_start:
+            changed.set()
+
+        last_run = None
+        initial = run_on_start
 
-        while True:
-            schedule.run_pending()
+        try:
+            while not stop.is_set():
+                timeout = None
+                if max_latency is not None:
+                    elapsed = 0 if last_run is None else loop.time() - last_run
+                    timeout = max(0.0, max_latency - elapsed)
+
+                await self._wait_any([changed, stop], timeout=timeout)
+                if stop.is_set():
+                    break
+
+                trigger = 'change' if changed.is_set() else 'deadline'
+
+                # Coalesce bursts: hold until min_interval has passed since the last send
+                if last_run is not None and min_interval:
+                    remaining = min_interval - (loop.time() - last_run)
+                    if remaining > 0:
+                        await self._wait_any([stop], timeout=remaining)
+                        if stop.is_set():
+                            break
+
+                changed.clear()
+                last_run = loop.time()
+
+                if initial:
+                    print(f"\n⏰ [{datetime.now().strftime('%H:%M:%S')}] Running initial check...")
+                    initial = False
+                elif trigger == 'change' and (watch_file or self.bus is not None):
+                    print("📬 New data detected!")
+                elif announce_checks:
+                    print(f"\n⏰ [{datetime.now().strftime('%H:%M:%S')}] Scheduled check triggered")
+
+                try:
+                    await loop.run_in_executor(None, self.process_notifications)
+                except Exception as e:
+                    print(f"❌ Error processing notifications: {e}")
+
+                # Everything taken was sent but the bus still holds more: next batch
+                if self.bus is not None and not self.bus_pending and self.bus.pending():
+                    changed.set()
+
+                if announce_checks and max_latency is not None:
+                    next_run = datetime.now() + timedelta(seconds=max_latency)
+                    print(f"⏰ Next scheduled check: {next_run.strftime('%Y-%m-%d %H:%M:%S')}")
+        finally:
+            stop.set()
+            if watcher is not None:
+                watcher.cancel()
+                try:
+                    await watcher
+                except asyncio.CancelledError:
+                    pass
+            if self.bus is not None:
+                self.bus.close([entry['notification'] for entry in self.bus_pending])
+                self.bus_pending = []
+
+    def mode_settings(self, mode):
+        """Scheduler settings for each CLI mode"""
+        if mode == 'schedule':
+            # Time-based: one check per interval, no file watching
+            interval = self.email_config.get('interval_minutes', 5)
+            return {'max_latency': interval * 60, 'announce_checks': True}
+        if mode == 'bus':
+            # Combined process: wake on publish, one digest per window
+            return {
+                'min_interval': self.email_config.get('digest_window_seconds', 30),
+                # Periodic wake-up only retries digests that failed to send
+                'max_latency': self.email_config.get('interval_minutes', 5) * 60,
+            }
+        if mode == 'event':
+            # React to queue changes, but batch bursts into one email
+            return {
+                'watch_file': True,
+                'min_interval': self.email_config.get('min_send_interval_seconds', 5),
+                'max_latency': None,
+            }
+        # Polling: fixed-period check
+        return {'max_latency': self.email_config.get('poll_interval_seconds', 10)}
+
+    def run(self, mode='polling'):
+        """Run the scheduler loop in the given mode until shutdown"""
+        settings = self.mode_settings(mode)
+
+        if mode == 'schedule':
+            print(f"🕐 Starting scheduled mode (every {settings['max_latency'] // 60:g} minutes)")
+            print(f"ℹ️  Note: Emails will only be sent when there are NEW messages (not already emailed)")
+        elif mode == 'event':
+            print(f"⚡ Starting event-driven mode (min {settings['min_interval']}s between emails)")
+        elif mode == 'bus':
+            print(f"🚌 Starting bus mode (digest window {settings['min_interval']}s)")
+        else:
+            print(f"🔄 Starting polling mode (check every {settings['max_latency']}s)")
 
-            # Show next run time when a job completes
-            if schedule.jobs and schedule.jobs[0].should_run:
-                next_run = datetime.now() + timedelta(minutes=interval)
-                print(f"\n⏰ [{datetime.now().strftime('%H:%M:%S')}] Scheduled check triggered")
+        asyncio.run(self.run_loop(**settings))
 
-            time.sleep(1)
+    def run_scheduled(self):
+        """Run in scheduled mode (time-based, like the original server)"""
+        self.run('schedule')
 
     def run_polling(self):
         """Run in polling mode (check for new notifications periodically)"""
-        poll_interval = 10  # seconds
-
-        print(f"🔄 Starting polling mode (check every {poll_interval}s)")
-
-        while True:
-            try:
-                self.process_notifications()
-                time.sleep(poll_interval)
-            except KeyboardInterrupt:
-                print("\n👋 Shutting down email service...")
-                break
-            except Exception as e:
-                print(f"❌ Error in polling loop: {e}")
-                time.sleep(poll_interval)
+        self.run('polling')
 
     def run_event_driven(self):
         """Run in event-driven mode (process immediately when notifications arrive)"""
-        print(f"⚡ Starting event-driven mode")
-        print(f"⚠️  Note: This mode polls every 5 seconds (true file watching requires additional deps)")
-
-        last_size = 0
-        if os.path.exists(self.queue_file):
-            last_size = os.path.getsize(self.queue_file)
-
-        while True:
-            try:
-                if os.path.exists(self.queue_file):
-                    current_size = os.path.getsize(self.queue_file)
-                    if current_size > last_size:
-                        print("📬 New data detected!")
-                        self.process_notifications()
-                        last_size = current_size
-
-                time.sleep(5)
-            except KeyboardInterrupt:
-                print("\n👋 Shutting down email service...")
-                break
-            except Exception as e:
-                print(f"❌ Error in event loop: {e}")
-                time.sleep(5)
+        self.run('event')
 
 
 def main():
@@ -474,12 +702,7 @@ def main():
         return
 
     try:
-        if args.mode == 'schedule':
-            service.run_scheduled()
-        elif args.mode == 'polling':
-            service.run_polling()
-        elif args.mode == 'event':
-            service.run_event_driven()
+        service.run(args.mode)
     except KeyboardInterrupt:
         print("\n👋 Service stopped by user")
 
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+In-Process Notification Bus
+---------------------------
+Hands notifications from the ingest server to the email service when both run
+in the same process (see combined.py), instead of round-tripping every message
+through notification_queue.jsonl.
+
+- Notifications are kept in a bounded in-memory queue
+- When the queue is full they spill to data/notification_bus_spill.jsonl
+- The email service drains at most `maxsize` notifications at a time, so
+  during an email outage the backlog waits on disk, not in memory
+- On shutdown whatever is still in memory is written to the front of the spill
+  file (ahead of newer spilled notifications), and the spill file is picked up
+  again on the next start
+
+Only notifications still held in memory during a hard crash are lost; the
+regular two-process setup (server.py + email_service.py) keeps the fully
+durable file queue.
+"""
+
+import os
+import json
+import shutil
+import threading
+from collections import deque
+
+
+class NotificationBus:
+    def __init__(self, spill_file, maxsize=1000):
+        """Create a bus with a bounded memory queue and a spill file"""
+        self.spill_file = spill_file
+        self.maxsize = maxsize
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._spilled = 0
+
+        if os.path.exists(self.spill_file) and os.path.getsize(self.spill_file) > 0:
+            print(f"💾 Found spilled notifications from a previous run: {self.spill_file}")
+            self._spilled = 1  # exact count is not needed, only "has data"
+
+        self.stats = {
+            'published': 0,
+            'spilled': 0,
+            'drained': 0
+        }
+
+    def add_listener(self, callback):
+        """Register a callback invoked (from the publishing thread) after each publish"""
+        self._listeners.append(callback)
+
+    def publish(self, notification):
+        """Queue a notification; spill to disk when the memory queue is full"""
+        with self._lock:
+            # Once spilling started, keep spilling until drained so nothing jumps the queue
+            if self._spilled or len(self._queue) >= self.maxsize:
+                self._spill([notification])
+            else:
+                self._queue.append(notification)
+            self.stats['published'] += 1
+
+        for callback in self._listeners:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ Notification bus listener failed: {e}")
+
+    def _spill(self, notifications):
+        """Append notifications to the spill file (caller holds the lock)"""
+        with open(self.spill_file, 'a', encoding='utf-8') as f:
+            for notification in notifications:
+                f.write(json.dumps(notification, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._spilled += len(notifications)
+        self.stats['spilled'] += len(notifications)
+
+    def _spill_front(self, notifications):
+        """Write notifications ahead of the current spill content, atomically (caller holds the lock)"""
+        tmp_file = f"{self.spill_file}.tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for notification in notifications:
+                f.write(json.dumps(notification, ensure_ascii=False) + '\n')
+            if os.path.exists(self.spill_file):
+                with open(self.spill_file, 'r', encoding='utf-8') as spilled:
+                    shutil.copyfileobj(spilled, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.spill_file)
+        self._spilled += len(notifications)
+
+    def _read_spill(self):
+        """Read and remove the spill file (caller holds the lock)"""
+        notifications = []
+        if not os.path.exists(self.spill_file):
+            return notifications
+
+        with open(self.spill_file, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    notifications.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    print(f"⚠️  Skipping malformed spilled notification at line {line_num}: {e}")
+
+        os.remove(self.spill_file)
+        return notifications
+
+    def drain(self, limit=None):
+        """Take pending notifications, oldest first (at most `limit`; the rest stay queued/spilled)"""
+        with self._lock:
+            notifications = []
+            while self._queue and (limit is None or len(notifications) < limit):
+                notifications.append(self._queue.popleft())
+
+            if self._spilled and (limit is None or len(notifications) < limit):
+                spilled = self._read_spill()
+                self._spilled = 0
+                if limit is not None:
+                    room = limit - len(notifications)
+                    spilled, rest = spilled[:room], spilled[room:]
+                    if rest:
+                        self._spill_front(rest)
+                notifications.extend(spilled)
+
+            self.stats['drained'] += len(notifications)
+        return notifications
+
+    def pending(self):
+        """True if anything is waiting in memory or on disk"""
+        with self._lock:
+            return bool(self._queue) or bool(self._spilled)
+
+    def requeue(self, notifications):
+        """Put notifications back ahead of everything queued or spilled (durably, on disk)"""
+        with self._lock:
+            leftover = list(notifications or []) + list(self._queue)
+            self._queue.clear()
+            if leftover:
+                self._spill_front(leftover)
+                self.stats['spilled'] += len(leftover)
+        return len(leftover)
+
+    def close(self, notifications=None):
+        """Spill in-memory (and any caller-held) notifications so the next start picks them up"""
+        spilled = self.requeue(notifications)
+        if spilled:
+            print(f"💾 Spilled {spilled} pending notification(s) to {self.spill_file}")
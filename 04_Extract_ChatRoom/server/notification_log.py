@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Segmented Notification Log
+--------------------------
+Replaces the single ever-growing notification_queue.jsonl.
+
+Layout (data/notification_log/):
+    manifest.json              # ordered list of live segments
+    segment_000000.jsonl       # one notification per line
+    segment_000001.jsonl
+    consumers/email_service.json   # consumer position: {"segment": 1, "position": 5120}
+
+- The server appends to the newest (active) segment and rolls to a new one when
+  it exceeds `segment_bytes` or the hour changes
+- Each consumer stores (segment, byte position) and seeks straight to it, so
+  reads never rescan old data
+- Segments that every registered consumer has moved past are deleted
+  automatically; with no registered consumers nothing is deleted
+
+Appends and manifest updates take an inter-process lock (data/notification_log/.lock),
+so several server workers can share one log.
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+DEFAULT_SEGMENT_BYTES = 8 * 1024 * 1024
+
+
+class _InterProcessLock:
+    """Exclusive lock shared by threads (threading.Lock) and processes (lock file)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._handle = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._handle = open(self.path, 'a+b')
+            if fcntl is not None:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+            else:
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_LOCK, 1)
+        except Exception:
+            self._release_handle()
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self._handle.seek(0)
+                msvcrt.locking(self._handle.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._release_handle()
+            self._thread_lock.release()
+
+    def _release_handle(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+def checkpoint_lock(checkpoint_file):
+    """Inter-process lock for email_checkpoint.json (<checkpoint>.lock)
+
+    cleanup_queue.py holds it for a whole compaction, so EmailService cannot
+    write the checkpoint and the server cannot migrate the legacy queue while
+    queue line ids are being remapped.
+    """
+    return _InterProcessLock(f"{checkpoint_file}.lock")
+
+
+def _write_json_atomic(path, data):
+    """Write JSON to a temp file and rename it over path"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _current_hour():
+    return datetime.now().strftime('%Y-%m-%dT%H')
+
+
+class NotificationLog:
+    def __init__(self, log_dir, segment_bytes=DEFAULT_SEGMENT_BYTES, roll_hourly=True):
+        """Open (or create) a segmented log in log_dir"""
+        self.log_dir = log_dir
+        self.consumers_dir = os.path.join(log_dir, 'consumers')
+        self.manifest_file = os.path.join(log_dir, 'manifest.json')
+        self.segment_bytes = segment_bytes
+        self.roll_hourly = roll_hourly
+
+        os.makedirs(self.consumers_dir, exist_ok=True)
+        self._lock = _InterProcessLock(os.path.join(log_dir, '.lock'))
+
+        # Writer state: cached manifest + open handle on the active segment
+        self._manifest = None
+        self._manifest_signature_cache = None
+        self._active_id = None
+        self._active_handle = None
+
+        with self._lock:
+            if not os.path.exists(self.manifest_file):
+                self._save_manifest({'version': 1, 'segments': []})
+                self._new_segment()
+
+    # ---- manifest -------------------------------------------------------
+
+    def load_manifest(self):
+        """Read the manifest (atomic rename on write, so no lock needed)"""
+        with open(self.manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _refresh_manifest(self):
+        """Reload the cached manifest if another process changed it (caller holds the lock)"""
+        signature = self._manifest_signature()
+        if self._manifest is None or signature != self._manifest_signature_cache:
+            self._manifest = self.load_manifest()
+            self._manifest_signature_cache = signature
+        return self._manifest
+
+    def _manifest_signature(self):
+        # Atomic replace gives a new inode, so this changes on every rewrite
+        st = os.stat(self.manifest_file)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _save_manifest(self, manifest):
+        manifest['updated_at'] = datetime.now().isoformat()
+        _write_json_atomic(self.manifest_file, manifest)
+        self._manifest = manifest
+        self._manifest_signature_cache = self._manifest_signature()
+
+    def segment_path(self, segment_id):
+        return os.path.join(self.log_dir, f'segment_{segment_id:06d}.jsonl')
+
+    def segments(self):
+        """Live segment ids, oldest first"""
+        return [seg['id'] for seg in self.load_manifest()['segments']]
+
+    def _new_segment(self):
+        """Seal the active segment and start a new one (caller holds the lock)"""
+        manifest = self._refresh_manifest()
+        segments = manifest['segments']
+        segment_id = segments[-1]['id'] + 1 if segments else 0
+
+        open(self.segment_path(segment_id), 'a', encoding='utf-8').close()
+        segments.append({
+            'id': segment_id,
+            'file': os.path.basename(self.segment_path(segment_id)),
+            'hour': _current_hour(),
+            'created_at': datetime.now().isoformat()
+        })
+        self._save_manifest(manifest)
+        return segment_id
+
+    # ---- writer ---------------------------------------------------------
+
+    def append(self, notification):
+        """Append one notification to the active segment, rolling if needed"""
+        line = json.dumps(notification, ensure_ascii=False) + '\n'
+
+        with self._lock:
+            manifest = self._refresh_manifest()
+            active = manifest['segments'][-1]
+
+            if self.roll_hourly and active['hour'] != _current_hour():
+                self._roll()
+                active = self._manifest['segments'][-1]
+
+            if self._active_id != active['id']:
+                self._close_active()
+                self._active_handle = open(self.segment_path(active['id']), 'a', encoding='utf-8')
+                self._active_id = active['id']
+
+            self._active_handle.write(line)
+            self._active_handle.flush()
+
+            if self._active_handle.tell() >= self.segment_bytes:
+                self._roll()
+
+    def _roll(self):
+        """Start a new segment and drop segments every consumer has passed (caller holds the lock)"""
+        self._close_active()
+        self._new_segment()
+        self._apply_retention()
+
+    def _close_active(self):
+        if self._active_handle is not None:
+            self._active_handle.close()
+            self._active_handle = None
+            self._active_id = None
+
+    def close(self):
+        with self._lock:
+            self._close_active()
+
+    # ---- retention ------------------------------------------------------
+
+    def consumer_positions(self):
+        """{consumer_name: (segment, position)} for every registered consumer"""
+        positions = {}
+        for file_name in os.listdir(self.consumers_dir):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.consumers_dir, file_name), 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                positions[file_name[:-5]] = (state['segment'], state['position'])
+            except (OSError, ValueError, KeyError) as e:
+                print(f"⚠️  Ignoring unreadable consumer offset {file_name}: {e}")
+        return positions
+
+    def apply_retention(self):
+        """Delete segments that every consumer has fully read"""
+        with self._lock:
+            return self._apply_retention()
+
+    def _apply_retention(self):
+        positions = self.consumer_positions()
+        if not positions:
+            return 0
+
+        low_water = min(segment for segment, _ in positions.values())
+        manifest = self._refresh_manifest()
+        active_id = manifest['segments'][-1]['id']
+
+        keep, removed = [], 0
+        for seg in manifest['segments']:
+            if seg['id'] < low_water and seg['id'] != active_id:
+                try:
+                    os.remove(self.segment_path(seg['id']))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    # e.g. still open by a reader on Windows; retry on next roll
+                    print(f"⚠️  Could not delete segment {seg['id']}: {e}")
+                    keep.append(seg)
+                    continue
+                removed += 1
+            else:
+                keep.append(seg)
+
+        if removed:
+            manifest['segments'] = keep
+            self._save_manifest(manifest)
+            print(f"🗑️  Retention removed {removed} segment(s)")
+        return removed
+
+    # ---- consumers ------------------------------------------------------
+
+    def consumer(self, name):
+        return LogConsumer(self, name)
+
+
+class LogConsumer:
+    """Reads the log from a committed (segment, byte position)"""
+
+    def __init__(self, log, name):
+        self.log = log
+        self.name = name
+        self.offset_file = os.path.join(log.consumers_dir, f'{name}.json')
+        self.segment, self.position = self._load_offset()
+
+        # Register right away so retention never deletes data we haven't read
+        if not os.path.exists(self.offset_file):
+            self._save_offset()
+
+    def _load_offset(self):
+        try:
+            with open(self.offset_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            return state['segment'], state['position']
+        except FileNotFoundError:
+            segments = self.log.segments()
+            return (segments[0] if segments else 0), 0
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Could not read consumer offset {self.offset_file}: {e}")
+            segments = self.log.segments()
+            return (segments[0] if segments else 0), 0
+
+    def read(self, max_records=None):
+        """Return [((segment, end_position), notification), ...] after the committed offset.
+
+        Only complete lines are returned, so a record the server is still
+        writing is picked up on the next call.
+        """
+        records = []
+        segments = self.log.segments()
+        if not segments:
+            return records
+
+        segment, position = self.segment, self.position
+        if segment < segments[0]:
+            # Our segment was removed (shouldn't happen while we're registered)
+            print(f"⚠️  Consumer '{self.name}' offset {segment} is before the oldest segment {segments[0]}")
+            segment, position = segments[0], 0
+
+        for seg_id in segments:
+            if seg_id < segment:
+                continue
+            if seg_id > segment:
+                position = 0
+
+            try:
+                with open(self.log.segment_path(seg_id), 'rb') as f:
+                    f.seek(position)
+                    for raw in iter(f.readline, b''):
+                        if not raw.endswith(b'\n'):
+                            break
+                        position += len(raw)
+                        line = raw.strip()
+                        if not line:
+                            continue
+                        try:
+                            records.append(((seg_id, position), json.loads(line.decode('utf-8'))))
+                        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                            print(f"⚠️  Skipping malformed notification in segment {seg_id}: {e}")
+                        if max_records and len(records) >= max_records:
+                            return records
+            except FileNotFoundError:
+                continue
+
+        return records
+
+    def commit(self, offset):
+        """Persist the consumer position and let retention drop passed segments"""
+        segment, position = offset
+
+        # Once a sealed segment is fully read, point at the start of the next one
+        segments = self.log.segments()
+        if segment in segments and segment != segments[-1]:
+            if position >= os.path.getsize(self.log.segment_path(segment)):
+                segment, position = segments[segments.index(segment) + 1], 0
+
+        self.segment, self.position = segment, position
+        self._save_offset()
+        self.log.apply_retention()
+
+    def _save_offset(self):
+        _write_json_atomic(self.offset_file, {
+            'segment': self.segment,
+            'position': self.position,
+            'updated_at': datetime.now().isoformat()
+        })
+
+
+def migrate_legacy_queue(log, queue_file, checkpoint_file):
+    """Move not-yet-emailed lines of notification_queue.jsonl into the log (one-off)"""
+    if not os.path.exists(queue_file):
+        return 0
+
+    # Checkpoint and queue must come from the same side of a compaction
+    with checkpoint_lock(checkpoint_file):
+        last_id = 0
+        try:
+            if os.path.exists(checkpoint_file):
+                with open(checkpoint_file, 'r', encoding='utf-8') as f:
+                    last_id = json.load(f).get('last_notification_id', 0)
+        except Exception as e:
+            print(f"⚠️  Could not read checkpoint for migration: {e}")
+
+        migrated = 0
+        with open(queue_file, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                if line_num <= last_id or not line.strip():
+                    continue
+                try:
+                    log.append(json.loads(line))
+                    migrated += 1
+                except json.JSONDecodeError as e:
+                    print(f"⚠️  Skipping malformed notification at line {line_num}: {e}")
+
+        os.replace(queue_file, f"{queue_file}.migrated")
+    print(f"📦 Migrated {migrated} pending notification(s) from {os.path.basename(queue_file)} to the segmented log")
+    return migrated
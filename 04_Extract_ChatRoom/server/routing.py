@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Recipient Routing
+-----------------
+Maps each message to the recipient groups that should receive it.
+
+Routing rules live in email_config.json:
+
+    "recipient_groups": {
+        "fx_desk": ["fx@example.com"],
+        "ops": ["ops@example.com"]
+    },
+    "routing_rules": [
+        {"group": "fx_desk", "bank": ["VIB", "Vietnam Maritime Commercial Joint Stock Bank"]},
+        {"group": "ops", "sender": "Dzung Nguyen"},
+        {"group": "ops", "room": "FX Room"},
+        {"group": "fx_desk", "content_regex": "\\b(done|dsone)\\b"}
+    ]
+
+Each rule has a "group" plus one matcher (bank, sender, room or content_regex);
+values may be a string or a list. Matching is case-insensitive; senders match either
+the "sender" or "name" field, rooms match a "room"/"chat_room" field on the
+message. Messages that match no rule go to the "default" group
+(recipient_emails), so a config without rules behaves exactly as before.
+Rules for a group with no recipients are skipped, so those messages go to the
+default group instead of being held back forever.
+
+The rules are compiled once into a RoutingIndex: bank/sender/room values become
+dict lookups and all content regexes are merged into a single pattern, so
+routing a message costs a few dict hits plus one regex match no matter how many
+rules are configured. Each content_regex is compiled on its own first; invalid
+ones are reported and skipped. Patterns that are valid but cannot be merged
+(numbered backreferences, inline global flags such as "(?i)") are kept as
+separate regexes and searched one by one.
+
+Bank aliases (optional): "bank_directory" in email_config.json points at the bank
+directory JSON shared with the extraction pipelines
+(03_Task_Extract_ChatRoom/bank_directory.json; relative paths are resolved from
+the server directory). Every bank code and display/full name listed there is
+folded to the bank code, so a "bank": "MSB" rule also matches messages whose
+bank field is "Vietnam Maritime Commercial Joint Stock Bank".
+"""
+
+import json
+import os
+import re
+
+
+DEFAULT_GROUP = 'default'
+
+MATCHER_KEYS = ('bank', 'sender', 'room', 'content_regex')
+
+CONTENT_FLAGS = re.IGNORECASE | re.DOTALL
+
+# Numbered backreferences point at a different group once patterns are merged
+NUMBERED_BACKREF = re.compile(r'\\(?:[1-9]|g<\d+>)')
+
+
+def _as_list(value):
+    """Normalize a rule value (string or list) to a list of non-empty strings"""
+    if value is None:
+        return []
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    return [str(v) for v in value if str(v).strip()]
+
+
+def _norm(value):
+    """Normalize a lookup key (case/whitespace insensitive)"""
+    return ' '.join(str(value).split()).lower()
+
+
+def load_bank_aliases(path):
+    """Map normalized bank code / name -> bank code from a bank directory JSON"""
+    with open(path, 'r', encoding='utf-8') as f:
+        directory = json.load(f)
+    aliases = {}
+    for code, info in directory.get('banks', {}).items():
+        for name in [code] + list(info.get('names', [])):
+            aliases.setdefault(_norm(name), code)
+    return aliases
+
+
+class RoutingIndex:
+    """Precompiled subscription index built from routing rules"""
+
+    def __init__(self, groups, rules, default_recipients=None, bank_aliases=None):
+        self.bank_aliases = bank_aliases or {}
+        self.groups = {name: _as_list(emails) for name, emails in (groups or {}).items()}
+        if default_recipients:
+            self.groups.setdefault(DEFAULT_GROUP, _as_list(default_recipients))
+
+        self.by_bank = {}
+        self.by_sender = {}
+        self.by_room = {}
+        self.content_groups = {}  # regex group name -> recipient group
+        self.content_regex = None
+        self.separate_regexes = []  # [(compiled, group)] for patterns that cannot be merged
+        self.rule_count = 0
+
+        content_patterns = []
+
+        for rule in rules or []:
+            group = rule.get('group')
+            if not group:
+                print(f"⚠️  Skipping routing rule without group: {rule}")
+                continue
+            if not self.groups.get(group):
+                # Its messages would never be sent and would block the queue; fall back to default
+                print(f"⚠️  Skipping routing rule for group '{group}' without recipients: {rule}")
+                continue
+
+            matched_keys = [key for key in MATCHER_KEYS if rule.get(key)]
+            if len(matched_keys) != 1:
+                print(f"⚠️  Skipping routing rule (need exactly one of {', '.join(MATCHER_KEYS)}): {rule}")
+                continue
+
+            key = matched_keys[0]
+            values = _as_list(rule[key])
+
+            if key == 'content_regex':
+                for pattern in values:
+                    try:
+                        compiled = re.compile(pattern, CONTENT_FLAGS)
+                    except re.error as e:
+                        print(f"⚠️  Skipping invalid content_regex '{pattern}': {e}")
+                        continue
+                    if not self._mergeable(pattern):
+                        self.separate_regexes.append((compiled, group))
+                        continue
+                    name = f"r{len(content_patterns)}"
+                    self.content_groups[name] = group
+                    content_patterns.append((name, pattern))
+            else:
+                target = {'bank': self.by_bank, 'sender': self.by_sender, 'room': self.by_room}[key]
+                for value in values:
+                    lookup = self._bank_key(value) if key == 'bank' else _norm(value)
+                    target.setdefault(lookup, set()).add(group)
+
+            self.rule_count += 1
+
+        if content_patterns:
+            try:
+                self.content_regex = self._compile_content_regex(content_patterns)
+            except re.error as e:
+                # Should not happen after the per-pattern checks; never stop the service for it
+                print(f"⚠️  Could not merge content_regex rules, matching them one by one: {e}")
+                self.separate_regexes.extend(
+                    (re.compile(pattern, CONTENT_FLAGS), self.content_groups[name])
+                    for name, pattern in content_patterns)
+                self.content_groups = {}
+
+    @staticmethod
+    def _content_part(name, pattern):
+        return f"(?=(?:.*?(?P<{name}>{pattern}))?)"
+
+    @classmethod
+    def _mergeable(cls, pattern):
+        """True if the pattern keeps its meaning inside the merged regex"""
+        if NUMBERED_BACKREF.search(pattern):
+            return False
+        try:
+            re.compile(cls._content_part('r', pattern), CONTENT_FLAGS)
+        except re.error:
+            return False
+        return True
+
+    @classmethod
+    def _compile_content_regex(cls, patterns):
+        """Merge all content patterns into one regex.
+
+        Every pattern sits in its own optional lookahead anchored at the start of
+        the text, so a single match() reports every rule that fires anywhere in
+        the message (a plain alternation would only report the first one).
+        """
+        parts = [cls._content_part(name, pattern) for name, pattern in patterns]
+        return re.compile(''.join(parts), CONTENT_FLAGS)
+
+    def _bank_key(self, value):
+        """Lookup key for a bank: its code when the directory knows the name"""
+        key = _norm(value)
+        return _norm(self.bank_aliases.get(key, key))
+
+    @classmethod
+    def from_config(cls, config, base_dir=None):
+        """Build the index from an email_config.json dict"""
+        bank_aliases = None
+        path = config.get('bank_directory')
+        if path:
+            if not os.path.isabs(path):
+                path = os.path.join(base_dir or os.path.dirname(os.path.abspath(__file__)), path)
+            try:
+                bank_aliases = load_bank_aliases(path)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Could not load bank directory {path}: {e}")
+        return cls(
+            groups=config.get('recipient_groups', {}),
+            rules=config.get('routing_rules', []),
+            default_recipients=config.get('recipient_emails', []),
+            bank_aliases=bank_aliases,
+        )
+
+    def route(self, msg):
+        """Return the set of groups a message should be delivered to"""
+        hits = set()
+
+        bank = msg.get('bank')
+        if bank and self.by_bank:
+            hits.update(self.by_bank.get(self._bank_key(bank), ()))
+
+        if self.by_sender:
+            for field in ('sender', 'name'):
+                value = msg.get(field)
+                if value:
+                    hits.update(self.by_sender.get(_norm(value), ()))
+
+        room = msg.get('room') or msg.get('chat_room')
+        if room and self.by_room:
+            hits.update(self.by_room.get(_norm(room), ()))
+
+        if self.content_regex is not None:
+            match = self.content_regex.match(msg.get('content', '') or '')
+            if match:
+                for name, value in match.groupdict().items():
+                    if value is not None:
+                        hits.add(self.content_groups[name])
+
+        if self.separate_regexes:
+            content = msg.get('content', '') or ''
+            for regex, group in self.separate_regexes:
+                if group not in hits and regex.search(content):
+                    hits.add(group)
+
+        if not hits:
+            hits.add(DEFAULT_GROUP)
+
+        return hits
+
+    def fan_out(self, messages):
+        """Split messages into {group: [messages]} preserving message order"""
+        digests = {}
+        for msg in messages:
+            for group in self.route(msg):
+                digests.setdefault(group, []).append(msg)
+        return digests
+
+    def recipients(self, group):
+        """Recipient emails for a group"""
+        return self.groups.get(group, [])
@@ -55,6 +55,11 @@ def run_email_event():
     print("Starting email service in event-driven mode...")
     subprocess.run([sys.executable, 'email_service.py', '--mode', 'event'])
 
+def run_combined():
+    """Run web server and email service in one process"""
+    print("Starting server + email service (single process)...")
+    subprocess.run([sys.executable, 'combined.py'] + sys.argv[2:])
+
 def install_deps():
     """Install Python dependencies"""
     print("Installing dependencies from requirements.txt...")
@@ -72,6 +77,7 @@ Commands:
   email           Start email notification service (polling mode)
   email-schedule  Start email service in scheduled/time-based mode
   email-event     Start email service in event-driven mode
+  combined        Start web server and email service in one process
   install         Install dependencies from requirements.txt
   help            Show this help message
 
@@ -80,10 +86,12 @@ Examples:
   python run_server.py dev              # Start web server (dev mode)
   python run_server.py email            # Start email service (polling)
   python run_server.py email-schedule   # Start email service (scheduled)
+  python run_server.py combined         # Server + email in one process
   python run_server.py install          # Install dependencies
 
 Note: Web server and email service are separate processes.
-      Run them in separate terminals for full functionality.
+      Run them in separate terminals for full functionality,
+      or use 'combined' to run both in one process.
     """)
 
 if __name__ == '__main__':
@@ -97,6 +105,7 @@ if __name__ == '__main__':
         'email': run_email_service,
         'email-schedule': run_email_scheduled,
         'email-event': run_email_event,
+        'combined': run_combined,
         'install': install_deps,
         'help': show_help,
     }
@@ -8,6 +8,8 @@ from pathlib import Path
 import shutil
 import argparse
 
+from notification_log import NotificationLog, migrate_legacy_queue
+
 app = Flask(__name__, static_folder='public')
 CORS(app, resources={r"/*": {"origins": "*", "allow_headers": "*", "methods": ["GET", "POST", "OPTIONS"]}})
 PORT = 3000
@@ -29,12 +31,19 @@ stats = {
 data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
 os.makedirs(data_dir, exist_ok=True)
 
-# Notification queue file (for email service)
+# Segmented notification log (for email service)
+notification_log_dir = os.path.join(data_dir, 'notification_log')
+notification_log = NotificationLog(notification_log_dir)
+
+# Legacy single-file queue (migrated into the log on startup)
 notification_queue_file = os.path.join(data_dir, 'notification_queue.jsonl')
 
 # Message deduplication cache file
 seen_messages_cache_file = os.path.join(data_dir, 'seen_messages_cache.json')
 
+# In-process notification bus (set by combined.py, None when running standalone)
+notification_bus = None
+
 # Configure Flask to handle large JSON payloads
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB
 
@@ -129,11 +138,20 @@ def filter_new_messages(messages, cache):
     return new_messages, new_hashes
 
 
+def attach_notification_bus(bus):
+    """Deliver notifications to an in-process bus instead of the queue file"""
+    global notification_bus
+    notification_bus = bus
+
+
 def write_notification_to_queue(notification_data):
-    """Write a notification to the queue file for email service to process"""
+    """Write a notification to the notification log for email service to process"""
+    if notification_bus is not None:
+        notification_bus.publish(notification_data)
+        return
+
     try:
-        with open(notification_queue_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(notification_data, ensure_ascii=False) + '\n')
+        notification_log.append(notification_data)
     except Exception as e:
         print(f"⚠️ Error writing to notification queue: {e}")
 
@@ -320,6 +338,20 @@ def serve_static(path):
     return send_from_directory('public', path)
 
 
+def get_ssl_context():
+    """Return (ssl_context, protocol) depending on whether cert.pem/key.pem exist"""
+    cert_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cert.pem')
+    key_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'key.pem')
+
+    if os.path.exists(cert_path) and os.path.exists(key_path):
+        print(f"🔒 SSL certificates found - using HTTPS")
+        return (cert_path, key_path), 'https'
+
+    print(f"⚠️  No SSL certificates found - using HTTP (insecure)")
+    print(f"   To generate certificates, run: python create_ssl.py")
+    return None, 'http'
+
+
 if __name__ == '__main__':
     # Parse command line arguments
     parser = argparse.ArgumentParser(description='Refinitiv Messenger Data Extraction Server')
@@ -330,25 +362,18 @@ if __name__ == '__main__':
     # Update server config
     server_config['crawl_account'] = args.crawl_account
 
-    # Check for SSL certificates
-    cert_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cert.pem')
-    key_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'key.pem')
+    # Move any unsent notifications from the old single-file queue into the log
+    migrate_legacy_queue(notification_log, notification_queue_file,
+                         os.path.join(data_dir, 'email_checkpoint.json'))
 
-    ssl_context = None
-    protocol = 'http'
-    if os.path.exists(cert_path) and os.path.exists(key_path):
-        ssl_context = (cert_path, key_path)
-        protocol = 'https'
-        print(f"🔒 SSL certificates found - using HTTPS")
-    else:
-        print(f"⚠️  No SSL certificates found - using HTTP (insecure)")
-        print(f"   To generate certificates, run: python create_ssl.py")
+    # Check for SSL certificates
+    ssl_context, protocol = get_ssl_context()
 
     print(f"🚀 Server started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"📡 Listening on {protocol}://localhost:{PORT}")
     print(f"📊 Data: {data_dir}")
     print(f"📈 Stats: {protocol}://localhost:{PORT}/api/stats")
-    print(f"📬 Notification Queue: {notification_queue_file}")
+    print(f"📬 Notification Log: {notification_log_dir}")
     print(f"👤 Crawl Account: {server_config['crawl_account']}")
     print(f"")
     print(f"ℹ️  Email notifications are handled by email_service.py (run separately)")